@@ -11,6 +11,12 @@ dft_session_east2 = cw.Session(region_name="us-east-2")
 dft_session_west1 = cw.Session(region_name="us-west-1")
 dft_session_west2 = cw.Session(region_name="us-west-2")
 
+#--- Use AWS credentials set in env, and work against several regions at once
+#--- Every Session method can be called, and runs in each region concurrently
+mr_session = cw.MultiRegionSession(["us-east-1", "us-east-2", "us-west-1", "us-west-2"])
+#--- Or, discover and use every region enabled for the account
+all_regions_session = cw.MultiRegionSession()
+
 #--- Specify AWS credentials inline, retrieved from AWS Console or otherwise
 # 1 : Access Key ID
 # 2 : Secret Access key
@@ -24,6 +30,12 @@ all_alarms = dft_session.get_all_alarms()
 all_dashboards = dft_session.get_all_dashboards()
 all_sns = dft_session.get_all_sns()
 
+#--- Gather alarms from every region. Regions that fail are reported in .errors, without stopping the others
+all_region_alarms = mr_session.get_all_alarms()
+print(all_region_alarms.errors)
+#--- Merge the results into one, with each alarm tagged by its 'Region'
+all_region_alarms = all_region_alarms.merged()
+
 #--- Print a functions description
 print(cw.filter_metric_alarms.__doc__)
 
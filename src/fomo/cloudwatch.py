@@ -1,17 +1,41 @@
 #!/usr/bin/python
 
 from asyncio import format_helpers
+import asyncio
 import boto3
 import boto3.session
 import botocore
+import botocore.config
 import os
 import sys
 import json 
+import io
+import gzip
+import hashlib
 import re
+import bisect
+import heapq
 import time
+import copy
+import threading
+import mmap
+import queue
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from tabulate import tabulate
-from datetime import date
+from datetime import date, datetime, timezone, timedelta
 from pprint import pprint
+try:
+    import zstandard
+except ImportError:
+    # only needed for zstd compressed backups
+    zstandard = None
+try:
+    import numpy
+except ImportError:
+    # only needed for metric data (get_metric_data_for_alarms) and backtesting
+    numpy = None
 
 #--- Custom Exceptions/classes
 class AlarmNotFound(Exception):
@@ -29,14 +53,263 @@ class LogGroupNotFound(Exception):
 class MetricFilterNotFound(Exception):
     pass
 
+#--- describe_alarms accepts at most 100 names per AlarmNames request
+ALARM_NAMES_LIMIT=100
+
+#--- delete_dashboards accepts at most 100 names per DashboardNames request
+DASHBOARD_NAMES_LIMIT=100
+
+#--- get_metric_data accepts at most 500 MetricDataQueries per request
+METRIC_DATA_QUERIES_LIMIT=500
+
+#--- error codes AWS returns when a request is throttled, and should be retried after backing off
+THROTTLING_ERROR_CODES=['Throttling','ThrottlingException','ThrottledException','TooManyRequestsException','RequestLimitExceeded']
+
+#---
+#--- Inventory cache, used by Session when cache=True
+#---
+class InventoryCache:
+  """ 
+  Thread safe, size bounded cache of CloudWatch inventory (alarms, sns, log_groups, metric_filters).
+  Entries expire after a per-resource TTL in seconds, and the least recently used entries are evicted once a resource holds max_entries.
+  A key of None is used for a resource's full inventory listing.
+  """
+  default_ttls={'alarms': 60, 'sns': 300, 'log_groups': 300, 'metric_filters': 300}
+  
+  def __init__(self, ttls=None, max_entries=10000):
+    valid_resources=list(self.default_ttls.keys())
+    self._ttls=dict(self.default_ttls)
+    for r in (ttls or {}):
+        if r not in valid_resources:
+            raise Exception("Error cache resource '%s' invalid. Valid options: '%s'" % (r,str(valid_resources)))
+        self._ttls[r]=ttls[r]
+    self._max_entries=max_entries
+    self._entries={r: OrderedDict() for r in valid_resources}
+    self._lock=threading.Lock()
+    self._stats={'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+  
+  def get(self, resource, key, default=None):
+      """ Returns a copy of the cached value, or default if it is missing or expired """
+      with self._lock:
+          entry=self._entries[resource].get(key)
+          if entry is None or entry[0] < time.monotonic():
+              if entry is not None:
+                  del self._entries[resource][key]
+              self._stats['misses']+=1
+              return default
+          self._entries[resource].move_to_end(key)
+          self._stats['hits']+=1
+          value=entry[1]
+      # callers are free to modify what they get back, so never hand out the cached object itself
+      return copy.deepcopy(value)
+  
+  def put(self, resource, key, value):
+      """ Stores a copy of value, evicting the least recently used entries if the resource is full """
+      value=copy.deepcopy(value)
+      with self._lock:
+          my_entries=self._entries[resource]
+          my_entries[key]=(time.monotonic() + self._ttls[resource], value)
+          my_entries.move_to_end(key)
+          while len(my_entries) > self._max_entries:
+              my_entries.popitem(last=False)
+              self._stats['evictions']+=1
+  
+  def invalidate(self, resource=None, key=None):
+      """ 
+      Removes cached entries. With no resource, everything is removed. With no key, the whole resource is removed.
+      With a key, that entry and the resource's full listing (key None) are removed, since the listing contains it.
+      """
+      with self._lock:
+          self._stats['invalidations']+=1
+          if resource is None:
+              for r in self._entries:
+                  self._entries[r].clear()
+          elif key is None:
+              self._entries[resource].clear()
+          else:
+              self._entries[resource].pop(key, None)
+              self._entries[resource].pop(None, None)
+  
+  def stats(self):
+      """ Returns hit/miss/eviction/invalidation counters and current entry counts """
+      with self._lock:
+          my_stats=dict(self._stats)
+          my_stats['entries']={r: len(self._entries[r]) for r in self._entries}
+      return my_stats
+
+#---
+#--- Rate limiting, shared by a Session's clients and worker threads
+#---
+#--- Default per account, per region, transactions per second quotas for the APIs fomo uses.
+#--- These are only starting points - RateLimiter adapts each rate from the throttling responses it sees.
+DEFAULT_API_RATES={
+    'cloudwatch.DescribeAlarms': 9,
+    'cloudwatch.DescribeAlarmHistory': 3,
+    'cloudwatch.DeleteAlarms': 3,
+    'cloudwatch.DisableAlarmActions': 3,
+    'cloudwatch.EnableAlarmActions': 3,
+    'cloudwatch.PutMetricAlarm': 3,
+    'cloudwatch.PutCompositeAlarm': 3,
+    'cloudwatch.ListDashboards': 10,
+    'cloudwatch.GetDashboard': 10,
+    'cloudwatch.PutDashboard': 10,
+    'cloudwatch.DeleteDashboards': 10,
+    'cloudwatch.ListMetrics': 25,
+    'cloudwatch.GetMetricData': 50,
+    'cloudwatch-logs.DescribeLogGroups': 10,
+    'cloudwatch-logs.DescribeMetricFilters': 5,
+    'cloudwatch-logs.PutMetricFilter': 5,
+    'cloudwatch-logs.DeleteMetricFilter': 5,
+    'sns.ListTopics': 30,
+    'sns.ListSubscriptions': 30,
+    'sns.ListSubscriptionsByTopic': 30,
+}
+
+class _TokenBucket:
+  """ Thread safe token bucket: allows rate calls per second on average, in bursts of up to burst calls """
+  def __init__(self, rate, burst=None):
+    if rate <= 0:
+        raise Exception("rate must be greater than 0 : '%s' specified." % rate)
+    self._rate=float(rate)
+    self._burst=float(burst or max(1, rate))
+    self._tokens=self._burst
+    self._updated=time.monotonic()
+    self._lock=threading.Lock()
+  
+  def rate(self):
+      return self._rate
+  
+  def set_rate(self, rate):
+      """ Changes the rate (and burst size) of the bucket """
+      with self._lock:
+          self._rate=float(rate)
+          self._burst=float(max(1, rate))
+          self._tokens=min(self._tokens, self._burst)
+  
+  def acquire(self):
+      """ Waits until a call is allowed, and returns the time waited in seconds """
+      waited=0.0
+      while True:
+          with self._lock:
+              now=time.monotonic()
+              self._tokens=min(self._burst, self._tokens + (now - self._updated) * self._rate)
+              self._updated=now
+              if self._tokens >= 1:
+                  self._tokens-=1
+                  return waited
+              wait=(1 - self._tokens) / self._rate
+          time.sleep(wait)
+          waited+=wait
+
+class RateLimiterStats:
+  """ 
+  Snapshot of a RateLimiter's counters.
+    calls, throttles, wait_time: totals over every operation (wait_time in seconds)
+    operations: {operation: {'calls','throttles','wait_time','rate'}}, with operations named like 'cloudwatch.PutMetricAlarm'
+  """
+  def __init__(self, operations):
+    self.operations=operations
+    self.calls=sum(o['calls'] for o in operations.values())
+    self.throttles=sum(o['throttles'] for o in operations.values())
+    self.wait_time=sum(o['wait_time'] for o in operations.values())
+  
+  def __repr__(self):
+      return "RateLimiterStats(calls=%d, throttles=%d, wait_time=%.2f)" % (self.calls, self.throttles, self.wait_time)
+
+class RateLimiter:
+  """ 
+  Adaptive token bucket rate limiter, with one bucket per API operation, shared by every client (and thread) it is attached to.
+  Each operation starts at its rate in DEFAULT_API_RATES (or rates, or default_rate). Every throttled response halves the
+  operation's rate, down to min_rate, and every successful call adds increase_step back, up to max_rate_factor times its starting rate.
+  Retries of throttled calls are left to botocore's "standard" retry mode, which backs off exponentially with jitter.
+  """
+  def __init__(self, default_rate=5, rates=None, min_rate=0.2, max_rate_factor=4, increase_step=0.05):
+    self._start_rates=dict(DEFAULT_API_RATES)
+    self._start_rates.update(rates or {})
+    self._default_rate=default_rate
+    self._min_rate=min_rate
+    self._max_rate_factor=max_rate_factor
+    self._increase_step=increase_step
+    self._buckets={}
+    self._stats={}
+    self._lock=threading.Lock()
+  
+  def attach(self, client):
+      """ Registers this limiter on a boto3 client, so every request it sends (including retries and paginated calls) is limited """
+      client.meta.events.register('before-send', self._before_send)
+      client.meta.events.register('needs-retry', self._after_attempt)
+  
+  def _operation(self, event_name):
+      # event names look like "before-send.cloudwatch.PutMetricAlarm"
+      return event_name.split(".", 1)[-1]
+  
+  def _bucket(self, operation):
+      with self._lock:
+          if operation not in self._buckets:
+              self._buckets[operation]=_TokenBucket(self._start_rates.get(operation, self._default_rate))
+              self._stats[operation]={'calls': 0, 'throttles': 0, 'wait_time': 0.0}
+          return self._buckets[operation]
+  
+  def acquire(self, operation):
+      """ Waits until operation may be called, and returns the time waited in seconds """
+      waited=self._bucket(operation).acquire()
+      with self._lock:
+          self._stats[operation]['calls']+=1
+          self._stats[operation]['wait_time']+=waited
+      return waited
+  
+  def record_throttle(self, operation):
+      """ Halves the rate of a throttled operation """
+      bucket=self._bucket(operation)
+      with self._lock:
+          self._stats[operation]['throttles']+=1
+          bucket.set_rate(max(self._min_rate, bucket.rate() / 2))
+  
+  def record_success(self, operation):
+      """ Raises the rate of an operation slightly, up to its maximum """
+      bucket=self._bucket(operation)
+      max_rate=self._start_rates.get(operation, self._default_rate) * self._max_rate_factor
+      with self._lock:
+          if bucket.rate() < max_rate:
+              bucket.set_rate(min(max_rate, bucket.rate() + self._increase_step))
+  
+  def stats(self):
+      """ Returns a RateLimiterStats snapshot """
+      with self._lock:
+          my_operations={}
+          for operation in self._stats:
+              my_operations[operation]=dict(self._stats[operation], rate=self._buckets[operation].rate())
+      return RateLimiterStats(my_operations)
+  
+  def _before_send(self, event_name=None, **kwargs):
+      self.acquire(self._operation(event_name))
+  
+  def _after_attempt(self, event_name=None, response=None, **kwargs):
+      # returns None, so botocore's own retry handler still decides whether (and how long) to retry
+      operation=self._operation(event_name)
+      if response is None:
+          return
+      http_response, parsed=response
+      error_code=parsed.get('Error', {}).get('Code') if isinstance(parsed, dict) else None
+      if error_code in THROTTLING_ERROR_CODES or http_response.status_code == 429:
+          self.record_throttle(operation)
+      elif http_response.status_code < 300:
+          self.record_success(operation)
+
 #---
 #--- Session class used to perform work against an AWS Account+Region environment
 #---
 class Session:
-  def __init__(self, access_key="", secret_key="", session_token="", region_name="us-east-1"):
+  def __init__(self, access_key="", secret_key="", session_token="", region_name="us-east-1", cache=False, cache_ttls=None, cache_max_entries=10000, rate_limiter=None, max_attempts=10):
     """ 
     This method will initiate a session in the specified region. 
     Environmental Access Key and Secret will be used if none specified 
+    Specify cache=True to cache alarm, sns, log group and metric filter lookups. 
+      cache_ttls: per-resource TTL in seconds, e.g. {'alarms': 30}. See InventoryCache.default_ttls
+      cache_max_entries: most entries kept per resource before least recently used entries are evicted
+    Writes made through this session (put_*/delete_*) invalidate the affected cache entries.
+    All AWS calls go through a RateLimiter shared by this session's clients, and throttled calls are retried up to max_attempts times.
+      rate_limiter: a RateLimiter to share with other sessions. A new one is created if none specified.
     """
     self._region=region_name
     # if no access key/secret/session specified, or one missing, try to create via environment
@@ -46,9 +319,55 @@ class Session:
     else:
         self._session=boto3.session.Session(aws_access_key_id=access_key, aws_secret_access_key=secret_key, aws_session_token=session_token, region_name=self._region)
     # create clients to use for internal method calls
-    self._cloudwatch=self._session.client('cloudwatch', region_name=self._region)
-    self._sns=self._session.client('sns', region_name=self._region)
-    self._cwlogs=self._session.client('logs', region_name=self._region)   
+    # "standard" retry mode retries throttled calls with exponential backoff and jitter
+    client_config=botocore.config.Config(retries={'mode': 'standard', 'max_attempts': max_attempts})
+    self._cloudwatch=self._session.client('cloudwatch', region_name=self._region, config=client_config)
+    self._sns=self._session.client('sns', region_name=self._region, config=client_config)
+    self._cwlogs=self._session.client('logs', region_name=self._region, config=client_config)   
+    self._rate_limiter=rate_limiter or RateLimiter()
+    for client in [self._cloudwatch, self._sns, self._cwlogs]:
+        self._rate_limiter.attach(client)
+    self._cache=None
+    if cache:
+        self._cache=InventoryCache(ttls=cache_ttls, max_entries=cache_max_entries)
+    # the dashboards get_dashboard_index() last listed, which later calls only fetch the changes to
+    self._indexed_dashboards=None
+  
+  #---
+  #--- CACHE
+  #---
+  def clear_cache(self):
+      """ Removes everything from this session's cache, if caching is enabled, and the dashboards kept by get_dashboard_index() """
+      self._indexed_dashboards=None
+      if self._cache is not None:
+          self._cache.invalidate()
+  
+  def cache_stats(self):
+      """ Returns this session's cache statistics, or None if caching is not enabled """
+      if self._cache is None:
+          return None
+      return self._cache.stats()
+  
+  def rate_limiter_stats(self):
+      """ Returns RateLimiterStats (calls, throttles and time waited) for the AWS calls made through this session """
+      return self._rate_limiter.stats()
+  
+  def _cache_get(self, resource, key):
+      if self._cache is None:
+          return None
+      return self._cache.get(resource, key)
+  
+  def _cache_put(self, resource, key, value):
+      if self._cache is not None:
+          self._cache.put(resource, key, value)
+  
+  def _invalidate_cache(self, resource, key=None):
+      if resource == "dashboards":
+          # dashboards are not held in the InventoryCache, only as the listing get_dashboard_index() updates from
+          self._indexed_dashboards=None
+          return
+      if self._cache is not None:
+          self._cache.invalidate(resource, key)
   
   #---
   #--- ALARMS
@@ -57,13 +376,63 @@ class Session:
       """ 
       This function will find a single alarm matching specified name.
       """
-      my_alarm=self._cloudwatch.describe_alarms(AlarmNames=[alarm_name],AlarmTypes=['MetricAlarm','CompositeAlarm'])
-      if not my_alarm['MetricAlarms'] and not my_alarm['CompositeAlarms']:
+      my_alarms=self.get_alarms([alarm_name])
+      if my_alarms['MissingAlarms']:
           raise AlarmNotFound("Alarm '%s' not found" % alarm_name)
-      if my_alarm['MetricAlarms']:
-          return(my_alarm['MetricAlarms'][0])
-      if my_alarm['CompositeAlarms']:
-          return(my_alarm['CompositeAlarms'][0])
+      if alarm_name in my_alarms['MetricAlarms']:
+          return(my_alarms['MetricAlarms'][alarm_name])
+      return(my_alarms['CompositeAlarms'][alarm_name])
+  
+  def get_alarms(self, alarm_names, max_workers=8):
+      """ 
+      This function will find many alarms at once, in chunks of 100 names (the describe_alarms AlarmNames limit), with chunks run concurrently.
+      Returns MetricAlarms and CompositeAlarms keyed by AlarmName, and the names that were not found:
+        {'MetricAlarms': {name: alarm}, 'CompositeAlarms': {name: alarm}, 'MissingAlarms': [name]}
+      """
+      # remove duplicate names, but keep the order they were specified in
+      my_names=list(dict.fromkeys(alarm_names))
+      my_alarms={'MetricAlarms': {}, 'CompositeAlarms': {}, 'MissingAlarms': []}
+      # only look up the names that are not already cached
+      names_to_find=[]
+      for n in my_names:
+          cached_alarm=self._cache_get('alarms', n)
+          if cached_alarm is None:
+              names_to_find.append(n)
+          else:
+              my_alarms[self.get_alarm_type(cached_alarm) + 's'][n]=cached_alarm
+      chunks=_chunk_list(names_to_find, ALARM_NAMES_LIMIT)
+      if len(chunks) <= 1 or max_workers <= 1:
+          results=[self._describe_alarm_chunk(c) for c in chunks]
+      else:
+          with ThreadPoolExecutor(max_workers=max_workers) as executor:
+              results=list(executor.map(self._describe_alarm_chunk, chunks))
+      for r in results:
+          for a in r['MetricAlarms']:
+              my_alarms['MetricAlarms'][a['AlarmName']]=a
+              self._cache_put('alarms', a['AlarmName'], a)
+          for a in r['CompositeAlarms']:
+              my_alarms['CompositeAlarms'][a['AlarmName']]=a
+              self._cache_put('alarms', a['AlarmName'], a)
+      for n in my_names:
+          if n not in my_alarms['MetricAlarms'] and n not in my_alarms['CompositeAlarms']:
+              my_alarms['MissingAlarms'].append(n)
+      return my_alarms
+  
+  def _describe_alarm_chunk(self, alarm_names):
+      """ Runs a single describe_alarms lookup for up to 100 alarm names """
+      return self._cloudwatch.get_paginator('describe_alarms').paginate(AlarmNames=alarm_names,AlarmTypes=['MetricAlarm','CompositeAlarm']).build_full_result()
+  
+  def _resolve_alarm(self, alarm):
+      """ 
+      Returns an alarm object when passed either an alarm name, or an alarm object already returned by get_alarm/get_alarms.
+      This lets per-name helpers reuse alarms found in bulk, rather than looking each one up again.
+      Compact models (which are read-only) are returned as dicts, so callers can always change the alarm they get.
+      """
+      if isinstance(alarm, _Model):
+          return to_dict(alarm)
+      if isinstance(alarm, Mapping):
+          return alarm
+      return self.get_alarm(alarm)
   
   def get_alarm_type(self,my_alarm):
       """ 
@@ -76,19 +445,116 @@ class Session:
       else:
           raise Exception("Unable to determine alarm type for '%s' - bad object." % my_alarm)    
   
-  def get_all_alarms(self):
+  def get_all_alarms(self, compact=False):
       """ 
       This function will gather all available MetricAlarms an CompositeAlarms
+      Specify compact=True to return MetricAlarm and CompositeAlarm models rather than dicts, which use far less memory for large inventories.
       """
-      all_alarms=self._cloudwatch.get_paginator('describe_alarms').paginate(AlarmTypes=['MetricAlarm','CompositeAlarm']).build_full_result()
+      all_alarms=self._cache_get('alarms', None)
+      if all_alarms is None:
+          all_alarms=self._cloudwatch.get_paginator('describe_alarms').paginate(AlarmTypes=['MetricAlarm','CompositeAlarm']).build_full_result()
+          self._cache_put('alarms', None, all_alarms)
+      if compact:
+          my_shared={}
+          all_alarms=dict(all_alarms, MetricAlarms=[MetricAlarm(a, shared=my_shared) for a in all_alarms['MetricAlarms']], 
+                          CompositeAlarms=[CompositeAlarm(a, shared=my_shared) for a in all_alarms['CompositeAlarms']])
       return(all_alarms)
   
+  def iter_alarms(self, fields=None, prefetch=False, alarm_types=None, compact=False):
+      """ 
+      Yields all MetricAlarms and CompositeAlarms one at a time, page by page as they are listed, rather than holding every alarm in memory.
+        fields: keep only these keys of each alarm, e.g. ['AlarmName','StateValue']
+        prefetch: fetch the next page on a background thread while the current page is processed
+        compact: yield MetricAlarm and CompositeAlarm models rather than dicts
+        alarm_types: only yield these types, by default both ['MetricAlarm','CompositeAlarm']
+      """
+      valid_alarm_types=['MetricAlarm','CompositeAlarm']
+      if alarm_types is None:
+          alarm_types=valid_alarm_types
+      for alarm_type in alarm_types:
+          if alarm_type not in valid_alarm_types:
+              raise Exception("Error alarm_type '%s' invalid. Valid options: '%s'" % (alarm_type,str(valid_alarm_types)))
+      my_shared={}
+      for alarm_type, a in self._iter_alarm_pages(fields, prefetch, alarm_types):
+          if compact:
+              a=MetricAlarm(a, shared=my_shared) if alarm_type == "MetricAlarm" else CompositeAlarm(a, shared=my_shared)
+          yield a
+  
+  def _iter_alarm_pages(self, fields=None, prefetch=False, alarm_types=None):
+      """ Yields (type, alarm) for all alarms, from the cached listing if there is one """
+      if alarm_types is None:
+          alarm_types=['MetricAlarm','CompositeAlarm']
+      result_keys=[t + "s" for t in alarm_types]
+      all_alarms=self._cache_get('alarms', None)
+      if all_alarms is not None:
+          pages=[all_alarms]
+      else:
+          pages=self._cloudwatch.get_paginator('describe_alarms').paginate(AlarmTypes=alarm_types)
+      for result_key, a in _iter_pages(pages, result_keys, fields, prefetch):
+          yield (result_key[:-1], a)
+  
+  def watch_alarm_states(self, interval=60, callbacks=None, overlap=60, resync_interval=None):
+      """ 
+      Returns a started AlarmStateWatcher, which reports alarm state changes by reading only what changed since it last polled.
+        watcher=session.watch_alarm_states(callbacks=[print])
+        watcher.run()
+      """
+      return AlarmStateWatcher(self, interval=interval, callbacks=callbacks, overlap=overlap, resync_interval=resync_interval).start()
+  
+  def get_alarm_graph(self):
+      """ Returns an AlarmGraph of all alarms, for finding which composite alarms depend on which alarms """
+      return AlarmGraph(self.get_all_alarms())
+  
+  def get_alarm_dependents(self, alarm_name):
+      """ Returns the names of the composite alarms whose AlarmRule references alarm_name, found with a single describe_alarms(ParentsOfAlarmName) lookup """
+      my_parents=self._cloudwatch.get_paginator('describe_alarms').paginate(ParentsOfAlarmName=alarm_name, AlarmTypes=['CompositeAlarm']).build_full_result()
+      return [c['AlarmName'] for c in my_parents['CompositeAlarms'] if alarm_name in alarm_rule_references(c['AlarmRule'])]
+  
+  def _composite_alarm_graph(self):
+      """ Returns an AlarmGraph of the composite alarms only, which is all that is needed to find the dependents of any alarm """
+      all_alarms=self._cache_get('alarms', None)
+      if all_alarms is not None:
+          return AlarmGraph(all_alarms['CompositeAlarms'])
+      return AlarmGraph(self._cloudwatch.get_paginator('describe_alarms').paginate(AlarmTypes=['CompositeAlarm']).build_full_result()['CompositeAlarms'])
+  
+  def find_alarms(self, query, return_type="full_alarm", prefetch=False):
+      """ 
+      Returns the alarms matching an AlarmQuery (see AlarmIndex), listing only the alarms the describe_alarms API can narrow the query to.
+      Terms that must match (the query itself, or terms ANDed at its top level) are sent to the API: 'name' (or an OR of names) as AlarmNames, 
+      'name_prefix' as AlarmNamePrefix, 'action' as ActionPrefix, 'state' as StateValue and 'type' as AlarmTypes. 
+      The whole query is then checked locally against the alarms returned, so the results are the same as AlarmIndex(get_all_alarms()).query(query).
+        session.find_alarms(AlarmQuery('name_prefix','prod-') & AlarmQuery('state','ALARM') & AlarmQuery('namespace','AWS/RDS'))
+      return_type=['name','full_alarm']
+      """
+      valid_return_types=['name','full_alarm']
+      if return_type not in valid_return_types:
+          raise Exception("Error return_type '%s' invalid. Valid options: '%s'" % (return_type,str(valid_return_types)))
+      my_params=_alarm_query_pushdown(query)
+      all_alarms=self._cache_get('alarms', None)
+      if all_alarms is not None:
+          my_alarms=list(all_alarms['MetricAlarms']) + list(all_alarms['CompositeAlarms'])
+      elif my_params is None:
+          my_alarms=[]
+      else:
+          my_alarms=[]
+          my_alarm_names=my_params.pop('AlarmNames', None)
+          if my_alarm_names is None:
+              my_calls=[my_params]
+          else:
+              my_calls=[dict(my_params, AlarmNames=chunk) for chunk in _chunk_list(my_alarm_names, ALARM_NAMES_LIMIT)]
+          for my_call in my_calls:
+              pages=self._cloudwatch.get_paginator('describe_alarms').paginate(**my_call)
+              my_alarms.extend(a for result_key, a in _iter_pages(pages, ['MetricAlarms','CompositeAlarms'], None, prefetch))
+      return AlarmIndex(my_alarms).query(query, return_type=return_type)
+  
   def put_metric_alarm(self,my_alarm,overwrite=False):
       """ 
       This fomo function will create a metric alarm when passed a metric alarm object. It's intent is to abstract the user from how to craft the specific payload.
       This helps with quick "inline" modifications of alarms, as well, when using fomo functions on the command line.
       As a safety precaution, it will not overwrite alarms by default, so "overwrite=True" must be specified.
+      A MetricAlarm model may be passed instead of a dict.
       """
+      my_alarm=to_dict(my_alarm)
       # unless specified otherwise, the following will prevent an alarm from being overwritten
       if not isinstance(overwrite, bool):
           raise TypeError("overwrite Must be boolean (True/False) : '%s' specified." % overwrite)
@@ -106,6 +572,14 @@ class Session:
           my_alarm['DatapointsToAlarm']=my_alarm['EvaluationPeriods']
       if "AlarmDescription" not in my_alarm:
           my_alarm['AlarmDescription']="No description"
+      try:
+          self._send_metric_alarm(my_alarm)
+      finally:
+          # the alarm has been (re)written, so any cached copy is stale
+          self._invalidate_cache('alarms', my_alarm['AlarmName'])
+  
+  def _send_metric_alarm(self, my_alarm):
+      """ Sends the PutMetricAlarm payload matching the shape of the given metric alarm object """
       try:
           # this block is used for MetricAlarms based on a single metric
           if my_alarm['MetricName']:
@@ -197,7 +671,9 @@ class Session:
       """ 
       This fomo function will create a composite alarm when passed a composite alarm object.
       It is meant to be reusable, and abstract the user from the logic needed to determine how to craft the PutCompositeAlarm payload.
+      A CompositeAlarm model may be passed instead of a dict.
       """
+      my_alarm=to_dict(my_alarm)
       if not isinstance(overwrite, bool):
           raise TypeError("overwrite Must be boolean (True/False) : '%s' specified." % overwrite)
       if not overwrite:
@@ -208,15 +684,18 @@ class Session:
               pass
       if "AlarmDescription" not in my_alarm:
           my_alarm['AlarmDescription']="No description"
-      self._cloudwatch.put_composite_alarm(
-          ActionsEnabled=my_alarm['ActionsEnabled'],
-          AlarmActions=my_alarm['AlarmActions'],
-          AlarmDescription=my_alarm['AlarmDescription'],
-          AlarmName=my_alarm['AlarmName'],
-          AlarmRule=my_alarm['AlarmRule'],
-          InsufficientDataActions=my_alarm['InsufficientDataActions'],
-          OKActions=my_alarm['OKActions']
-      )
+      try:
+          self._cloudwatch.put_composite_alarm(
+              ActionsEnabled=my_alarm['ActionsEnabled'],
+              AlarmActions=my_alarm['AlarmActions'],
+              AlarmDescription=my_alarm['AlarmDescription'],
+              AlarmName=my_alarm['AlarmName'],
+              AlarmRule=my_alarm['AlarmRule'],
+              InsufficientDataActions=my_alarm['InsufficientDataActions'],
+              OKActions=my_alarm['OKActions']
+          )
+      finally:
+          self._invalidate_cache('alarms', my_alarm['AlarmName'])
       return
   
   def rename_alarm(self, alarm_name, new_alarm_name, keep_old_alarm):
@@ -230,6 +709,11 @@ class Session:
       #if len(new_alarm_name == 0):
       #    raise Exception("new_alarm_name cannot be empty string.")
       my_alarm = self.get_alarm(alarm_name)
+      if not keep_old_alarm:
+          # the old alarm can't be deleted while composite alarms reference it, so stop before anything is written
+          my_dependents=self.get_alarm_dependents(alarm_name)
+          if my_dependents:
+              raise Exception("Alarm '%s' is referenced by composite alarms '%s'. Use rename_alarms, which updates them too." % (alarm_name, "', '".join(my_dependents)))
       # update the alarm name in code object
       my_alarm['AlarmName']=new_alarm_name
       alarm_type=self.get_alarm_type(my_alarm)
@@ -245,10 +729,16 @@ class Session:
   def get_alarms_from_list(self):
       """ This will create a List of alarms from a newline seperated list of alarm names, input directly into console """
       print("Please paste newline delimited list of Alarm Names.(Press Ctrl+D when done.)")
-      alarm_names=sys.stdin.readlines()
+      alarm_names=[n.strip('\n') for n in sys.stdin.readlines() if n.strip('\n') != ""]
+      found_alarms=self.get_alarms(alarm_names)
+      if found_alarms['MissingAlarms']:
+          raise AlarmNotFound("Alarms not found: '%s'" % "', '".join(found_alarms['MissingAlarms']))
       my_alarms=[]
       for n in alarm_names:
-          my_alarms.append(self.get_alarm(n.strip('\n')))
+          if n in found_alarms['MetricAlarms']:
+              my_alarms.append(found_alarms['MetricAlarms'][n])
+          else:
+              my_alarms.append(found_alarms['CompositeAlarms'][n])
       print("Successfully found all alarms.")
       return my_alarms
   
@@ -281,15 +771,8 @@ class Session:
       print("")
       response=input("Please confirm that you want to perform these renames (y/n)")
       if response.lower() == "y":
-          for a in alarm_rename_list:
-              print("Disabling alarm... ")
-              self.disable_alarm(a[0])
-              time.sleep(2)
-              print("Renaming alarm...")
-              print("FROM: " + a[0])
-              print("TO  : " + a[1])
-              self.rename_alarm(a[0],a[1],keep_old_alarm=False)
-              print("")
+          print("Renaming alarms...")
+          self.rename_alarms({a[0]: a[1] for a in alarm_rename_list})
       else:
           print("Response 'y' not specified. No renames performed.")
           return
@@ -314,6 +797,146 @@ class Session:
       print("Alarms that were Enabled before renamed")    
       print(tabulate(alarm_enabled_list))
   
+  def rename_alarms(self, alarm_renames, journal_path=None, resume=False, keep_disabled=True, max_workers=8, calls_per_second=None):
+      """ 
+      Renames many alarms at once, non-interactively. alarm_renames: {old_alarm_name: new_alarm_name}
+      The renames are run in steps, each step done in bulk or through a pool of max_workers threads:
+        1. the old alarms are found in bulk, and disabled in bulk
+        2. the new alarms are created - metric alarms first, then composite alarms in dependency order
+        3. composite alarms whose AlarmRule references a renamed alarm are updated to reference the new name
+        4. the old alarms are deleted - composite alarms before the alarms they reference
+      Like rename_alarms_by_list, the new alarms are left Disabled (ActionsEnabled=False) unless keep_disabled=False, 
+      which re-enables the new alarms whose old alarm was enabled.
+      If journal_path is specified, the alarm definitions and progress are written to it after each step.
+      An interrupted run can then be continued with resume=True (without re-fetching the alarms), or undone with rollback_alarm_renames.
+      Calls are limited by the session's RateLimiter. calls_per_second optionally caps the rate of alarm puts further.
+      Returns the journal.
+      """
+      if resume:
+          if journal_path is None:
+              raise Exception("journal_path must be specified to resume renames.")
+          my_journal=_load_rename_journal(journal_path)
+      else:
+          if journal_path is not None and os.path.exists(journal_path):
+              raise Exception("The journal_path specified '%s' already exists. Specify resume=True to continue those renames, or a different path." % journal_path)
+          my_journal=self._start_rename_journal(alarm_renames)
+          _write_rename_journal(my_journal, journal_path)
+      if my_journal.get('RolledBack'):
+          raise Exception("The renames in journal '%s' have been rolled back, and cannot be resumed." % journal_path)
+      limiter=_TokenBucket(calls_per_second) if calls_per_second else None
+      renames=my_journal['Renames']
+      old_alarms=my_journal['Alarms']
+      steps=my_journal['CompletedSteps']
+      if "disable" not in steps:
+          self.disable_alarms(list(renames.keys()), max_workers=max_workers)
+          steps.append("disable")
+          _write_rename_journal(my_journal, journal_path)
+      if "create" not in steps:
+          new_alarms=[]
+          for old_name, new_name in renames.items():
+              new_alarm=copy.deepcopy(old_alarms[old_name])
+              new_alarm['AlarmName']=new_name
+              new_alarm['ActionsEnabled']=False
+              if "AlarmRule" in new_alarm:
+                  new_alarm['AlarmRule']=rename_alarm_rule_references(new_alarm['AlarmRule'], renames)
+              new_alarms.append(new_alarm)
+          # every alarm a composite alarm references must exist before it is created
+          for wave in _alarm_dependency_waves(new_alarms):
+              self._put_alarms_limited(wave, limiter, max_workers)
+          steps.append("create")
+          _write_rename_journal(my_journal, journal_path)
+      if "update" not in steps:
+          updated_composites=[]
+          for a in my_journal['Composites'].values():
+              updated_composite=copy.deepcopy(a)
+              updated_composite['AlarmRule']=rename_alarm_rule_references(a['AlarmRule'], renames)
+              updated_composites.append(updated_composite)
+          self._put_alarms_limited(updated_composites, limiter, max_workers)
+          steps.append("update")
+          _write_rename_journal(my_journal, journal_path)
+      if "delete" not in steps:
+          # composite alarms must be removed before the alarms they reference, so delete in reverse dependency order
+          for wave in reversed(_alarm_dependency_waves(list(old_alarms.values()))):
+              self.delete_alarms([a['AlarmName'] for a in wave], confirm=True, max_workers=max_workers, check_dependents=False)
+          steps.append("delete")
+          _write_rename_journal(my_journal, journal_path)
+      if "enable" not in steps:
+          if not keep_disabled:
+              self.enable_alarms([renames[n] for n in renames if old_alarms[n]['ActionsEnabled']], max_workers=max_workers)
+          steps.append("enable")
+          _write_rename_journal(my_journal, journal_path)
+      return my_journal
+  
+  def rollback_alarm_renames(self, journal_path, max_workers=8, calls_per_second=None):
+      """ 
+      Undoes the renames recorded in a rename_alarms journal, using the alarm definitions saved in it:
+      the old alarms are re-created as they were, updated composite alarms are put back, and the new alarms are deleted.
+      """
+      my_journal=_load_rename_journal(journal_path)
+      limiter=_TokenBucket(calls_per_second) if calls_per_second else None
+      renames=my_journal['Renames']
+      old_alarms=list(my_journal['Alarms'].values())
+      for wave in _alarm_dependency_waves(old_alarms):
+          self._put_alarms_limited(copy.deepcopy(wave), limiter, max_workers)
+      self._put_alarms_limited(copy.deepcopy(list(my_journal['Composites'].values())), limiter, max_workers)
+      new_alarms=[]
+      for a in old_alarms:
+          new_alarm=dict(a, AlarmName=renames[a['AlarmName']])
+          if "AlarmRule" in new_alarm:
+              new_alarm['AlarmRule']=rename_alarm_rule_references(new_alarm['AlarmRule'], renames)
+          new_alarms.append(new_alarm)
+      for wave in reversed(_alarm_dependency_waves(new_alarms)):
+          found_alarms=self.get_alarms([a['AlarmName'] for a in wave], max_workers=max_workers)
+          existing_names=list(found_alarms['MetricAlarms'].keys()) + list(found_alarms['CompositeAlarms'].keys())
+          self.delete_alarms(existing_names, confirm=True, max_workers=max_workers, check_dependents=False)
+      my_journal['RolledBack']=True
+      _write_rename_journal(my_journal, journal_path)
+      return my_journal
+  
+  def _start_rename_journal(self, alarm_renames):
+      """ Finds and validates the alarms to rename, and the composite alarms that reference them, for a new rename_alarms journal """
+      new_names=list(alarm_renames.values())
+      if len(set(new_names)) != len(new_names):
+          raise Exception("New alarm names must be unique.")
+      if "" in new_names:
+          raise Exception("New alarm names cannot be empty strings.")
+      found_alarms=self.get_alarms(list(alarm_renames.keys()))
+      if found_alarms['MissingAlarms']:
+          raise AlarmNotFound("Alarms not found: '%s'" % "', '".join(found_alarms['MissingAlarms']))
+      existing_alarms=self.get_alarms(new_names)
+      existing_names=list(existing_alarms['MetricAlarms'].keys()) + list(existing_alarms['CompositeAlarms'].keys())
+      if existing_names:
+          raise Exception("Alarms already exist with new names: '%s'" % "', '".join(existing_names))
+      my_alarms={}
+      my_alarms.update(found_alarms['MetricAlarms'])
+      my_alarms.update(found_alarms['CompositeAlarms'])
+      # composite alarms that are not renamed themselves, but reference an alarm that is
+      composites={}
+      my_graph=self._composite_alarm_graph()
+      for old_name in alarm_renames:
+          for c in my_graph.dependents(old_name):
+              if c not in alarm_renames:
+                  composites[c]=my_graph.get(c)
+      return {
+          'Renames': dict(alarm_renames),
+          'Alarms': json.loads(json.dumps(my_alarms, default=str)),
+          'Composites': json.loads(json.dumps(composites, default=str)),
+          'CompletedSteps': [],
+          'RolledBack': False
+      }
+  
+  def _put_alarms_limited(self, my_alarms, limiter, max_workers):
+      """ Puts (overwriting) metric and composite alarms through a pool of max_workers threads, waiting on limiter (if any) before each call """
+      def put_alarm(my_alarm):
+          if limiter is not None:
+              limiter.acquire()
+          if self.get_alarm_type(my_alarm) == "CompositeAlarm":
+              self.put_composite_alarm(my_alarm, overwrite=True)
+          else:
+              self.put_metric_alarm(my_alarm, overwrite=True)
+      if my_alarms:
+          with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+              list(executor.map(put_alarm, my_alarms))
   
   def delete_alarm(self, alarm_name, confirm=False):
       """ Simple method to delete alarm specified by alarm_name """
@@ -323,7 +946,50 @@ class Session:
           raise Exception("Alarm '%s' not removed : If it exists, you must specify confirm=True to remove it." % alarm_name)    
       if confirm:     
           self.get_alarm(alarm_name)
-          self._cloudwatch.delete_alarms(AlarmNames=[alarm_name])
+          my_dependents=self.get_alarm_dependents(alarm_name)
+          if my_dependents:
+              raise Exception("Alarm '%s' not removed : it is referenced by composite alarms '%s'." % (alarm_name, "', '".join(my_dependents)))
+          try:
+              self._cloudwatch.delete_alarms(AlarmNames=[alarm_name])
+          finally:
+              self._invalidate_cache('alarms', alarm_name)
+  
+  def delete_alarms(self, alarm_names, confirm=False, max_workers=8, check_dependents=True):
+      """ 
+      Deletes many alarms at once, 100 names per DeleteAlarms call, with calls run concurrently. Must confirm=True
+      alarm_names may be names or alarm objects. Names are not looked up first.
+      Unless check_dependents=False, the composite alarms are listed first (one scan), and:
+        - if a composite alarm that is not being deleted references one being deleted, nothing is deleted, and an exception names them
+        - composite alarms are deleted before the alarms they reference
+      """
+      if not isinstance(confirm, bool):
+          raise TypeError("confirm Must be boolean (True/False) : '%s' specified." % confirm)
+      if not confirm:
+          raise Exception("Alarms not removed : If they exist, you must specify confirm=True to remove them.")
+      my_names=list(dict.fromkeys([a['AlarmName'] if isinstance(a, Mapping) else a for a in alarm_names]))
+      def delete_chunk(chunk):
+          try:
+              self._cloudwatch.delete_alarms(AlarmNames=chunk)
+          finally:
+              for n in chunk:
+                  self._invalidate_cache('alarms', n)
+      waves=[my_names]
+      if check_dependents and my_names:
+          my_graph=self._composite_alarm_graph()
+          deleting=set(my_names)
+          blocked={n: [d for d in my_graph.dependents(n) if d not in deleting] for n in my_names}
+          blocked={n: d for n, d in blocked.items() if d}
+          if blocked:
+              raise Exception("Alarms not removed : some are referenced by composite alarms that are not being removed: %s" % 
+                              "; ".join("'%s' by '%s'" % (n, "', '".join(d)) for n, d in blocked.items()))
+          composite_waves=AlarmGraph([my_graph.get(n) for n in my_names if n in my_graph]).waves()
+          waves=[[a['AlarmName'] for a in wave] for wave in reversed(composite_waves)] + [[n for n in my_names if n not in my_graph]]
+      for wave in waves:
+          chunks=_chunk_list(wave, ALARM_NAMES_LIMIT)
+          if chunks:
+              with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+                  list(executor.map(delete_chunk, chunks))
+      return my_names
   
   def copy_alarm(self, alarm_name, new_alarm_name):
       """
@@ -334,28 +1000,67 @@ class Session:
   def disable_alarm(self, alarm_name):
       """ 
       Disable an alarm's actions for maintenace or otherwise. 
-      Since this function is only modifying "ActionsEnabled", overwrite is set to True
+      Only "ActionsEnabled" is changed (via DisableAlarmActions), the rest of the alarm is not re-written.
+      alarm_name may also be an alarm object returned by get_alarms, to avoid looking it up again.
       """
-      my_alarm=self.get_alarm(alarm_name)
-      my_alarm['ActionsEnabled']=False
-      alarm_type=self.get_alarm_type(my_alarm)
-      if alarm_type == 'MetricAlarm':
-          self.put_metric_alarm(my_alarm,overwrite=True)
-      if alarm_type == 'CompositeAlarm':
-          self.put_composite_alarm(my_alarm,overwrite=True)
+      my_alarm=self._resolve_alarm(alarm_name)
+      self.disable_alarms([my_alarm['AlarmName']])
+      # a dict passed in is updated to match; compact models are read-only, and are left as they are
+      if isinstance(alarm_name, dict):
+          alarm_name['ActionsEnabled']=False
   
   def enable_alarm(self, alarm_name):
       """ 
       Will enable an alarm's actions 
-      Since this function is only modifying "ActionsEnabled", overwrite is set to True
+      Only "ActionsEnabled" is changed (via EnableAlarmActions), the rest of the alarm is not re-written.
+      alarm_name may also be an alarm object returned by get_alarms, to avoid looking it up again.
       """
-      my_alarm=self.get_alarm(alarm_name)
-      my_alarm['ActionsEnabled']=True
-      alarm_type=self.get_alarm_type(my_alarm)
-      if alarm_type == 'MetricAlarm':
-          self.put_metric_alarm(my_alarm,overwrite=True)
-      if alarm_type == 'CompositeAlarm':
-          self.put_composite_alarm(my_alarm,overwrite=True)
+      my_alarm=self._resolve_alarm(alarm_name)
+      self.enable_alarms([my_alarm['AlarmName']])
+      # a dict passed in is updated to match; compact models are read-only, and are left as they are
+      if isinstance(alarm_name, dict):
+          alarm_name['ActionsEnabled']=True
+  
+  def disable_alarms(self, alarm_names=None, index=None, query=None, max_workers=8):
+      """ 
+      Disable the actions of many alarms at once, via DisableAlarmActions with 100 names per call, and the calls run concurrently.
+      Alarms are picked by a list of names or alarm objects (e.g. the output of filter_metric_alarms), or by an AlarmQuery run against an AlarmIndex:
+        session.disable_alarms(index=my_index, query=AlarmQuery('namespace','AWS/RDS'))
+      Names are not looked up first. Returns the list of alarm names sent.
+      """
+      return self._set_alarm_actions(False, alarm_names, index, query, max_workers)
+  
+  def enable_alarms(self, alarm_names=None, index=None, query=None, max_workers=8):
+      """ 
+      Enable the actions of many alarms at once, via EnableAlarmActions with 100 names per call, and the calls run concurrently.
+      Alarms are picked by a list of names or alarm objects (e.g. the output of filter_metric_alarms), or by an AlarmQuery run against an AlarmIndex:
+        session.enable_alarms(index=my_index, query=AlarmQuery('namespace','AWS/RDS'))
+      Names are not looked up first. Returns the list of alarm names sent.
+      """
+      return self._set_alarm_actions(True, alarm_names, index, query, max_workers)
+  
+  def _set_alarm_actions(self, actions_enabled, alarm_names, index, query, max_workers):
+      """ Shared implementation of enable_alarms/disable_alarms """
+      if alarm_names is None:
+          if index is None or query is None:
+              raise Exception("Either alarm_names, or both index and query, must be specified.")
+          alarm_names=index.query(query, return_type="name")
+      my_names=list(dict.fromkeys([a['AlarmName'] if isinstance(a, Mapping) else a for a in alarm_names]))
+      if actions_enabled:
+          api_call=self._cloudwatch.enable_alarm_actions
+      else:
+          api_call=self._cloudwatch.disable_alarm_actions
+      def set_chunk(chunk):
+          try:
+              api_call(AlarmNames=chunk)
+          finally:
+              for n in chunk:
+                  self._invalidate_cache('alarms', n)
+      chunks=_chunk_list(my_names, ALARM_NAMES_LIMIT)
+      if chunks:
+          with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+              list(executor.map(set_chunk, chunks))
+      return my_names
   
   def replace_active_alarm_string(self,alarm_name, search_string, replace_string, make_alarm_update=False):
       """
@@ -381,6 +1086,7 @@ class Session:
         modify_action: add,remove
         action_type: AlarmActions,OKActions,InsufficientDataActions
         sns_name: Valid sns topic name. Can be discovered with get_all_sns()
+      alarm_name may also be an alarm object returned by get_alarms, to avoid looking it up again.
       """
       valid_modify_actions=['add','remove']
       if modify_action not in valid_modify_actions:
@@ -388,7 +1094,7 @@ class Session:
       valid_action_types=['OKActions','AlarmActions','InsufficientDataActions']
       if action_type not in valid_action_types:
           raise Exception("Error action_type '%s' invalid. Valid options: '%s'" % (action_type,str(valid_action_types)))       
-      my_alarm=self.get_alarm(alarm_name)
+      my_alarm=self._resolve_alarm(alarm_name)
       my_sns=self.get_sns(sns_name)
       if modify_action == 'add':
           if my_sns not in my_alarm[action_type]:
@@ -403,17 +1109,21 @@ class Session:
       """ 
       Will update how an alarm handles missing data.
         treat_missing_data: missing,breaching,notBreaching,ignore 
+      alarm_name may also be an alarm object returned by get_alarms, to avoid looking it up again.
       """
       valid_missing_options=['missing','breaching','notBreaching','ignore']
       if treat_missing_data not in valid_missing_options:
           raise Exception("Option treat_missing_data '%s' invalid. Valid options: '%s'" % (treat_missing_data,str(valid_missing_options)))
-      my_alarm=self.get_alarm(alarm_name)
+      my_alarm=self._resolve_alarm(alarm_name)
       my_alarm['TreatMissingData']=treat_missing_data
       self.put_metric_alarm(my_alarm,overwrite=True)
   
   def modify_alarm_description(self, alarm_name, impacted_ci, affected_ci, details="", overwrite=False):
-      """ This method will perform a standardized update of Alarm descriptions """
-      my_alarm=self.get_alarm(alarm_name)
+      """ 
+      This method will perform a standardized update of Alarm descriptions 
+      alarm_name may also be an alarm object returned by get_alarms, to avoid looking it up again.
+      """
+      my_alarm=self._resolve_alarm(alarm_name)
       my_description=""
       my_description_lines=my_alarm["AlarmDescription"].split("\n")
       # find Impacte_CI first - if not found, create it
@@ -497,12 +1207,19 @@ class Session:
       f.write(my_alarm_str)
       f.close()
 
-  def backup_all_alarms(self, filepath, overwrite=False):
+  def backup_all_alarms(self, filepath, overwrite=False, stream=False, compression=None):
       """ 
       Backs up all avaialble alarms configurations to a file.
+      Specify stream=True to write a streaming backup (see BackupWriter) instead: one alarm per line, written as each page of alarms arrives,
+      so memory use stays flat however many alarms there are. compression='gzip' or 'zstd' compresses it, and implies stream=True.
       """
       if os.path.exists(filepath) and overwrite == False:
           raise Exception("The filepath specified '%s' already exists, and overwrite=False. Specify overwrite=True, or a different path, to create the backup." % filepath)
+      if stream or compression:
+          with self._backup_writer(filepath, "alarms", compression) as writer:
+              for alarm_type, a in self._iter_alarm_pages(prefetch=True):
+                  writer.write(a, alarm_type)
+          return
       my_alarms_str=json.dumps(self.get_all_alarms(),default=str)
       f=open(filepath,"w")
       f.write(my_alarms_str)
@@ -510,25 +1227,66 @@ class Session:
   
   def restore_alarm(self, filepath, alarm_name, confirm=False):
       """ 
-      This command will restore an alarm's configuration from a file.
-      """
-      my_alarms=self.load_alarms(filepath)
-      alarm_found=False
-      for alarm in my_alarms['MetricAlarms']:
-          if alarm['AlarmName'] == alarm_name:
-              print("Alarm found : " + alarm['AlarmArn'])
-              alarm_found=True
-              if confirm == False:
-                  response=input("Confirm you want to restore this alarm from file? (y/n)")
-                  if response.lower() == "y":
-                      confirm=True
-                  else:
-                      print("Response 'y' not specified. Alarm not restored.")
-              if confirm == True:
-                  self.put_metric_alarm(alarm,overwrite=True)
-                  print("Successfully restored alarm '%s'!" % alarm_name)
-      if alarm_found==False:
+      This command will restore an alarm's (metric or composite) configuration from a file.
+      To restore many alarms from one file, use restore_many or restore_all.
+      """
+      my_entries=[e for e in index_backup(filepath, [alarm_name]).get(alarm_name, []) if e[0] in ['MetricAlarm','CompositeAlarm']]
+      if not my_entries:
           print("Alarm '%s' was not found." % alarm_name)
+          return
+      object_type, alarm=my_entries[0][0], my_entries[0][2]
+      print("Alarm found : " + alarm.get('AlarmArn', alarm_name))
+      if confirm == False:
+          response=input("Confirm you want to restore this alarm from file? (y/n)")
+          if response.lower() == "y":
+              confirm=True
+          else:
+              print("Response 'y' not specified. Alarm not restored.")
+      if confirm == True:
+          if object_type == "CompositeAlarm":
+              self.put_composite_alarm(alarm,overwrite=True)
+          else:
+              self.put_metric_alarm(alarm,overwrite=True)
+          print("Successfully restored alarm '%s'!" % alarm_name)
+  
+  def restore_all(self, filepath, confirm=False, max_workers=8):
+      """ 
+      Restores everything in a backup file of alarms, dashboards or metric filters. See restore_many.
+      """
+      return self.restore_many(filepath, names=None, confirm=confirm, max_workers=max_workers)
+  
+  def restore_many(self, filepath, names=None, confirm=False, max_workers=8):
+      """ 
+      Restores many objects from a backup file of alarms, dashboards or metric filters (any backup format), loading the file once.
+        names: names to restore, or None for everything in the file. Metric filters can be named "<filterName>" or "<logGroupName>:<filterName>"
+      Metric alarms are restored before composite alarms, and composite alarms in dependency order, through a pool of max_workers threads.
+      Unless confirm=True, the objects to restore are listed, and a single confirmation is asked for.
+      Returns a per-object report: [{'Action','Type','Name','Status','Error'}]. Names not found in the file are reported with Status 'not found'.
+      """
+      my_index=index_backup(filepath, names)
+      report=[]
+      restores={}
+      if names is None:
+          names=list(my_index.keys())
+      for name in names:
+          if name not in my_index:
+              report.append({'Action': 'restore', 'Type': None, 'Name': name, 'Status': 'not found', 'Error': None})
+              continue
+          for object_type, key, my_object in my_index[name]:
+              restores[(object_type, key)]={'Action': 'restore', 'Type': object_type, 'Name': key, 'Desired': my_object, 'Live': None}
+      restores=list(restores.values())
+      if not restores:
+          print("Nothing found to restore.")
+          return report
+      if confirm == False:
+          print(tabulate([[r['Type'], r['Name']] for r in restores], headers=['Type','Name']))
+          response=input("Confirm you want to restore these %d objects from file? (y/n)" % len(restores))
+          if response.lower() != "y":
+              print("Response 'y' not specified. Nothing restored.")
+              return report
+      report.extend(self._put_changes(restores, max_workers))
+      print("Restored %d of %d objects." % (len([r for r in report if r['Status'] == "success"]), len(restores)))
+      return report
   
   #---
   #--- SNS
@@ -537,8 +1295,12 @@ class Session:
       """ 
       Gets all SNS topics
       """
-      all_topics=self._sns.get_paginator('list_topics').paginate().build_full_result()
-      return(all_topics['Topics'])
+      all_topics=self._cache_get('sns', None)
+      if all_topics is not None:
+          return(all_topics)
+      all_topics=self._sns.get_paginator('list_topics').paginate().build_full_result()['Topics']
+      self._cache_put('sns', None, all_topics)
+      return(all_topics)
   
   def get_sns(self, sns_name):
       """ 
@@ -557,7 +1319,10 @@ class Session:
   
   def create_sns(self, sns_name):
       """ Creates a new SNS topic of the given Name """
-      self._sns.create_topic(Name=sns_name)
+      try:
+          self._sns.create_topic(Name=sns_name)
+      finally:
+          self._invalidate_cache('sns')
   
   def add_sns_subscription(self, sns_name, subscription_type, subscription_target):
       """ 
@@ -574,16 +1339,56 @@ class Session:
   
   def delete_sns(self, sns_name):
       """ Deletes a sns topic, specified by name """
-      my_topic=get_sns(sns_name)
-      self._sns.delete_topic(TopicArn=my_topic)
+      my_topic=self.get_sns(sns_name)
+      try:
+          self._sns.delete_topic(TopicArn=my_topic)
+      finally:
+          self._invalidate_cache('sns')
   
   def get_sns_subscriptions(self, sns_name):
       """
       Obtains and returns list of SNS subscriptions related to a given SNS topic.
+      To get the subscriptions of many topics, use get_all_sns_with_subscriptions, which lists all subscriptions at once.
       """
       my_sns=self.get_sns(sns_name)
-      my_sns_subscriptions = sns.list_subscriptions_by_topic(TopicArn=my_sns)
+      my_sns_subscriptions = self._sns.get_paginator('list_subscriptions_by_topic').paginate(TopicArn=my_sns).build_full_result()
       return my_sns_subscriptions
+  
+  def get_all_sns_with_subscriptions(self, include_alarms=True):
+      """ 
+      Gets all SNS topics with their subscriptions, and the alarms that notify them, from one paginated scan each of
+      topics, subscriptions and (if include_alarms) alarms, joined by TopicArn. Returns:
+        {'Topics': {TopicArn: {'TopicArn','Name','Subscriptions': [subscription],'Alarms': [AlarmName]}},
+         'EndpointTopics': {Endpoint: [TopicArn]},          - the topics each endpoint (e.g. email address) is subscribed to
+         'TopicAlarms': {TopicArn: [AlarmName]},            - the alarms with the topic in their actions, including topics not listed (e.g. other regions)
+         'OrphanedSubscriptions': [subscription]}           - subscriptions to topics that were not listed
+      """
+      my_inventory={'Topics': {}, 'EndpointTopics': {}, 'TopicAlarms': {}, 'OrphanedSubscriptions': []}
+      for t in self.get_all_sns():
+          my_inventory['Topics'][t['TopicArn']]={'TopicArn': t['TopicArn'], 'Name': t['TopicArn'].split(":")[-1], 'Subscriptions': [], 'Alarms': []}
+      for page in self._sns.get_paginator('list_subscriptions').paginate():
+          for sub in page['Subscriptions']:
+              my_topic=my_inventory['Topics'].get(sub['TopicArn'])
+              if my_topic is None:
+                  my_inventory['OrphanedSubscriptions'].append(sub)
+              else:
+                  my_topic['Subscriptions'].append(sub)
+              my_topics=my_inventory['EndpointTopics'].setdefault(sub['Endpoint'], [])
+              if sub['TopicArn'] not in my_topics:
+                  my_topics.append(sub['TopicArn'])
+      if include_alarms:
+          all_alarms=self.get_all_alarms()
+          for a in list(all_alarms['MetricAlarms']) + list(all_alarms['CompositeAlarms']):
+              my_actions=set(a.get('AlarmActions', [])) | set(a.get('OKActions', [])) | set(a.get('InsufficientDataActions', []))
+              for action in sorted(my_actions):
+                  # the ARN's service field, so SNS topics of every partition (aws, aws-cn, aws-us-gov) are included
+                  my_arn=action.split(":")
+                  if len(my_arn) < 6 or my_arn[0] != "arn" or my_arn[2] != "sns":
+                      continue
+                  my_inventory['TopicAlarms'].setdefault(action, []).append(a['AlarmName'])
+                  if action in my_inventory['Topics']:
+                      my_inventory['Topics'][action]['Alarms'].append(a['AlarmName'])
+      return my_inventory
  
   #---
   #--- DASHBOARDS
@@ -596,14 +1401,47 @@ class Session:
           raise DashboardNotFound("Dashboard '%s' not found" % dashboard_name)
       return dashboard
   
-  def get_all_dashboards(self):
-      """ Get all dashboards from cloudwatch """
-      db_list=self._cloudwatch.list_dashboards()
-      my_dashboards=[]
-      for db in db_list['DashboardEntries']:
-          dbname=db['DashboardName']
-          my_dashboards.append(self._cloudwatch.get_dashboard(DashboardName=dbname))
-      return my_dashboards
+  def get_all_dashboards(self, max_workers=8, since=None, compact=False):
+      """ 
+      Get all dashboards from cloudwatch.
+      Dashboards are listed page by page, then fetched by up to max_workers threads.
+      Throttled calls are retried by the session's clients, with exponential backoff and jitter, up to the Session's max_attempts.
+      Each dashboard returned includes the 'LastModified' time from its listing.
+      since: a list of dashboards previously returned by get_all_dashboards (or loaded from a backup of one).
+             Only dashboards whose LastModified has changed are fetched again, the others are reused from since.
+      Specify compact=True to return Dashboard models rather than dicts.
+      """
+      db_entries=self._cloudwatch.get_paginator('list_dashboards').paginate().build_full_result()['DashboardEntries']
+      previous_dashboards={}
+      for db in (since or []):
+          previous_dashboards[db['DashboardName']]=db
+      my_dashboards=[None] * len(db_entries)
+      entries_to_fetch=[]
+      for i, db in enumerate(db_entries):
+          previous_db=previous_dashboards.get(db['DashboardName'])
+          # compared as strings, since dashboards loaded from a backup file hold LastModified as a string
+          if previous_db is not None and str(previous_db.get('LastModified')) == str(db['LastModified']):
+              my_dashboards[i]=previous_db
+          else:
+              entries_to_fetch.append((i, db))
+      def fetch_dashboard(entry):
+          i, db=entry
+          try:
+              # throttling is retried inside the call by the client's "standard" retry mode (see Session.__init__), not here
+              my_db=self._cloudwatch.get_dashboard(DashboardName=db['DashboardName'])
+          except botocore.exceptions.ClientError as error:
+              # deleted since it was listed
+              if error.response.get('Error',{}).get('Code') == 'ResourceNotFound':
+                  return
+              raise
+          my_db['LastModified']=db['LastModified']
+          my_dashboards[i]=my_db
+      if entries_to_fetch:
+          with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+              list(executor.map(fetch_dashboard, entries_to_fetch))
+      if compact:
+          return [Dashboard(db) for db in my_dashboards if db is not None]
+      return [db for db in my_dashboards if db is not None]
   
   def backup_dashboard(self, dashboard_name, filepath, overwrite=False):
       """ 
@@ -617,12 +1455,29 @@ class Session:
       f.write(my_dashboards_str)
       f.close()
 
-  def backup_all_dashboards(self, filepath, overwrite=False):
+  def backup_all_dashboards(self, filepath, overwrite=False, stream=False, compression=None, max_workers=8):
       """ 
       Backs up all available dashboard configurations to a file.
+      Specify stream=True to write a streaming backup (see BackupWriter) instead: one dashboard per line, written as each page of dashboards is fetched,
+      so memory use stays flat however many dashboards there are. compression='gzip' or 'zstd' compresses it, and implies stream=True.
       """
       if os.path.exists(filepath) and overwrite == False:
           raise Exception("The filepath specified '%s' already exists, and overwrite=False. Specify overwrite=True, or a different path, to create the backup." % filepath)
+      if stream or compression:
+          def fetch_dashboard(db):
+              try:
+                  my_db=self.get_dashboard(db['DashboardName'])
+              except DashboardNotFound:
+                  return None
+              my_db['LastModified']=db['LastModified']
+              return my_db
+          with self._backup_writer(filepath, "dashboards", compression) as writer:
+              with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                  for page in self._cloudwatch.get_paginator('list_dashboards').paginate():
+                      for my_db in executor.map(fetch_dashboard, page['DashboardEntries']):
+                          if my_db is not None:
+                              writer.write(my_db, "Dashboard")
+          return
       my_dashboards_str=json.dumps(self.get_all_dashboards(),default=str)
       f=open(filepath,"w")
       f.write(my_dashboards_str)
@@ -630,38 +1485,50 @@ class Session:
   
   def restore_dashboard(self, filepath, dashboard_name, confirm=False):
       """ 
-      This command will restore an alarm's configuration from a file.
-      """
-      my_dashboards=self.load_dashboards(filepath)
-      dashboard_found=False
-      for dashboard in my_dashboards:
-          if dashboard['DashboardName'] == dashboard_name:
-              print("Dashboard found : " + dashboard['DashboardArn'])
-              dashboard_found=True
-              if confirm == False:
-                  response=input("Confirm you want to restore this Dashboard from file? (y/n)")
-                  if response.lower() == "y":
-                      confirm=True
-                  else:
-                      print("Response 'y' not specified. Dashboard not restored.")
-              if confirm == True:
-                  self.put_dashboard(dashboard,overwrite=True)
-                  print("Successfully restored Dashboard '%s'!" % dashboard_name)
-      if dashboard_found==False:
+      This command will restore a dashboard's configuration from a file.
+      To restore many dashboards from one file, use restore_many or restore_all.
+      """
+      my_entries=[e for e in index_backup(filepath, [dashboard_name]).get(dashboard_name, []) if e[0] == 'Dashboard']
+      if not my_entries:
           print("Dashboard '%s' was not found." % dashboard_name)
+          return
+      dashboard=my_entries[0][2]
+      print("Dashboard found : " + dashboard.get('DashboardArn', dashboard_name))
+      if confirm == False:
+          response=input("Confirm you want to restore this Dashboard from file? (y/n)")
+          if response.lower() == "y":
+              confirm=True
+          else:
+              print("Response 'y' not specified. Dashboard not restored.")
+      if confirm == True:
+          self.put_dashboard(dashboard,overwrite=True)
+          print("Successfully restored Dashboard '%s'!" % dashboard_name)
+  
+  def get_dashboard_index(self, max_workers=8):
+      """ 
+      Returns a DashboardIndex of all dashboards, for finding which dashboards show a metric, dimension, alarm or log group.
+      The dashboards are kept, so later calls only fetch dashboards modified since (see get_all_dashboards since=), 
+      and bodies already parsed are not parsed again.
+      """
+      self._indexed_dashboards=self.get_all_dashboards(max_workers=max_workers, since=self._indexed_dashboards)
+      return DashboardIndex(self._indexed_dashboards)
   
   def put_dashboard(self, my_dashboard, overwrite=False):
-      """ Post a dashboard object back to cloudwatch"""
+      """ Post a dashboard object (or Dashboard model) back to cloudwatch"""
+      my_dashboard=to_dict(my_dashboard)
       if not overwrite:
           try:
               self.get_dashboard(my_dashboard['DashboardName'])
               raise Exception("overwrite is set to '%s', and a dashboard was found with name '%s'. Stopping" % (overwrite, my_dashboard['DashboardName']))
           except DashboardNotFound:
               pass
-      self._cloudwatch.put_dashboard(
-          DashboardName=my_dashboard['DashboardName'],
-          DashboardBody=my_dashboard['DashboardBody']
-      )
+      try:
+          self._cloudwatch.put_dashboard(
+              DashboardName=my_dashboard['DashboardName'],
+              DashboardBody=my_dashboard['DashboardBody']
+          )
+      finally:
+          self._invalidate_cache('dashboards')
   
   def rename_dashboard(self, dashboard_name, new_dashboard_name, keep_old_dashboard):
       """ 
@@ -686,7 +1553,10 @@ class Session:
           raise Exception("Dashboard '%s' not removed : If it exists, you must specify confirm=True to remove it." % dashboard_name)    
       if confirm:     
           self.get_dashboard(dashboard_name)
-          self._cloudwatch.delete_dashboards(DashboardNames=[dashboard_name])
+          try:
+              self._cloudwatch.delete_dashboards(DashboardNames=[dashboard_name])
+          finally:
+              self._invalidate_cache('dashboards')
   
   def replace_active_dashboard_body_string(self, dashboard_name, search_string, replace_string, make_dashboard_update=False):
       """
@@ -706,14 +1576,43 @@ class Session:
   #---
   def get_all_log_groups(self):
       """ Returns all Log Groups """
+      all_log_groups=self._cache_get('log_groups', None)
+      if all_log_groups is not None:
+          return(all_log_groups)
       all_log_groups=self._cwlogs.get_paginator('describe_log_groups').paginate().build_full_result()['logGroups']
+      self._cache_put('log_groups', None, all_log_groups)
       return(all_log_groups)
   
+  def iter_log_groups(self, fields=None, prefetch=False, log_group_name_prefix=None):
+      """ 
+      Yields all Log Groups one at a time, page by page as they are listed, rather than holding every log group in memory.
+        fields: keep only these keys of each log group, e.g. ['logGroupName','storedBytes']
+        prefetch: fetch the next page on a background thread while the current page is processed
+        log_group_name_prefix: only list log groups whose names start with this (filtered by the API)
+      """
+      all_log_groups=self._cache_get('log_groups', None)
+      if all_log_groups is not None:
+          if log_group_name_prefix is not None:
+              all_log_groups=[lg for lg in all_log_groups if lg['logGroupName'].startswith(log_group_name_prefix)]
+          pages=[{'logGroups': all_log_groups}]
+      elif log_group_name_prefix is not None:
+          pages=self._cwlogs.get_paginator('describe_log_groups').paginate(logGroupNamePrefix=log_group_name_prefix)
+      else:
+          pages=self._cwlogs.get_paginator('describe_log_groups').paginate()
+      for result_key, lg in _iter_pages(pages, ['logGroups'], fields, prefetch):
+          yield lg
+  
   def get_log_group(self, log_group_name):
-      """ Returns a specified Log Group. Throws LogGroupNotFound error if not found """
-      log_groups=self.get_all_log_groups()
-      for lg in log_groups:
+      """ 
+      Returns a specified Log Group. Throws LogGroupNotFound error if not found 
+      Only log groups starting with log_group_name are listed, rather than every log group.
+      """
+      my_log_group=self._cache_get('log_groups', log_group_name)
+      if my_log_group is not None:
+          return my_log_group
+      for lg in self.iter_log_groups(log_group_name_prefix=log_group_name):
           if lg['logGroupName'] == log_group_name:
+              self._cache_put('log_groups', log_group_name, lg)
               return lg
       # If you hit this, the log group was not found. Throw error.
       raise LogGroupNotFound("Log Group '%s' not found" % log_group_name)
@@ -721,35 +1620,85 @@ class Session:
   #---
   #--- CLOUDWATCH LOG GROUPS METRIC FILTERS
   #---
-  def get_all_metric_filters(self):
-      """ Returns all Metric Filters associated to all Log Groups """
-      all_metric_filters=self._cwlogs.get_paginator('describe_metric_filters').paginate().build_full_result()['metricFilters']
+  def get_all_metric_filters(self, compact=False):
+      """ 
+      Returns all Metric Filters associated to all Log Groups 
+      Specify compact=True to return MetricFilter models rather than dicts.
+      """
+      all_metric_filters=self._cache_get('metric_filters', None)
+      if all_metric_filters is None:
+          all_metric_filters=self._cwlogs.get_paginator('describe_metric_filters').paginate().build_full_result()['metricFilters']
+          self._cache_put('metric_filters', None, all_metric_filters)
+      if compact:
+          my_shared={}
+          all_metric_filters=[MetricFilter(mf, shared=my_shared) for mf in all_metric_filters]
       return(all_metric_filters)
   
+  def iter_metric_filters(self, fields=None, prefetch=False, log_group_name=None, filter_name_prefix=None, compact=False):
+      """ 
+      Yields all Metric Filters one at a time, page by page as they are listed, rather than holding every metric filter in memory.
+        fields: keep only these keys of each metric filter, e.g. ['logGroupName','filterName']
+        prefetch: fetch the next page on a background thread while the current page is processed
+        log_group_name: only list the metric filters of this log group (filtered by the API)
+        filter_name_prefix: only list metric filters whose names start with this (filtered by the API). Requires log_group_name.
+        compact: yield MetricFilter models rather than dicts
+      """
+      if filter_name_prefix is not None and log_group_name is None:
+          raise Exception("filter_name_prefix '%s' specified without a log_group_name. Specify both." % filter_name_prefix)
+      my_params={}
+      if log_group_name is not None:
+          my_params['logGroupName']=log_group_name
+      if filter_name_prefix is not None:
+          my_params['filterNamePrefix']=filter_name_prefix
+      all_metric_filters=self._cache_get('metric_filters', None)
+      if all_metric_filters is not None:
+          all_metric_filters=[mf for mf in all_metric_filters if (log_group_name is None or mf['logGroupName'] == log_group_name) 
+                              and mf['filterName'].startswith(filter_name_prefix or "")]
+          pages=[{'metricFilters': all_metric_filters}]
+      else:
+          pages=self._cwlogs.get_paginator('describe_metric_filters').paginate(**my_params)
+      my_shared={}
+      for result_key, mf in _iter_pages(pages, ['metricFilters'], fields, prefetch):
+          yield MetricFilter(mf, shared=my_shared) if compact else mf
+  
   def get_metric_filter(self, metric_filter_name, log_group_name):
-      """ Returns metric filter of the specified name and log group""" 
+      """ 
+      Returns metric filter of the specified name and log group
+      Only the log group's metric filters starting with metric_filter_name are listed, rather than every metric filter.
+      """ 
+      my_key=log_group_name + ":" + metric_filter_name
+      my_filter=self._cache_get('metric_filters', my_key)
+      if my_filter is not None:
+          return my_filter
+      try:
+          for mf in self.iter_metric_filters(log_group_name=log_group_name, filter_name_prefix=metric_filter_name):
+              if mf['filterName'] == metric_filter_name:
+                  self._cache_put('metric_filters', my_key, mf)
+                  return mf
+      except self._cwlogs.exceptions.ResourceNotFoundException:
+          raise LogGroupNotFound("Log Group '%s' not found" % log_group_name)
+      # If you hit this, the Metric Filter was not found. Throw error (LogGroupNotFound, if it is the log group that is missing)
       self.get_log_group(log_group_name)
-      mfs=self.get_all_metric_filters()
-      for mf in mfs:
-          if mf['filterName'] == metric_filter_name and mf['logGroupName'] == log_group_name:
-              return mf
-      # If you hit this, the Metric Filter was not found. Throw error    
       raise MetricFilterNotFound("Metric Filter '%s' not found in log group '%s'" % (metric_filter_name,log_group_name))
   
   def put_metric_filter(self, my_filter,overwrite=False):
-      """ Creates metric filter with defined parameters """
+      """ Creates metric filter with defined parameters (a metric filter dict, or MetricFilter model) """
+      my_filter=to_dict(my_filter)
       if not overwrite:
           try:
               self.get_metric_filter(my_filter['filterName'],my_filter['logGroupName'])
               raise Exception("overwrite is set to '%s', and a metric filter was found with name '%s' in log group '%s'. Stopping" % (overwrite, my_filter['filterName'],my_filter['logGroupName']))
           except MetricFilterNotFound:
               pass
-      self._cwlogs.put_metric_filter(
-          logGroupName=my_filter['logGroupName'],
-          filterName=my_filter['filterName'],
-          filterPattern=my_filter['filterPattern'],
-          metricTransformations=my_filter['metricTransformations']
-      )
+      try:
+          self._cwlogs.put_metric_filter(
+              logGroupName=my_filter['logGroupName'],
+              filterName=my_filter['filterName'],
+              filterPattern=my_filter['filterPattern'],
+              metricTransformations=my_filter['metricTransformations']
+          )
+      finally:
+          self._invalidate_cache('metric_filters')
   
   def delete_metric_filter(self, metric_filter_name, log_group_name, confirm=False):
       """ Deletes specific metric filter """
@@ -757,14 +1706,24 @@ class Session:
           raise Exception("Metric filter '%s' in log group '%s' not removed : If it exists, you must specify confirm=True to remove it." % (metric_filter_name,log_group_name)    )
       if confirm:     
           self.get_metric_filter(metric_filter_name,log_group_name)
-          self._cwlogs.delete_metric_filter(filterName=metric_filter_name,logGroupName=log_group_name)
+          try:
+              self._cwlogs.delete_metric_filter(filterName=metric_filter_name,logGroupName=log_group_name)
+          finally:
+              self._invalidate_cache('metric_filters')
   
-  def backup_all_metric_filters(self, filepath, overwrite=False):
+  def backup_all_metric_filters(self, filepath, overwrite=False, stream=False, compression=None):
       """ 
       Backs up all available metric filters to a file.
+      Specify stream=True to write a streaming backup (see BackupWriter) instead: one metric filter per line, written as each page arrives,
+      so memory use stays flat however many metric filters there are. compression='gzip' or 'zstd' compresses it, and implies stream=True.
       """
       if os.path.exists(filepath) and overwrite == False:
           raise Exception("The filepath specified '%s' already exists, and overwrite=False. Specify overwrite=True, or a different path, to create the backup." % filepath)
+      if stream or compression:
+          with self._backup_writer(filepath, "metric_filters", compression) as writer:
+              for mf in self.iter_metric_filters(prefetch=True):
+                  writer.write(mf, "MetricFilter")
+          return
       my_metric_filter_str=json.dumps(self.get_all_metric_filters(),default=str)
       f=open(filepath,"w")
       f.write(my_metric_filter_str)
@@ -772,76 +1731,3026 @@ class Session:
   
   def restore_metric_filter(self, filepath, metric_filter_name, confirm=False):
       """ 
-      This command will restore a metric filter's configuration from a file.
-      """
-      my_metric_filters=self.load_metric_filters(filepath)
-      metric_filter_found=False
-      for mf in my_metric_filters:
-          if mf['filterName'] == metric_filter_name:
-              print("Metric Filter found : " + mf['filterName'])
-              metric_filter_found=True
-              if confirm == False:
-                  response=input("Confirm you want to restore this metric filter from file? (y/n)")
-                  if response.lower() == "y":
-                      confirm=True
-                  else:
-                      print("Response 'y' not specified. Metric filter not restored.")
-              if confirm == True:
-                  self.put_metric_filter(mf,overwrite=True)
-                  print("Successfully restored metric filter '%s'!" % metric_filter_name)
-      if metric_filter_found==False:
+      This command will restore a metric filter's configuration from a file. 
+      If filters of the same name exist in several log groups, name it "<logGroupName>:<filterName>".
+      To restore many metric filters from one file, use restore_many or restore_all.
+      """
+      my_entries=[e for e in index_backup(filepath, [metric_filter_name]).get(metric_filter_name, []) if e[0] == 'MetricFilter']
+      if not my_entries:
           print("Metric filter '%s' was not found." % metric_filter_name)
+          return
+      for object_type, key, mf in my_entries:
+          print("Metric Filter found : " + key)
+      if confirm == False:
+          response=input("Confirm you want to restore this metric filter from file? (y/n)")
+          if response.lower() == "y":
+              confirm=True
+          else:
+              print("Response 'y' not specified. Metric filter not restored.")
+      if confirm == True:
+          for object_type, key, mf in my_entries:
+              self.put_metric_filter(mf,overwrite=True)
+          print("Successfully restored metric filter '%s'!" % metric_filter_name)
+  
+  #---
+  #--- BACKUP HELPERS
+  #---
+  def get_account_id(self):
+      """ Returns the AWS account ID this session works against, or None if it cannot be found """
+      try:
+          return self._session.client('sts', region_name=self._region).get_caller_identity()['Account']
+      except Exception:
+          return None
+  
+  def _backup_writer(self, filepath, backup_type, compression):
+      """ Returns a BackupWriter whose header records this session's region and account """
+      return BackupWriter(filepath, backup_type, region=self._region, account=self.get_account_id(), compression=compression)
+  
+  #---
+  #--- METRIC DATA
+  #---
+  def get_metric_data_for_alarms(self, alarms, start, end, max_workers=8):
+      """ 
+      Fetches the metric data each alarm evaluates, between start and end (datetimes), with get_metric_data.
+        alarms: output of get_all_alarms(), or a list of alarms and/or alarm names
+      Each alarm's queries are built from its Namespace/MetricName/Dimensions/Statistic/Period, or its Metrics list, 
+      and packed up to 500 per request without splitting an alarm across requests. Requests (and their pages) run on max_workers threads.
+      Returns, per alarm name, values aligned to a regular grid of the alarm's Period, with NaN where there is no datapoint:
+        {AlarmName: {'Timestamps': numpy datetime64 array, 'Values': numpy float64 array, 'Period': seconds}}
+      Alarms whose data can't be fetched are returned as {'Error': reason}: names that match no alarm, composite alarms (which watch no metric),
+      and alarms with no metric query to return. For anomaly detection alarms, only the metric (not the band) is returned.
+      Requires numpy. Install it with: pip install numpy
+      """
+      if numpy is None:
+          raise Exception("get_metric_data_for_alarms requires the numpy module. Install it with: pip install numpy")
+      if isinstance(alarms, dict):
+          alarms=list(alarms.get('MetricAlarms',[])) + list(alarms.get('CompositeAlarms',[]))
+      alarm_names=[a for a in alarms if isinstance(a, str)]
+      alarms=[a for a in alarms if not isinstance(a, str)]
+      metric_data={}
+      if alarm_names:
+          found_alarms=self.get_alarms(alarm_names, max_workers=max_workers)
+          alarms+=list(found_alarms['MetricAlarms'].values()) + list(found_alarms['CompositeAlarms'].values())
+          for name in found_alarms['MissingAlarms']:
+              metric_data[name]={'Error': "alarm not found"}
+      my_queries=[]
+      for i, a in enumerate(alarms):
+          if "AlarmRule" in a:
+              metric_data[a['AlarmName']]={'Error': "composite alarms watch no metric"}
+              continue
+          alarm_queries=_alarm_metric_queries(a, "a%d_" % i)
+          if alarm_queries is None:
+              metric_data[a['AlarmName']]={'Error': "no metric query returns data to evaluate"}
+              continue
+          my_queries.append((a['AlarmName'],) + alarm_queries)
+      def fetch(batch):
+          my_results={}
+          pages=self._cloudwatch.get_paginator('get_metric_data').paginate(MetricDataQueries=[q for item in batch for q in item[1]],
+              StartTime=start, EndTime=end, ScanBy='TimestampAscending')
+          for page in pages:
+              for r in page['MetricDataResults']:
+                  my_result=my_results.setdefault(r['Id'], ([], []))
+                  my_result[0].extend(r['Timestamps'])
+                  my_result[1].extend(r['Values'])
+          return my_results
+      batches=_pack_metric_queries(my_queries, METRIC_DATA_QUERIES_LIMIT)
+      my_results={}
+      with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+          for r in executor.map(fetch, batches):
+              my_results.update(r)
+      for alarm_name, queries, return_id, period in my_queries:
+          timestamps, values=my_results.get(return_id, ([], []))
+          metric_data[alarm_name]=_align_metric_data(timestamps, values, start, end, period)
+      return metric_data
+  
+  def find_orphaned_alarms(self, alarms=None, recently_active=False, max_workers=8):
+      """ 
+      Finds metric alarms watching metrics that no longer exist (e.g. of deleted instances, or renamed dimensions), 
+      without a call per alarm: list_metrics is paged once per namespace the alarms use (namespaces concurrently, on max_workers threads),
+      and every alarm's metrics are looked up in the set of (Namespace, MetricName, Dimensions) listed.
+        alarms: output of get_all_alarms() (the default), or a list of alarms
+        recently_active: only count metrics with data in the last 3 hours as existing. By default, metrics with data in the last 2 weeks do.
+      Returns a list of {'AlarmName','MissingMetrics','AllMissing'}, which can be passed to delete_alarms().
+      Alarms on metrics of other accounts (AccountId) and alarms only of expressions (e.g. SEARCH) are not checked.
+      """
+      if alarms is None:
+          alarms=self.get_all_alarms()
+      if isinstance(alarms, Mapping):
+          alarms=list(alarms.get('MetricAlarms',[]))
+      alarm_metrics=[(a['AlarmName'], _alarm_metric_keys(a)) for a in alarms if "AlarmRule" not in a]
+      alarm_metrics=[(name, keys) for name, keys in alarm_metrics if keys]
+      namespaces=set(k[0] for name, keys in alarm_metrics for k in keys)
+      def list_namespace(namespace):
+          my_args={'Namespace': namespace}
+          if recently_active:
+              my_args['RecentlyActive']='PT3H'
+          return set(_metric_key(m) for page in self._cloudwatch.get_paginator('list_metrics').paginate(**my_args) for m in page['Metrics'])
+      existing=set()
+      with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+          for keys in executor.map(list_namespace, namespaces):
+              existing|=keys
+      orphaned=[]
+      for name, keys in alarm_metrics:
+          missing=[k for k in keys if k not in existing]
+          if missing:
+              orphaned.append({'AlarmName': name, 'AllMissing': len(missing) == len(keys),
+                               'MissingMetrics': [{'Namespace': k[0], 'MetricName': k[1], 'Dimensions': [{'Name': d[0], 'Value': d[1]} for d in sorted(k[2])]} for k in missing]})
+      return orphaned
+  
+  #---
+  #--- SYNC (plan/apply)
+  #---
+  def plan(self, desired_alarms=None, desired_dashboards=None, desired_metric_filters=None, delete=False, max_workers=8):
+      """ 
+      Compares desired alarms, dashboards and metric filters (e.g. from load_alarms/load_dashboards/load_metric_filters) 
+      against one bulk snapshot of what is live, and returns a SyncPlan of the creates/updates/deletes needed to match them.
+      Objects are compared by a hash of their normalized definitions, so state, timestamps, ARNs and defaults do not cause updates,
+      and alarms only by the fields put_metric_alarm/put_composite_alarm write (see normalize_alarm).
+      Only the resource types specified are planned. Specify delete=True to also delete live objects of those types that are not desired.
+      Nothing is changed until the plan is passed to apply().
+      """
+      my_plan=SyncPlan()
+      if desired_alarms is not None:
+          if isinstance(desired_alarms, dict):
+              desired_alarms=list(desired_alarms.get('MetricAlarms',[])) + list(desired_alarms.get('CompositeAlarms',[]))
+          live_alarms=self.get_all_alarms()
+          live_alarms=list(live_alarms['MetricAlarms']) + list(live_alarms['CompositeAlarms'])
+          my_plan._compare(
+              {a['AlarmName']: a for a in desired_alarms},
+              {a['AlarmName']: a for a in live_alarms},
+              lambda a: self.get_alarm_type(a), normalize_alarm, delete)
+      if desired_dashboards is not None:
+          desired_by_name={db['DashboardName']: db for db in desired_dashboards}
+          db_entries=self._cloudwatch.get_paginator('list_dashboards').paginate().build_full_result()['DashboardEntries']
+          live_names=[db['DashboardName'] for db in db_entries]
+          # dashboard bodies are only fetched for the dashboards that are desired
+          def fetch_dashboard(name):
+              try:
+                  return self.get_dashboard(name)
+              except DashboardNotFound:
+                  return None
+          with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+              fetched=list(executor.map(fetch_dashboard, [n for n in live_names if n in desired_by_name]))
+          live_by_name={n: {'DashboardName': n} for n in live_names}
+          live_by_name.update({db['DashboardName']: db for db in fetched if db is not None})
+          my_plan._compare(desired_by_name, live_by_name, lambda db: "Dashboard", normalize_dashboard, delete)
+      if desired_metric_filters is not None:
+          my_plan._compare(
+              {(mf['logGroupName'], mf['filterName']): mf for mf in desired_metric_filters},
+              {(mf['logGroupName'], mf['filterName']): mf for mf in self.get_all_metric_filters()},
+              lambda mf: "MetricFilter", normalize_metric_filter, delete)
+      return my_plan
+  
+  def _put_changes(self, changes, max_workers):
+      """ 
+      Writes the 'Desired' object of each change (with overwrite=True) through a pool of max_workers threads, 
+      with composite alarms written in dependency order after everything else. Returns a result per change.
+      Composite alarms in a reference cycle, or referencing alarms that neither exist nor are being written, fail without being sent.
+      """
+      results=[]
+      def put_change(change):
+          try:
+              desired=copy.deepcopy(change['Desired'])
+              if change['Type'] == "MetricAlarm":
+                  self.put_metric_alarm(desired, overwrite=True)
+              elif change['Type'] == "CompositeAlarm":
+                  self.put_composite_alarm(desired, overwrite=True)
+              elif change['Type'] == "Dashboard":
+                  self.put_dashboard(desired, overwrite=True)
+              elif change['Type'] == "MetricFilter":
+                  self.put_metric_filter(desired, overwrite=True)
+              return _sync_result(change, "success")
+          except Exception as error:
+              return _sync_result(change, "failed", error)
+      def run_changes(my_changes):
+          if my_changes:
+              with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                  results.extend(executor.map(put_change, my_changes))
+      run_changes([c for c in changes if c['Type'] != "CompositeAlarm"])
+      composite_changes={c['Desired']['AlarmName']: c for c in changes if c['Type'] == "CompositeAlarm"}
+      written=[c['Desired']['AlarmName'] for c in changes if c['Type'] == "MetricAlarm"]
+      for name, error in self._check_composite_alarms([c['Desired'] for c in composite_changes.values()], written, max_workers).items():
+          results.append(_sync_result(composite_changes.pop(name), "failed", error))
+      for wave in _alarm_dependency_waves([c['Desired'] for c in composite_changes.values()]):
+          run_changes([composite_changes[a['AlarmName']] for a in wave])
+      return results
+  
+  def _check_composite_alarms(self, composites, written, max_workers):
+      """ 
+      Returns {composite alarm name: error} for the composite alarms that can't be written: those in a reference cycle, 
+      those referencing alarms that don't exist and aren't in composites or written, and those referencing any of these.
+      """
+      my_graph=AlarmGraph(composites)
+      problems={}
+      for cycle in my_graph.cycles():
+          for name in cycle:
+              problems[name]="Composite alarm reference cycle: '%s'" % "', '".join(cycle)
+      dangling=my_graph.dangling_references()
+      referenced=set(r for my_references in dangling.values() for r in my_references) - set(written)
+      if referenced:
+          missing=set(self.get_alarms(sorted(referenced), max_workers=max_workers)['MissingAlarms'])
+          for name, my_references in dangling.items():
+              my_missing=[r for r in my_references if r in missing]
+              if my_missing and name not in problems:
+                  problems[name]="References alarms that don't exist: '%s'" % "', '".join(my_missing)
+      blocked=list(problems)
+      while blocked:
+          for d in my_graph.dependents(blocked.pop()):
+              if d not in problems:
+                  problems[d]="References alarms that can't be written: '%s'" % "', '".join(r for r in my_graph.dependencies(d) if r in problems)
+                  blocked.append(d)
+      return problems
+  
+  def apply(self, my_plan, max_workers=8):
+      """ 
+      Makes the changes in a SyncPlan returned by plan(), concurrently through max_workers threads.
+      Metric alarms are written before the composite alarms that reference them, and deletes are made last (composite alarms first).
+      A failed change does not stop the others. Returns a list of results: {'Action','Type','Name','Status','Error'}
+      """
+      results=self._put_changes([c for c in my_plan.changes if c['Action'] in ['create','update']], max_workers)
+      deletes=[c for c in my_plan.changes if c['Action'] == 'delete']
+      alarm_deletes=[c for c in deletes if c['Type'] in ['MetricAlarm','CompositeAlarm']]
+      if alarm_deletes:
+          # delete_alarms deletes composite alarms first, and deletes nothing if alarms not being deleted still reference them
+          try:
+              self.delete_alarms([c['Name'] for c in alarm_deletes], confirm=True, max_workers=max_workers)
+              results.extend([_sync_result(c, "success") for c in alarm_deletes])
+          except Exception as error:
+              results.extend([_sync_result(c, "failed", error) for c in alarm_deletes])
+      dashboard_deletes=[c for c in deletes if c['Type'] == "Dashboard"]
+      for chunk in _chunk_list(dashboard_deletes, DASHBOARD_NAMES_LIMIT):
+          try:
+              self._invalidate_cache('dashboards')
+              self._cloudwatch.delete_dashboards(DashboardNames=[c['Name'] for c in chunk])
+              results.extend([_sync_result(c, "success") for c in chunk])
+          except Exception as error:
+              results.extend([_sync_result(c, "failed", error) for c in chunk])
+      def delete_metric_filter(change):
+          try:
+              self._cwlogs.delete_metric_filter(logGroupName=change['Name'][0], filterName=change['Name'][1])
+              return _sync_result(change, "success")
+          except Exception as error:
+              return _sync_result(change, "failed", error)
+          finally:
+              self._invalidate_cache('metric_filters')
+      metric_filter_deletes=[c for c in deletes if c['Type'] == "MetricFilter"]
+      if metric_filter_deletes:
+          with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+              results.extend(executor.map(delete_metric_filter, metric_filter_deletes))
+      return results
 
 #---
-#--- Helper Functions (Printers, Backupers, Loaders, Filterers)
+#--- MultiRegionSession class used to run Session methods across many regions at once
 #---
-def replace_object_string(my_object, search_string, replace_string, make_alarm_update=False):
-    """
-    This method will accept any object, perform a replace of "search_string" with "replace_string", and return object
-    """
-    replaced_alarm=json.loads(json.dumps(my_object,default=str).replace(search_string,replace_string))
-    return replaced_alarm
- 
-def filter_metric_alarms(alarms, search_string, match_invert="match", search_by="all", return_type="full_alarm"):
+class MultiRegionSession:
+  def __init__(self, regions=None, access_key="", secret_key="", session_token="", max_workers=None, **session_options):
     """ 
-    This method is used to perform filters on a list of alarms and return the result(s) of the filterering.
-    Filtering options: search_by=['all','name','metrics'], match_invert=['match','invert'], return_type=['name','full_alarm']
+    This method will initiate a Session in each of the specified regions.
+    If no regions are specified, all regions enabled for the account are discovered and used.
+    Any Session method can then be called on this object, and is run in every region concurrently, returning a MultiRegionResult:
+      mr_session=MultiRegionSession(["us-east-1","us-west-2"])
+      all_alarms=mr_session.get_all_alarms().merged()
+    session_options (e.g. cache=True) are passed on to each region's Session.
     """
+    if regions is None:
+        regions=discover_regions(access_key, secret_key, session_token)
+    if len(regions) == 0:
+        raise Exception("No regions specified or discovered.")
+    self._max_workers=max_workers or len(regions)
+    def create_session(region):
+        return Session(access_key, secret_key, session_token, region_name=region, **session_options)
+    with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+        self._sessions=dict(zip(regions, executor.map(create_session, regions)))
+  
+  def regions(self):
+      """ Returns the list of regions this session works against """
+      return list(self._sessions.keys())
+  
+  def session(self, region):
+      """ Returns the single-region Session for region """
+      return self._sessions[region]
+  
+  def call(self, method_name, *args, **kwargs):
+      """ 
+      Runs the named Session method in every region concurrently.
+      A failure in one region is recorded in the result's errors, and does not stop the other regions.
+      """
+      if method_name.startswith("_") or not callable(getattr(Session, method_name, None)):
+          raise AttributeError("Session has no method '%s'" % method_name)
+      def call_region(region):
+          try:
+              return (region, getattr(self._sessions[region], method_name)(*args, **kwargs), None)
+          except Exception as error:
+              return (region, None, error)
+      my_result=MultiRegionResult()
+      with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+          for region, result, error in executor.map(call_region, self._sessions.keys()):
+              if error is None:
+                  my_result.results[region]=result
+              else:
+                  my_result.errors[region]=error
+      return my_result
+  
+  def __getattr__(self, name):
+      # only reached for attributes not defined on MultiRegionSession itself
+      if name.startswith("_") or not callable(getattr(Session, name, None)):
+          raise AttributeError("'MultiRegionSession' object has no attribute '%s'" % name)
+      def region_method(*args, **kwargs):
+          return self.call(name, *args, **kwargs)
+      region_method.__doc__=getattr(Session, name).__doc__
+      return region_method
+
+class MultiRegionResult:
+  """ 
+  Results of a MultiRegionSession call.
+    results: {region: result} for each region that succeeded
+    errors: {region: exception} for each region that failed
+  """
+  def __init__(self):
+    self.results={}
+    self.errors={}
+  
+  def __repr__(self):
+      return "MultiRegionResult(regions=%s, errors=%s)" % (list(self.results.keys()), {r: str(e) for r, e in self.errors.items()})
+  
+  def raise_errors(self):
+      """ Raises an exception summarising the failed regions, if any failed """
+      if self.errors:
+          raise Exception("Failed in region(s): %s" % "; ".join(["%s: %s" % (r, e) for r, e in self.errors.items()]))
+  
+  def merged(self):
+      """ 
+      Merges each region's result into one, tagging objects with the 'Region' they came from.
+        Lists are concatenated. Dicts of lists (e.g. get_all_alarms) are concatenated per key.
+        Any other result is returned as a list of {'Region': region, 'Result': result}.
+      """
+      my_results=list(self.results.items())
+      if my_results and all(isinstance(r, list) for _, r in my_results):
+          merged_list=[]
+          for region, result in my_results:
+              merged_list.extend(_tag_region(result, region))
+          return merged_list
+      if my_results and all(isinstance(r, dict) and all(isinstance(v, list) for v in r.values()) for _, r in my_results):
+          merged_dict={}
+          for region, result in my_results:
+              for key, value in result.items():
+                  merged_dict.setdefault(key, []).extend(_tag_region(value, region))
+          return merged_dict
+      return [{'Region': region, 'Result': result} for region, result in my_results]
+
+def discover_regions(access_key="", secret_key="", session_token=""):
+    """ Returns the names of all regions enabled for the account """
+    if access_key=="" or secret_key=="" or session_token=="":
+        my_session=boto3.session.Session()
+    else:
+        my_session=boto3.session.Session(aws_access_key_id=access_key, aws_secret_access_key=secret_key, aws_session_token=session_token)
+    ec2=my_session.client('ec2', region_name=my_session.region_name or "us-east-1")
+    # AllRegions=False only returns regions enabled for the account
+    my_regions=ec2.describe_regions(AllRegions=False)['Regions']
+    return sorted([r['RegionName'] for r in my_regions])
+
+def _tag_region(my_list, region):
+    """ Returns a copy of a list of results with 'Region' added to each dict """
+    tagged=[]
+    for item in my_list:
+        if isinstance(item, Mapping):
+            tagged.append(dict(item, Region=region))
+        else:
+            tagged.append({'Region': region, 'Result': item})
+    return tagged
+
+#---
+#--- Alarm state watcher, for following alarm state changes without listing every alarm
+#---
+class AlarmStateWatcher:
+  """ 
+  Follows alarm state changes incrementally, keeping a local table of alarm states:
+    - the table starts from describe_alarms filtered to the ALARM and INSUFFICIENT_DATA states, so alarms not in it are OK
+    - each poll() reads only the state changes since the previous poll from describe_alarm_history, moving a timestamp cursor forward
+  so polling costs API calls in proportion to the number of state changes, not the number of alarms.
+  Each change is an event {'AlarmName','AlarmType','OldState','NewState','Reason','Timestamp'}, passed to each callback and returned by poll().
+    watcher=session.watch_alarm_states(callbacks=[print])
+    watcher.run()                        # polls every interval seconds until stop() is called
+    async for event in watcher: ...      # or, as an async iterator
+  History items can be recorded shortly after their timestamp, so each poll re-reads the last overlap seconds, skipping items already seen.
+  Specify resync_interval (seconds) to also rebuild the table from describe_alarms that often, reporting any change the history missed.
+  """
+  watched_states=['ALARM','INSUFFICIENT_DATA']
+  
+  def __init__(self, session, interval=60, callbacks=None, overlap=60, resync_interval=None):
+    self._session=session
+    self.interval=interval
+    self._callbacks=list(callbacks or [])
+    self._overlap=overlap
+    self._resync_interval=resync_interval
+    self._lock=threading.Lock()
+    self._stopped=threading.Event()
+    self._states={}
+    self._seen={}
+    self._cursor=None
+    self._last_resync=None
+  
+  def __aiter__(self):
+      return self._aiter_events()
+  
+  async def _aiter_events(self):
+      loop=asyncio.get_running_loop()
+      while not self._stopped.is_set():
+          for event in await loop.run_in_executor(None, self.poll):
+              yield event
+          await asyncio.sleep(self.interval)
+  
+  def add_callback(self, callback):
+      """ Adds a function to call with each change event """
+      self._callbacks.append(callback)
+  
+  def start(self):
+      """ Builds the state table, and starts the cursor from now. Returns the watcher. """
+      with self._lock:
+          self._cursor=datetime.now(timezone.utc)
+          self._resync()
+      return self
+  
+  def stop(self):
+      """ Stops run() and async iteration after the current poll """
+      self._stopped.set()
+  
+  def run(self, max_polls=None):
+      """ Polls every interval seconds, until stop() is called (or max_polls polls have been made) """
+      polls=0
+      while not self._stopped.is_set() and (max_polls is None or polls < max_polls):
+          self.poll()
+          polls+=1
+          if max_polls is None or polls < max_polls:
+              self._stopped.wait(self.interval)
+  
+  def state(self, alarm_name):
+      """ Returns the last known StateValue of an alarm """
+      with self._lock:
+          return self._states.get(alarm_name, {}).get('StateValue', "OK")
+  
+  def states(self):
+      """ Returns the state table: {AlarmName: {'StateValue','StateReason','Timestamp'}}, of alarms not OK, and alarms seen changing """
+      with self._lock:
+          return copy.deepcopy(self._states)
+  
+  def poll(self):
+      """ Reads the state changes since the previous poll, updates the state table, calls the callbacks, and returns the change events """
+      with self._lock:
+          if self._cursor is None:
+              self._cursor=datetime.now(timezone.utc)
+              self._resync()
+          now=datetime.now(timezone.utc)
+          events=[]
+          pages=self._session._cloudwatch.get_paginator('describe_alarm_history').paginate(HistoryItemType='StateUpdate',
+              StartDate=self._cursor - timedelta(seconds=self._overlap), EndDate=now, ScanBy='TimestampAscending',
+              AlarmTypes=['MetricAlarm','CompositeAlarm'])
+          for page in pages:
+              for item in page['AlarmHistoryItems']:
+                  key=(item['AlarmName'], str(item['Timestamp']), item.get('HistorySummary'))
+                  if key in self._seen:
+                      continue
+                  self._seen[key]=item['Timestamp']
+                  event=_alarm_history_event(item)
+                  previous=self._states.get(event['AlarmName'])
+                  if previous is None or previous['Timestamp'] is None or previous['Timestamp'] <= event['Timestamp']:
+                      self._states[event['AlarmName']]={'StateValue': event['NewState'], 'StateReason': event['Reason'], 'Timestamp': event['Timestamp']}
+                  events.append(event)
+          self._cursor=now
+          # items older than the overlap window can't be read again, so needn't be remembered
+          horizon=now - timedelta(seconds=self._overlap)
+          self._seen={k: t for k, t in self._seen.items() if t >= horizon}
+          if self._resync_interval is not None and (now - self._last_resync).total_seconds() >= self._resync_interval:
+              events.extend(self._resync())
+      for event in events:
+          for callback in self._callbacks:
+              callback(event)
+      return events
+  
+  def _resync(self):
+      """ Rebuilds the table of alarms not OK from describe_alarms, and returns events for any differences from the table """
+      my_states={}
+      for state_value in self.watched_states:
+          pages=self._session._cloudwatch.get_paginator('describe_alarms').paginate(AlarmTypes=['MetricAlarm','CompositeAlarm'], StateValue=state_value)
+          for result_key, a in _iter_pages(pages, ['MetricAlarms','CompositeAlarms'], ['AlarmName','StateValue','StateReason','StateUpdatedTimestamp']):
+              my_states[a['AlarmName']]={'StateValue': a['StateValue'], 'StateReason': a.get('StateReason'), 'Timestamp': a.get('StateUpdatedTimestamp'),
+                                          'AlarmType': result_key[:-1]}
+      events=[]
+      if self._last_resync is not None:
+          for name in set(self._states) | set(my_states):
+              old_state=self._states.get(name, {}).get('StateValue', "OK")
+              new=my_states.get(name, {'StateValue': "OK", 'StateReason': None, 'Timestamp': None})
+              if old_state != new['StateValue']:
+                  events.append({'AlarmName': name, 'AlarmType': new.get('AlarmType'), 'OldState': old_state, 'NewState': new['StateValue'],
+                                 'Reason': new['StateReason'], 'Timestamp': new['Timestamp']})
+      self._states={name: {k: v for k, v in st.items() if k != 'AlarmType'} for name, st in my_states.items()}
+      self._last_resync=datetime.now(timezone.utc)
+      return events
+
+def _alarm_history_event(item):
+    """ Returns the change event of a StateUpdate alarm history item """
+    old_state=None
+    new_state=None
+    reason=None
     try:
-        if "MetricAlarms" in alarms.keys():
-            my_alarms=alarms['MetricAlarms']
-    except AttributeError:
-        my_alarms=alarms
+        my_data=json.loads(item.get('HistoryData') or "{}")
+        old_state=my_data.get('oldState', {}).get('stateValue')
+        new_state=my_data.get('newState', {}).get('stateValue')
+        reason=my_data.get('newState', {}).get('stateReason')
+    except ValueError:
         pass
-    valid_return_types=['name','full_alarm']
-    if return_type not in valid_return_types:
-        raise Exception("Error return_type '%s' invalid. Valid options: '%s'" % (return_type,str(valid_return_types)))  
-    valid_search_bys=['all','name','metrics']
-    if search_by not in valid_search_bys:
-        raise Exception("Error search_by '%s' invalid. Valid options: '%s'" % (search_by,str(valid_search_bys)))  
-    valid_match_invert=['match','invert']
-    if match_invert not in valid_match_invert:
-        raise Exception("Error match_invert '%s' invalid. Valid options: '%s'" % (match_invert,str(valid_match_invert)))  
-    if match_invert == "match":
-        search_results=([x for x in my_alarms if search_string in str(x)])
-    elif match_invert == "invert":
-        search_results=([x for x in my_alarms if search_string not in str(x)])
-    if return_type == "full_alarm":
-       return search_results
-    if return_type == "name":
-       return [x['AlarmName'] for x in search_results]
+    if new_state is None:
+        # e.g. "Alarm updated from OK to ALARM"
+        my_match=re.search(r"from (\w+) to (\w+)", item.get('HistorySummary', ""))
+        if my_match:
+            old_state, new_state=my_match.groups()
+    return {'AlarmName': item['AlarmName'], 'AlarmType': item.get('AlarmType'), 'OldState': old_state, 'NewState': new_state,
+            'Reason': reason, 'Timestamp': item['Timestamp']}
+
+#---
+#--- Metric data, fetched by Session.get_metric_data_for_alarms
+#---
+def _alarm_metric_queries(my_alarm, id_prefix):
+    """ 
+    Returns (MetricDataQueries, Id of the query whose data the alarm evaluates, period) for a metric alarm, or None for a composite alarm.
+    Query Ids are prefixed with id_prefix (and references to them in expressions rewritten), so many alarms' queries can share a request.
+    """
+    if "MetricName" in my_alarm and my_alarm.get('MetricName'):
+        my_stat={'Metric': {'Namespace': my_alarm['Namespace'], 'MetricName': my_alarm['MetricName'], 'Dimensions': list(my_alarm.get('Dimensions', []))},
+                 'Period': my_alarm['Period'], 'Stat': my_alarm.get('Statistic') or my_alarm.get('ExtendedStatistic')}
+        if my_alarm.get('Unit'):
+            my_stat['Unit']=my_alarm['Unit']
+        return ([{'Id': id_prefix + "m", 'MetricStat': my_stat, 'ReturnData': True}], id_prefix + "m", my_alarm['Period'])
+    if not my_alarm.get('Metrics'):
+        return None
+    my_ids={m['Id']: id_prefix + m['Id'] for m in my_alarm['Metrics']}
+    my_reference=re.compile(r"(?<![\w.])(" + "|".join(re.escape(i) for i in sorted(my_ids, key=len, reverse=True)) + r")(?!\w)")
+    queries=[]
+    return_id=None
+    period=None
+    for m in my_alarm['Metrics']:
+        # Period is only used by alarms, to evaluate expressions; it is kept here as the period to align the data to
+        q={k: v for k, v in m.items() if k not in ['Id','Period']}
+        q['Id']=my_ids[m['Id']]
+        if "Expression" in q:
+            q['Expression']=my_reference.sub(lambda x: my_ids[x.group(1)], q['Expression'])
+        m_period=m.get('Period') or (m['MetricStat']['Period'] if "MetricStat" in m else None)
+        if return_id is None and m.get('ReturnData', True) and m['Id'] != my_alarm.get('ThresholdMetricId'):
+            return_id=q['Id']
+            period=m_period or period
+        elif period is None:
+            period=m_period
+        q['ReturnData']=q['Id'] == return_id
+        queries.append(q)
+    if return_id is None:
+        return None
+    return (queries, return_id, period or my_alarm.get('Period') or 60)
+
+def _metric_key(my_metric):
+    """ Returns a hashable (Namespace, MetricName, frozenset of (Name, Value) dimensions) key of a metric, where dimension order does not matter """
+    return (my_metric['Namespace'], my_metric['MetricName'], frozenset((d['Name'], d['Value']) for d in my_metric.get('Dimensions', []) or []))
+
+def _alarm_metric_keys(my_alarm):
+    """ Returns the keys (see _metric_key) of the metrics a metric alarm watches in its own account, single metric or in its Metrics list """
+    if my_alarm.get('MetricName'):
+        return [_metric_key(my_alarm)]
+    return list(dict.fromkeys(_metric_key(m['MetricStat']['Metric']) for m in my_alarm.get('Metrics', []) or [] if "MetricStat" in m and not m.get('AccountId')))
+
+def _pack_metric_queries(alarm_queries, limit):
+    """ Packs (AlarmName, queries, ...) items into batches of at most limit queries, never splitting an item's queries between batches """
+    batches=[]
+    batch=[]
+    size=0
+    for item in alarm_queries:
+        if len(item[1]) > limit:
+            raise Exception("Alarm '%s' needs %d metric data queries, more than the %d one request allows." % (item[0], len(item[1]), limit))
+        if size + len(item[1]) > limit:
+            batches.append(batch)
+            batch=[]
+            size=0
+        batch.append(item)
+        size+=len(item[1])
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _align_metric_data(timestamps, values, start, end, period):
+    """ Returns {'Timestamps','Values','Period'} with values placed on a regular grid of period seconds from start to end, NaN where missing """
+    start_s=int(start.timestamp()) // period * period
+    end_s=int(end.timestamp())
+    grid=numpy.arange(start_s, end_s, period, dtype=numpy.int64)
+    aligned=numpy.full(len(grid), numpy.nan)
+    if len(timestamps):
+        seconds=numpy.array([int(t.timestamp()) for t in timestamps], dtype=numpy.int64)
+        positions=(seconds - start_s) // period
+        in_range=(positions >= 0) & (positions < len(grid))
+        aligned[positions[in_range]]=numpy.asarray(values, dtype=numpy.float64)[in_range]
+    return {'Timestamps': grid.astype('datetime64[s]'), 'Values': aligned, 'Period': period}
+
+#---
+#--- Backtesting, replaying metric data through alarm evaluation
+#---
+#--- alarm states in backtest timelines, by code
+BACKTEST_STATES=['OK','ALARM','INSUFFICIENT_DATA']
+
+def backtest_alarm(my_alarm, alarm_metric_data, **kwargs):
+    """ Backtests a single alarm against its metric data (one entry of get_metric_data_for_alarms). See backtest_alarms. """
+    return backtest_alarms([my_alarm], {my_alarm['AlarmName']: alarm_metric_data}, **kwargs)[my_alarm['AlarmName']]
+
+def backtest_alarms(alarms, metric_data, thresholds=None, evaluation_periods=None, datapoints_to_alarm=None, treat_missing_data=None,
+                    num_thresholds=50, target_fires=0, memory_budget=256 * 1024 * 1024):
+    """ 
+    Replays historical metric data (from get_metric_data_for_alarms) through CloudWatch's M of N alarm evaluation, to see how often alarms would have fired.
+    Each period is breaching if its value compares to the threshold by the alarm's ComparisonOperator; the alarm is in ALARM when at least
+    DatapointsToAlarm of the last EvaluationPeriods periods are breaching. Missing periods are treated by TreatMissingData:
+      breaching / notBreaching - counted as breaching / not breaching
+      missing - only present periods count; a window with none is INSUFFICIENT_DATA
+      ignore  - only present periods count; a window with none keeps the previous state
+    (CloudWatch looks back past EvaluationPeriods for datapoints in the missing/ignore cases, so results there are close, not exact.)
+    evaluation_periods, datapoints_to_alarm and treat_missing_data override the alarms' own settings, to test changes before making them.
+    Each alarm is also tested against candidate thresholds (the thresholds list, or by default num_thresholds quantiles of its data), 
+    all at once as numpy arrays, using sliding windows; alarms with the same settings and data length are tested together,
+    as many at a time as fit in memory_budget bytes of working arrays (about BACKTEST_BYTES_PER_CELL per alarm, threshold and period).
+    Returns, per alarm name:
+      {'FireCount': times it went into ALARM at its threshold, 'Timestamps','States': its timeline at its threshold,
+       'Thresholds','FireCounts': the candidate thresholds and their fire counts,
+       'SuggestedThreshold': the candidate closest to its threshold that fires at most target_fires times (None if there is none)}
+    Alarms that can't be backtested (composite, anomaly detection, or without metric data) are returned as {'Error': reason}.
+    Requires numpy. Install it with: pip install numpy
+    """
+    if numpy is None:
+        raise Exception("backtest_alarms requires the numpy module. Install it with: pip install numpy")
+    if isinstance(alarms, dict):
+        alarms=list(alarms.get('MetricAlarms',[])) + list(alarms.get('CompositeAlarms',[]))
+    valid_treat_missing_data=['breaching','notBreaching','ignore','missing']
+    if treat_missing_data is not None and treat_missing_data not in valid_treat_missing_data:
+        raise Exception("Error treat_missing_data '%s' invalid. Valid options: '%s'" % (treat_missing_data,str(valid_treat_missing_data)))
+    results={}
+    groups={}
+    for a in alarms:
+        name=a['AlarmName']
+        if "AlarmRule" in a:
+            results[name]={'Error': "composite alarms have no metric data to backtest"}
+            continue
+        if a.get('ComparisonOperator') not in _BACKTEST_OPERATORS:
+            results[name]={'Error': "ComparisonOperator '%s' can't be backtested" % a.get('ComparisonOperator')}
+            continue
+        if name not in metric_data:
+            results[name]={'Error': "no metric data"}
+            continue
+        if "Error" in metric_data[name]:
+            results[name]={'Error': metric_data[name]['Error']}
+            continue
+        n=evaluation_periods or a['EvaluationPeriods']
+        m=datapoints_to_alarm or a.get('DatapointsToAlarm') or n
+        tmd=treat_missing_data or a.get('TreatMissingData', "missing")
+        values=numpy.asarray(metric_data[name]['Values'], dtype=numpy.float64)
+        if len(values) < n:
+            results[name]={'Error': "fewer periods of metric data (%d) than EvaluationPeriods (%d)" % (len(values), n)}
+            continue
+        threshold=float(a['Threshold'])
+        groups.setdefault((len(values), n, m, tmd, a['ComparisonOperator']), []).append((a, values, threshold))
+    # every alarm has the same number of candidate thresholds (see _backtest_candidates)
+    num_candidates=max(num_thresholds, len(thresholds) if thresholds is not None else 0) + 1
+    for (length, n, m, tmd, operator), members in groups.items():
+        chunk_size=max(1, int(memory_budget // (num_candidates * length * BACKTEST_BYTES_PER_CELL)))
+        for chunk in _chunk_list(members, chunk_size):
+            my_values=numpy.stack([v for a, v, t in chunk])
+            my_thresholds=numpy.stack([_backtest_candidates(v, t, thresholds, num_thresholds) for a, v, t in chunk])
+            states=_backtest_states(my_values, my_thresholds, n, m, tmd, operator)
+            entered=(states == 1) & numpy.concatenate([numpy.ones(states.shape[:2] + (1,), dtype=bool), states[:, :, :-1] != 1], axis=2)
+            fire_counts=entered.sum(axis=2)
+            for i, (a, v, t) in enumerate(chunk):
+                candidates=~numpy.isnan(my_thresholds[i])
+                alarm_thresholds=my_thresholds[i][candidates]
+                alarm_fire_counts=fire_counts[i][candidates]
+                current=int(numpy.flatnonzero(alarm_thresholds == t)[0])
+                allowed=numpy.flatnonzero(alarm_fire_counts <= target_fires)
+                suggested=None
+                if len(allowed):
+                    suggested=float(alarm_thresholds[allowed[numpy.argmin(numpy.abs(alarm_thresholds[allowed] - t))]])
+                results[a['AlarmName']]={'FireCount': int(alarm_fire_counts[current]), 
+                    'Timestamps': numpy.asarray(metric_data[a['AlarmName']]['Timestamps'])[n - 1:],
+                    'States': numpy.array(BACKTEST_STATES)[states[i][candidates][current]],
+                    'Thresholds': alarm_thresholds, 'FireCounts': alarm_fire_counts, 'SuggestedThreshold': suggested}
+    return results
+
+#--- peak bytes of working arrays per (alarm, threshold, period) cell while backtesting: the breaching flags, their int32 cumulative sums,
+#--- window counts and states, and the temporaries between them
+BACKTEST_BYTES_PER_CELL=32
+
+#--- comparison of a value (left) to a threshold (right), per ComparisonOperator
+_BACKTEST_OPERATORS={
+    'GreaterThanOrEqualToThreshold': lambda value, threshold: value >= threshold,
+    'GreaterThanThreshold': lambda value, threshold: value > threshold,
+    'LessThanThreshold': lambda value, threshold: value < threshold,
+    'LessThanOrEqualToThreshold': lambda value, threshold: value <= threshold,
+}
+
+def _backtest_candidates(values, threshold, thresholds, num_thresholds):
+    """ Returns the sorted candidate thresholds for an alarm: its own threshold, and the thresholds specified or quantiles of its data """
+    if thresholds is not None:
+        candidates=numpy.asarray(thresholds, dtype=numpy.float64)
+    else:
+        present=values[~numpy.isnan(values)]
+        candidates=numpy.quantile(present, numpy.linspace(0, 1, num_thresholds)) if len(present) else numpy.array([])
+    candidates=numpy.unique(numpy.append(candidates, threshold))
+    # every alarm in a group needs the same number of candidates, so the list is padded with NaN (which never breaches)
+    padded=numpy.full(max(num_thresholds, len(thresholds) if thresholds is not None else 0) + 1, numpy.nan)
+    padded[:len(candidates)]=candidates
+    return padded
+
+def _window_counts(flags, n):
+    """ Returns the number of True flags in each sliding window of n along the last axis, from cumulative sums (one pass, whatever n is) """
+    counts=numpy.cumsum(flags, axis=-1, dtype=numpy.int32)
+    counts=numpy.concatenate([numpy.zeros(counts.shape[:-1] + (1,), dtype=numpy.int32), counts], axis=-1)
+    return counts[..., n:] - counts[..., :-n]
+
+def _backtest_states(values, thresholds, n, m, treat_missing_data, operator):
+    """ 
+    Returns alarm state codes (see BACKTEST_STATES), shaped (alarms, thresholds, windows), 
+    for values shaped (alarms, periods) and thresholds shaped (alarms, thresholds), evaluating m of n periods.
+    """
+    missing=numpy.isnan(values)
+    with numpy.errstate(invalid="ignore"):
+        breaching=_BACKTEST_OPERATORS[operator](values[:, None, :], thresholds[:, :, None]) & ~missing[:, None, :]
+    if treat_missing_data == "breaching":
+        breaching=breaching | missing[:, None, :]
+    breach_counts=_window_counts(breaching, n)
+    states=(breach_counts >= m).astype(numpy.int8)
+    if treat_missing_data in ["missing", "ignore"]:
+        present_counts=_window_counts(~missing, n)
+        no_data=numpy.broadcast_to((present_counts == 0)[:, None, :], states.shape)
+        if treat_missing_data == "missing":
+            states=numpy.where(no_data, 2, states).astype(numpy.int8)
+        else:
+            # carry the last evaluated state forward over windows with no data (INSUFFICIENT_DATA before the first one)
+            positions=numpy.where(no_data, -1, numpy.arange(states.shape[2]))
+            positions=numpy.maximum.accumulate(positions, axis=2)
+            carried=numpy.take_along_axis(states, numpy.maximum(positions, 0), axis=2)
+            states=numpy.where(positions < 0, 2, carried).astype(numpy.int8)
+    return states
+
+#---
+#--- Dashboard analysis: parsed dashboard bodies, and an index of what dashboards show
+#---
+#--- parsed dashboard bodies, by the SHA-256 of the body, shared by every DashboardIndex
+_DASHBOARD_PARSES=OrderedDict()
+_DASHBOARD_PARSES_LOCK=threading.Lock()
+DASHBOARD_PARSES_MAX_ENTRIES=10000
+
+def parse_dashboard_body(dashboard_body):
+    """ 
+    Parses a DashboardBody (a JSON string, or already loaded) into what its widgets show:
+      {'Widgets': [{'Type','Title','Metrics','Alarms','LogQuery','LogGroups'}], 'Metrics': [...], 'Alarms': [...], 'LogGroups': [...], 'LogQueries': [...]}
+    Metrics are {'Namespace','MetricName','Dimensions': [(name, value)],'Options'} for metrics, or {'Expression','Id','Options'} for expressions,
+    with the "." and "..." shorthands of metrics arrays expanded from the row before. Alarms are alarm ARNs, from alarm widgets and annotations.
+    Results are cached by the body's hash, so an unchanged body is only parsed once; they are shared, so should not be changed.
+    """
+    if not isinstance(dashboard_body, str):
+        dashboard_body=json.dumps(dashboard_body, sort_keys=True)
+    body_hash=hashlib.sha256(dashboard_body.encode("utf-8")).hexdigest()
+    with _DASHBOARD_PARSES_LOCK:
+        if body_hash in _DASHBOARD_PARSES:
+            _DASHBOARD_PARSES.move_to_end(body_hash)
+            return _DASHBOARD_PARSES[body_hash]
+    my_parse=_parse_dashboard_body(json.loads(dashboard_body))
+    with _DASHBOARD_PARSES_LOCK:
+        _DASHBOARD_PARSES[body_hash]=my_parse
+        while len(_DASHBOARD_PARSES) > DASHBOARD_PARSES_MAX_ENTRIES:
+            _DASHBOARD_PARSES.popitem(last=False)
+    return my_parse
+
+def _parse_dashboard_body(my_body):
+    my_parse={'Widgets': [], 'Metrics': [], 'Alarms': [], 'LogGroups': [], 'LogQueries': []}
+    for w in my_body.get('widgets', []):
+        my_properties=w.get('properties', {}) or {}
+        my_widget={'Type': w.get('type'), 'Title': my_properties.get('title'), 'Metrics': [], 'Alarms': [], 'LogQuery': None, 'LogGroups': []}
+        previous_row=[]
+        for row in my_properties.get('metrics', []) or []:
+            my_metric, previous_row=_parse_dashboard_metric(row, previous_row)
+            if my_metric is not None:
+                my_widget['Metrics'].append(my_metric)
+        my_alarms=list(my_properties.get('alarms', []) or [])
+        my_annotations=my_properties.get('annotations', {}) or {}
+        if isinstance(my_annotations, dict):
+            my_alarms+=list(my_annotations.get('alarms', []) or [])
+        my_widget['Alarms']=list(dict.fromkeys(my_alarms))
+        if my_properties.get('query'):
+            my_widget['LogQuery']=my_properties['query']
+            my_widget['LogGroups']=[g[1:-1] for g in re.findall(r"SOURCE\s+('[^']*'|\"[^\"]*\")", my_properties['query'])]
+            my_parse['LogQueries'].append(my_properties['query'])
+        my_parse['Widgets'].append(my_widget)
+        my_parse['Metrics']+=my_widget['Metrics']
+        my_parse['Alarms']+=my_widget['Alarms']
+        my_parse['LogGroups']+=my_widget['LogGroups']
+    my_parse['Alarms']=list(dict.fromkeys(my_parse['Alarms']))
+    my_parse['LogGroups']=list(dict.fromkeys(my_parse['LogGroups']))
+    return my_parse
+
+def _parse_dashboard_metric(row, previous_row):
+    """ Returns (the metric or expression of a metrics array row, the row with shorthands expanded, for the next row to refer to) """
+    if not isinstance(row, list):
+        return (None, previous_row)
+    my_options={}
+    if row and isinstance(row[-1], dict):
+        my_options=row[-1]
+        row=row[:-1]
+    if not row:
+        # an expression, e.g. [{"expression": "SUM(METRICS())", "id": "e1"}]
+        if "expression" in my_options:
+            return ({'Expression': my_options['expression'], 'Id': my_options.get('id'), 'Options': my_options}, previous_row)
+        return (None, previous_row)
+    if row[0] == "...":
+        # "..." repeats the previous row up to the values that follow it
+        row=previous_row[:max(0, len(previous_row) - (len(row) - 1))] + row[1:]
+    row=[previous_row[i] if x == "." and i < len(previous_row) else x for i, x in enumerate(row)]
+    my_metric={'Namespace': row[0], 'MetricName': row[1] if len(row) > 1 else None,
+               'Dimensions': [(row[i], row[i + 1]) for i in range(2, len(row) - 1, 2)], 'Options': my_options}
+    return (my_metric, row)
+
+class DashboardIndex:
+  """ 
+  Inverted index of what dashboards show, built from get_all_dashboards() output (or Session.get_dashboard_index()):
+  metric (namespace, metric name), namespace, dimension (name, value), dimension name, alarm name and log group, each to the dashboards showing it.
+    my_index=session.get_dashboard_index()
+    my_index.dashboards_for_metric('AWS/EC2', 'CPUUtilization')             # dashboards to update before renaming a metric
+    my_index.dashboards_for_alarm('arn:aws:cloudwatch:...:alarm:cpu-high')  # alarm names or ARNs
+  Bodies are parsed with parse_dashboard_body, so unchanged bodies are not parsed again when the index is rebuilt.
+  """
+  _keys=['metric','namespace','dimension','dimension_name','alarm','log_group']
+  
+  def __init__(self, dashboards=None):
+    self._parses={}
+    self._index={k: {} for k in self._keys}
+    for db in (dashboards or []):
+        self.add(db)
+  
+  def __len__(self):
+      return len(self._parses)
+  
+  def __contains__(self, dashboard_name):
+      return dashboard_name in self._parses
+  
+  def add(self, my_dashboard):
+      """ Adds (or replaces) a dashboard in the index """
+      name=my_dashboard['DashboardName']
+      if name in self._parses:
+          self.remove(name)
+      my_parse=parse_dashboard_body(my_dashboard['DashboardBody'])
+      self._parses[name]=my_parse
+      for key, value in _dashboard_index_terms(my_parse):
+          self._index[key].setdefault(value, set()).add(name)
+  
+  def remove(self, dashboard_name):
+      """ Removes a dashboard from the index """
+      my_parse=self._parses.pop(dashboard_name, None)
+      if my_parse is None:
+          return
+      for key, value in _dashboard_index_terms(my_parse):
+          names=self._index[key].get(value)
+          if names is not None:
+              names.discard(dashboard_name)
+              if not names:
+                  del self._index[key][value]
+  
+  def get(self, dashboard_name):
+      """ Returns the parsed body of a dashboard (see parse_dashboard_body), or None """
+      return self._parses.get(dashboard_name)
+  
+  def dashboards_for_metric(self, namespace, metric_name=None, dimensions=None):
+      """ 
+      Returns the names of the dashboards showing a metric (or, without metric_name, any metric in namespace).
+      dimensions: {name: value} or [(name, value)] the metric must also be shown with.
+      """
+      if metric_name is None:
+          names=set(self._index['namespace'].get(namespace, set()))
+      else:
+          names=set(self._index['metric'].get((namespace, metric_name), set()))
+      if dimensions:
+          if isinstance(dimensions, dict):
+              dimensions=list(dimensions.items())
+          names=set(n for n in names if any(_dashboard_metric_matches(m, namespace, metric_name, dimensions) for m in self._parses[n]['Metrics']))
+      return sorted(names)
+  
+  def dashboards_for_dimension(self, dimension_name, dimension_value=None):
+      """ Returns the names of the dashboards showing any metric with a dimension (of a value, if specified), e.g. ('InstanceId','i-123') """
+      if dimension_value is None:
+          return sorted(self._index['dimension_name'].get(dimension_name, set()))
+      return sorted(self._index['dimension'].get((dimension_name, dimension_value), set()))
+  
+  def dashboards_for_alarm(self, alarm):
+      """ Returns the names of the dashboards showing an alarm, by alarm name, ARN, or alarm object """
+      if isinstance(alarm, Mapping):
+          alarm=alarm['AlarmName']
+      return sorted(self._index['alarm'].get(_alarm_name_from_arn(alarm), set()))
+  
+  def dashboards_for_log_group(self, log_group_name):
+      """ Returns the names of the dashboards with log queries on a log group """
+      return sorted(self._index['log_group'].get(log_group_name, set()))
+  
+  def values(self, key):
+      """ Returns the distinct values indexed for a key, e.g. values('namespace') """
+      if key not in self._keys:
+          raise Exception("Error key '%s' invalid. Valid options: '%s'" % (key,str(self._keys)))
+      return list(self._index[key].keys())
+
+def _dashboard_index_terms(my_parse):
+    """ Returns the (key, value) pairs to index a parsed dashboard body by """
+    my_terms=set()
+    for m in my_parse['Metrics']:
+        if m.get('Namespace') is None:
+            continue
+        my_terms.add(('namespace', m['Namespace']))
+        my_terms.add(('metric', (m['Namespace'], m['MetricName'])))
+        for d in m['Dimensions']:
+            my_terms.add(('dimension_name', d[0]))
+            my_terms.add(('dimension', d))
+    for a in my_parse['Alarms']:
+        my_terms.add(('alarm', _alarm_name_from_arn(a)))
+    for lg in my_parse['LogGroups']:
+        my_terms.add(('log_group', lg))
+    return my_terms
+
+def _dashboard_metric_matches(my_metric, namespace, metric_name, dimensions):
+    if my_metric.get('Namespace') != namespace or (metric_name is not None and my_metric.get('MetricName') != metric_name):
+        return False
+    return all(tuple(d) in my_metric['Dimensions'] for d in dimensions)
+
+def _alarm_name_from_arn(alarm):
+    """ Returns the alarm name of an alarm ARN (or the name, if passed a name) """
+    if alarm.startswith("arn:") and ":alarm:" in alarm:
+        return alarm.split(":alarm:", 1)[1]
+    return alarm
+
+#---
+#--- Streaming backups
+#---
+#--- index entries BackupWriter holds in memory before sorting them into a run file, merged into the index when the backup is closed
+BACKUP_INDEX_RUN_SIZE=100000
+
+class BackupWriter:
+  """ 
+  Writes a streaming backup file: newline delimited JSON (NDJSON), optionally gzip or zstd compressed.
+    - the first line is a header: {"fomo_backup": 1, "type": ..., "region": ..., "account": ..., "timestamp": ...}
+    - then one object per line, written as it is passed to write(), so nothing is held in memory
+    - the last line is a trailer with the number of objects of each type: {"fomo_backup_end": {"counts": {...}}}
+  Counts are in the trailer because they are not known until the stream ends.
+  Uncompressed backups also get a sidecar index, <filepath>.idx, of where each object is in the file, so single objects can be 
+  read without parsing the rest of the file (see read_backup_index, iter_backup and the names= option of load_alarms etc).
+  The index is NDJSON too: a header line, then one [name, offset, length, type, full name] line per name, sorted by name so readers 
+  binary search it. Entries are sorted in runs of BACKUP_INDEX_RUN_SIZE as they are written, and the runs merged on close.
+  Compressed backups are not indexed, since they cannot be read from an offset.
+  The file is written under a temporary name, and only renamed to filepath when closed, so a failed backup never leaves a truncated file.
+  Use as a context manager: the backup is completed on success, and discarded on an exception.
+  """
+  valid_compressions=[None,'gzip','zstd']
+  
+  def __init__(self, filepath, backup_type, region=None, account=None, compression=None):
+    if compression not in self.valid_compressions:
+        raise Exception("Error compression '%s' invalid. Valid options: '%s'" % (compression,str(self.valid_compressions)))
+    if compression == 'zstd' and zstandard is None:
+        raise Exception("compression='zstd' requires the zstandard module. Install it with: pip install zstandard")
+    self._filepath=filepath
+    self._tmp_path=filepath + ".tmp"
+    self._raw=open(self._tmp_path,"wb")
+    if compression == 'gzip':
+        self._file=gzip.GzipFile(fileobj=self._raw, mode="wb")
+    elif compression == 'zstd':
+        self._file=zstandard.ZstdCompressor().stream_writer(self._raw)
+    else:
+        self._file=self._raw
+    self._compression=compression
+    self.counts={}
+    self._offset=0
+    self._indexed=compression is None
+    self._index_run=[]
+    self._index_runs=[]
+    self._timestamp=datetime.now(timezone.utc).isoformat()
+    self._write_line({'fomo_backup': 1, 'type': backup_type, 'region': region, 'account': account,
+                      'timestamp': self._timestamp, 'compression': compression})
+  
+  def __enter__(self):
+      return self
+  
+  def __exit__(self, exc_type, exc_value, traceback):
+      if exc_type is None:
+          self.close()
+      else:
+          self.abort()
+  
+  def write(self, my_object, object_type):
+      """ Writes one object to the backup, counted under object_type (e.g. MetricAlarm) """
+      self.counts[object_type]=self.counts.get(object_type, 0) + 1
+      offset=self._offset
+      length=self._write_line(my_object)
+      if self._indexed:
+          index_type, names=_backup_object_names(my_object)
+          for name in names:
+              self._index_run.append([name, offset, length, index_type, names[0]])
+          if len(self._index_run) >= BACKUP_INDEX_RUN_SIZE:
+              self._write_index_run()
+  
+  def close(self):
+      """ Writes the trailer, and moves the completed backup (and its index) into place """
+      self._write_line({'fomo_backup_end': {'counts': self.counts}})
+      self._close_files()
+      if self._indexed:
+          self._write_index_run()
+          self._merge_index_runs()
+      os.replace(self._tmp_path, self._filepath)
+      if self._indexed:
+          os.replace(self._filepath + ".idx.tmp", self._filepath + ".idx")
+      elif os.path.exists(self._filepath + ".idx"):
+          os.remove(self._filepath + ".idx")
+  
+  def abort(self):
+      """ Discards the backup """
+      self._close_files()
+      for path in [self._tmp_path, self._filepath + ".idx.tmp"] + self._index_runs:
+          if os.path.exists(path):
+              os.remove(path)
+  
+  def _write_index_run(self):
+      """ Sorts the index entries held in memory by name, and writes them to a run file """
+      if not self._index_run:
+          return
+      self._index_run.sort(key=_index_line_key)
+      run_path="%s.idx.%d.tmp" % (self._filepath, len(self._index_runs))
+      f=open(run_path,"w")
+      try:
+          for entry in self._index_run:
+              f.write(json.dumps(entry) + "\n")
+      finally:
+          f.close()
+      self._index_runs.append(run_path)
+      self._index_run=[]
+  
+  def _merge_index_runs(self):
+      """ Merges the sorted run files into <filepath>.idx.tmp, reading one line of each at a time """
+      my_runs=[open(path,"r") for path in self._index_runs]
+      try:
+          f=open(self._filepath + ".idx.tmp","w")
+          try:
+              f.write(json.dumps({'fomo_backup_index': 2, 'size': self._offset, 'timestamp': self._timestamp}) + "\n")
+              for line in heapq.merge(*my_runs, key=lambda line: _index_line_key(json.loads(line))):
+                  f.write(line)
+          finally:
+              f.close()
+      finally:
+          for run in my_runs:
+              run.close()
+      for path in self._index_runs:
+          os.remove(path)
+      self._index_runs=[]
+  
+  def _write_line(self, my_object):
+      """ Writes my_object as one line, and returns its length in bytes (without the newline) """
+      line=(json.dumps(my_object, default=_json_default) + "\n").encode("utf-8")
+      self._file.write(line)
+      self._offset+=len(line)
+      return len(line) - 1
+  
+  def _close_files(self):
+      if self._file is not self._raw:
+          self._file.close()
+      if not self._raw.closed:
+          self._raw.close()
+
+def _open_backup_file(filepath):
+    """ Opens a backup file for reading text, decompressing gzip or zstd backups (detected from the file's first bytes) """
+    f=open(filepath,"rb")
+    magic=f.read(4)
+    f.seek(0)
+    if magic[:2] == b"\x1f\x8b":
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=f, mode="rb"), encoding="utf-8")
+    if magic == b"\x28\xb5\x2f\xfd":
+        if zstandard is None:
+            f.close()
+            raise Exception("'%s' is zstd compressed, which requires the zstandard module. Install it with: pip install zstandard" % filepath)
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(f), encoding="utf-8")
+    return io.TextIOWrapper(f, encoding="utf-8")
+
+def is_streamed_backup(filepath):
+    """ Returns True if filepath is a streaming (NDJSON) backup written by BackupWriter """
+    # only the header's first bytes are read, since a single document backup has no newline to stop readline() before the end of the file
+    my_prefix='{"fomo_backup":'
+    f=_open_backup_file(filepath)
+    try:
+        return f.read(len(my_prefix)) == my_prefix
+    finally:
+        f.close()
+
+def read_backup_header(filepath):
+    """ Returns the header of a streaming backup, with the 'counts' from its trailer added if the backup is complete """
+    my_header=None
+    f=_open_backup_file(filepath)
+    try:
+        for line in f:
+            my_line=json.loads(line)
+            if my_header is None:
+                my_header=my_line
+            elif "fomo_backup_end" in my_line:
+                my_header['counts']=my_line['fomo_backup_end']['counts']
+    finally:
+        f.close()
+    return my_header
+
+def read_backup_index(filepath, names=None):
+    """ 
+    Looks names up in the sidecar index (<filepath>.idx) of an uncompressed streaming backup: {'objects': {name: [[offset, length, type, name]]}, ...}
+    Only the requested names are read, by binary searching the sorted index through a memory map; names=None reads every entry.
+    Returns None if there is no index, or it does not belong to the backup as it is now (e.g. the backup was overwritten since).
+    """
+    idx_path=filepath + ".idx"
+    if not os.path.exists(idx_path) or not os.path.exists(filepath):
+        return None
+    try:
+        f=open(filepath,"rb")
+        try:
+            my_header=json.loads(f.readline())
+        finally:
+            f.close()
+        f=open(idx_path,"rb")
+        try:
+            my_index=json.loads(f.readline())
+            if my_index.get('fomo_backup_index') != 2 or my_index.get('size') != os.path.getsize(filepath) or my_header.get('timestamp') != my_index.get('timestamp'):
+                return None
+            start=f.tell()
+            end=os.path.getsize(idx_path)
+            my_index['objects']={}
+            if start == end:
+                return my_index
+            if names is None:
+                for line in f:
+                    entry=json.loads(line)
+                    my_index['objects'].setdefault(entry[0], []).append(entry[1:])
+                return my_index
+            mm=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for name in names:
+                    entries=_index_lookup(mm, start, end, name)
+                    if entries:
+                        my_index['objects'][name]=entries
+            finally:
+                mm.close()
+        finally:
+            f.close()
+    except (ValueError, OSError):
+        return None
+    return my_index
+
+def _index_line_key(entry):
+    return (entry[0], entry[1])
+
+def _index_lookup(mm, start, end, name):
+    """ Returns the [offset, length, type, name] entries for name, binary searching the index lines between start and end """
+    lo, hi=start, end
+    # lo and hi are always line starts: every line before lo sorts before name, and every line from hi on does not
+    while lo < hi:
+        mid=(lo + hi) // 2
+        line_start=mm.rfind(b"\n", lo, mid) + 1 or lo
+        line_end=mm.find(b"\n", line_start, end)
+        if json.loads(mm[line_start:line_end])[0] < name:
+            lo=line_end + 1
+        else:
+            hi=line_start
+    entries=[]
+    while lo < end:
+        line_end=mm.find(b"\n", lo, end)
+        entry=json.loads(mm[lo:line_end])
+        if entry[0] != name:
+            break
+        entries.append(entry[1:])
+        lo=line_end + 1
+    return entries
+
+def iter_backup(filepath, names=None):
+    """ 
+    Yields the objects in a streaming backup one at a time, without loading the whole file.
+    names: only yield the objects with these names (see index_backup for how objects are named). 
+    If the backup has an index (see read_backup_index), the objects are read straight from their offsets, and the rest of the file is not read at all.
+    """
+    if names is not None:
+        names=set(names)
+        my_index=read_backup_index(filepath, names)
+        if my_index is not None:
+            return _iter_indexed_backup(filepath, my_index, names)
+    return _iter_streamed_backup(filepath, names)
+
+def _iter_indexed_backup(filepath, my_index, names):
+    """ Yields the named objects of an indexed backup, in file order, through a memory map of the file """
+    entries={}
+    for name in names:
+        for offset, length, object_type, object_name in my_index['objects'].get(name, []):
+            entries[offset]=length
+    if not entries:
+        return
+    f=open(filepath,"rb")
+    try:
+        mm=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for offset in sorted(entries):
+                yield json.loads(mm[offset:offset + entries[offset]])
+        finally:
+            mm.close()
+    finally:
+        f.close()
+
+def _iter_streamed_backup(filepath, names=None):
+    f=_open_backup_file(filepath)
+    try:
+        first_line=True
+        for line in f:
+            my_line=json.loads(line)
+            if first_line:
+                first_line=False
+                if "fomo_backup" not in my_line:
+                    raise Exception("'%s' is not a streaming backup file." % filepath)
+                continue
+            if "fomo_backup_end" in my_line:
+                return
+            if names is None or not names.isdisjoint(_backup_object_names(my_line)[1]):
+                yield my_line
+    finally:
+        f.close()
+
+def index_backup(filepath, names=None):
+    """ 
+    Loads a backup file of alarms, dashboards or metric filters (any backup format) and indexes its objects by name:
+      {name: [(object_type, name, object)]}
+    Metric filters are indexed under both "<filterName>" and "<logGroupName>:<filterName>", the latter being the name they are restored as.
+    names: only load the objects with these names (read straight from the file if it has an index).
+    """
+    my_backup=_load_backup(filepath, "backup", names)
+    if isinstance(my_backup, dict):
+        if "MetricAlarms" in my_backup or "CompositeAlarms" in my_backup:
+            my_backup=list(my_backup.get('MetricAlarms',[])) + list(my_backup.get('CompositeAlarms',[]))
+        else:
+            # backup_alarm and backup_dashboard write a single object
+            my_backup=[my_backup]
+    my_index={}
+    for my_object in my_backup:
+        object_type, object_names=_backup_object_names(my_object)
+        for name in object_names:
+            my_index.setdefault(name, []).append((object_type, object_names[0], my_object))
+    return my_index
+
+def _backup_object_names(my_object):
+    """ Returns the type of an object in a backup, and the names it is known by (its full name first) """
+    if "AlarmName" in my_object:
+        return ("CompositeAlarm" if "AlarmRule" in my_object else "MetricAlarm", [my_object['AlarmName']])
+    if "DashboardName" in my_object:
+        return ("Dashboard", [my_object['DashboardName']])
+    if "filterName" in my_object:
+        return ("MetricFilter", [my_object['logGroupName'] + ":" + my_object['filterName'], my_object['filterName']])
+    raise Exception("Unable to determine object type of backup object - bad object.")
+
+def _load_backup(filepath, file_type, names=None):
+    """ 
+    Loads a backup file written either as one JSON document, or as a streaming backup.
+    names: only load the objects with these names. Indexed streaming backups are read from the objects' offsets; other files are filtered as they are read.
+      A single object backup (as written by backup_alarm and backup_dashboard) is then returned wrapped, whether or not it matched:
+      alarms as {'MetricAlarms': [...], 'CompositeAlarms': [...]}, anything else as a list of zero or one objects.
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError("File specified does not exist.")
+    try:
+        if is_streamed_backup(filepath):
+            return list(iter_backup(filepath, names))
+        f=open(filepath,"r")
+        try:
+            my_backup=json.load(f)
+        finally:
+            f.close()
+    except (ValueError, OSError):
+        raise Exception("There was an error loading JSON valus from file. Verify validity of %s file." % file_type)
+    if names is None:
+        return my_backup
+    names=set(names)
+    def wanted(my_objects):
+        return [x for x in my_objects if not names.isdisjoint(_backup_object_names(x)[1])]
+    if isinstance(my_backup, list):
+        return wanted(my_backup)
+    if "MetricAlarms" in my_backup or "CompositeAlarms" in my_backup:
+        return {k: wanted(v) if k in ['MetricAlarms','CompositeAlarms'] else v for k, v in my_backup.items()}
+    # a single object, as written by backup_alarm and backup_dashboard
+    my_objects=wanted([my_backup])
+    if "AlarmName" in my_backup:
+        return {'MetricAlarms': [a for a in my_objects if "AlarmRule" not in a], 'CompositeAlarms': [a for a in my_objects if "AlarmRule" in a]}
+    return my_objects
+
+#---
+#--- Snapshot store, for incremental snapshots of CloudWatch configuration
+#---
+#--- keys describing an alarm's state or identity rather than its configuration, which are not kept in snapshots
+_ALARM_STATE_KEYS=['AlarmArn','AlarmConfigurationUpdatedTimestamp','StateValue','StateReason','StateReasonData','StateUpdatedTimestamp','StateTransitionedTimestamp','ActionsSuppressedBy','ActionsSuppressedReason','EvaluationState','Region']
+
+class SnapshotStore:
+  """ 
+  Content addressed store of CloudWatch configuration snapshots, kept in a directory:
+    objects/<hash[:2]>/<hash>.json  - each unique object (alarm, dashboard or metric filter), stored once under the hash of its content
+    snapshots/<snapshot_id>.json    - a small manifest per snapshot, of {resource: {name: hash}}
+    catalog.json                    - a summary of each snapshot (see list_snapshots), so listing snapshots or finding the latest reads no manifests
+  Alarm state (see _ALARM_STATE_KEYS) is left out of stored alarms, so an unchanged alarm is stored once however many snapshots include it.
+  Metric filters are named "<logGroupName>:<filterName>" in manifests.
+    store=SnapshotStore("/backups/cloudwatch")
+    snapshot_id=store.snapshot(session)
+    store.diff(store.list_snapshots()[-2]['SnapshotId'], snapshot_id)
+  """
+  valid_resources=['alarms','dashboards','metric_filters']
+  
+  def __init__(self, root_path):
+    self._root=root_path
+    os.makedirs(os.path.join(root_path, "objects"), exist_ok=True)
+    os.makedirs(os.path.join(root_path, "snapshots"), exist_ok=True)
+  
+  def snapshot(self, session, resources=None, snapshot_id=None, max_workers=8):
+      """ 
+      Takes a snapshot of a Session's alarms, dashboards and/or metric filters (resources), and returns its snapshot_id.
+      Only objects not already in the store are written. Dashboards whose LastModified is unchanged since the latest snapshot are not fetched again.
+      """
+      resources=self._check_resources(resources)
+      manifest=self._new_manifest(snapshot_id, session._region, session.get_account_id())
+      if "alarms" in resources:
+          manifest['alarms']={}
+          for page in session._cloudwatch.get_paginator('describe_alarms').paginate(AlarmTypes=['MetricAlarm','CompositeAlarm']):
+              for a in page['MetricAlarms'] + page['CompositeAlarms']:
+                  manifest['alarms'][a['AlarmName']]=self.put_object(a)
+      if "dashboards" in resources:
+          latest=self._latest_manifest()
+          previous_hashes=(latest or {}).get('dashboards', {})
+          previous_modified=(latest or {}).get('dashboard_last_modified', {})
+          manifest['dashboards']={}
+          manifest['dashboard_last_modified']={}
+          def snapshot_dashboard(db):
+              name=db['DashboardName']
+              last_modified=str(db['LastModified'])
+              if name in previous_hashes and previous_modified.get(name) == last_modified:
+                  return (name, previous_hashes[name], last_modified)
+              try:
+                  my_db=session.get_dashboard(name)
+              except DashboardNotFound:
+                  return None
+              return (name, self.put_object(my_db), last_modified)
+          with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+              for page in session._cloudwatch.get_paginator('list_dashboards').paginate():
+                  for result in executor.map(snapshot_dashboard, page['DashboardEntries']):
+                      if result is not None:
+                          manifest['dashboards'][result[0]]=result[1]
+                          manifest['dashboard_last_modified'][result[0]]=result[2]
+      if "metric_filters" in resources:
+          manifest['metric_filters']={}
+          for page in session._cwlogs.get_paginator('describe_metric_filters').paginate():
+              for mf in page['metricFilters']:
+                  manifest['metric_filters'][mf['logGroupName'] + ":" + mf['filterName']]=self.put_object(mf)
+      return self._write_manifest(manifest)
+  
+  def add_snapshot(self, alarms=None, dashboards=None, metric_filters=None, snapshot_id=None, region=None, account=None):
+      """ 
+      Adds a snapshot of objects already loaded (e.g. with load_alarms/load_dashboards/load_metric_filters), and returns its snapshot_id.
+      Only the resources specified are included.
+      """
+      manifest=self._new_manifest(snapshot_id, region, account)
+      if alarms is not None:
+          if isinstance(alarms, dict):
+              alarms=list(alarms.get('MetricAlarms',[])) + list(alarms.get('CompositeAlarms',[]))
+          manifest['alarms']={a['AlarmName']: self.put_object(a) for a in alarms}
+      if dashboards is not None:
+          manifest['dashboards']={db['DashboardName']: self.put_object(db) for db in dashboards}
+      if metric_filters is not None:
+          manifest['metric_filters']={mf['logGroupName'] + ":" + mf['filterName']: self.put_object(mf) for mf in metric_filters}
+      return self._write_manifest(manifest)
+  
+  def list_snapshots(self):
+      """ Returns a summary of each snapshot, oldest first: {'SnapshotId','Timestamp','Region','Account','Counts'} """
+      return sorted(self._load_catalog().values(), key=lambda m: (m['Timestamp'], m['SnapshotId']))
+  
+  def load_manifest(self, snapshot_id):
+      """ Returns the manifest of a snapshot """
+      manifest_path=self._manifest_path(snapshot_id)
+      if not os.path.exists(manifest_path):
+          raise Exception("Snapshot '%s' not found in '%s'." % (snapshot_id, self._root))
+      f=open(manifest_path,"r")
+      try:
+          return json.load(f)
+      finally:
+          f.close()
+  
+  def diff(self, old_snapshot_id, new_snapshot_id):
+      """ 
+      Compares two snapshots using only their manifests, and returns the names added, removed and changed per resource:
+        {resource: {'added': [...], 'removed': [...], 'changed': [...]}}
+      """
+      old_manifest=self.load_manifest(old_snapshot_id)
+      new_manifest=self.load_manifest(new_snapshot_id)
+      my_diff={}
+      for r in self.valid_resources:
+          if r not in old_manifest and r not in new_manifest:
+              continue
+          old_entries=old_manifest.get(r, {})
+          new_entries=new_manifest.get(r, {})
+          my_diff[r]={
+              'added': sorted([n for n in new_entries if n not in old_entries]),
+              'removed': sorted([n for n in old_entries if n not in new_entries]),
+              'changed': sorted([n for n in new_entries if n in old_entries and new_entries[n] != old_entries[n]])
+          }
+      return my_diff
+  
+  def load_snapshot(self, snapshot_id, resources=None):
+      """ 
+      Rebuilds a snapshot's objects, in the same forms as load_alarms/load_dashboards/load_metric_filters:
+        {'alarms': {'MetricAlarms','CompositeAlarms'}, 'dashboards': [...], 'metric_filters': [...]}
+      """
+      resources=self._check_resources(resources)
+      manifest=self.load_manifest(snapshot_id)
+      my_snapshot={}
+      if "alarms" in resources and "alarms" in manifest:
+          my_alarms=[self.get_object(h) for h in manifest['alarms'].values()]
+          my_snapshot['alarms']={'MetricAlarms': [a for a in my_alarms if "AlarmRule" not in a], 'CompositeAlarms': [a for a in my_alarms if "AlarmRule" in a]}
+      if "dashboards" in resources and "dashboards" in manifest:
+          my_snapshot['dashboards']=[self.get_object(h) for h in manifest['dashboards'].values()]
+      if "metric_filters" in resources and "metric_filters" in manifest:
+          my_snapshot['metric_filters']=[self.get_object(h) for h in manifest['metric_filters'].values()]
+      return my_snapshot
+  
+  def export_snapshot(self, snapshot_id, alarms_path=None, dashboards_path=None, metric_filters_path=None, overwrite=False):
+      """ 
+      Writes a snapshot out as streaming backup files, which can be passed to restore_alarm/restore_dashboard/restore_metric_filter 
+      (or loaded with load_alarms/load_dashboards/load_metric_filters). Only the paths specified are written.
+      """
+      manifest=self.load_manifest(snapshot_id)
+      exports=[('alarms', alarms_path), ('dashboards', dashboards_path), ('metric_filters', metric_filters_path)]
+      for resource, filepath in exports:
+          if filepath is None:
+              continue
+          if resource not in manifest:
+              raise Exception("Snapshot '%s' does not include %s." % (snapshot_id, resource))
+          if os.path.exists(filepath) and overwrite == False:
+              raise Exception("The filepath specified '%s' already exists, and overwrite=False. Specify overwrite=True, or a different path, to create the backup." % filepath)
+          with BackupWriter(filepath, resource, region=manifest['region'], account=manifest['account']) as writer:
+              for h in manifest[resource].values():
+                  my_object=self.get_object(h)
+                  if resource == "alarms":
+                      writer.write(my_object, "CompositeAlarm" if "AlarmRule" in my_object else "MetricAlarm")
+                  else:
+                      writer.write(my_object, "Dashboard" if resource == "dashboards" else "MetricFilter")
+  
+  def delete_snapshot(self, snapshot_id):
+      """ Removes a snapshot's manifest. Objects no longer used by any snapshot are removed by prune_objects() """
+      os.remove(self._manifest_path(snapshot_id))
+      my_catalog=self._load_catalog()
+      my_catalog.pop(snapshot_id, None)
+      self._write_catalog(my_catalog)
+  
+  def prune_objects(self):
+      """ Removes stored objects that no snapshot references, and returns how many were removed """
+      referenced=set()
+      for snapshot_id in self._load_catalog():
+          manifest=self.load_manifest(snapshot_id)
+          for r in self.valid_resources:
+              referenced.update(manifest.get(r, {}).values())
+      removed=0
+      objects_path=os.path.join(self._root, "objects")
+      for prefix in os.listdir(objects_path):
+          for file_name in os.listdir(os.path.join(objects_path, prefix)):
+              if file_name[:-len(".json")] not in referenced:
+                  os.remove(os.path.join(objects_path, prefix, file_name))
+                  removed+=1
+      return removed
+  
+  def put_object(self, my_object):
+      """ Stores an object (without alarm state or response metadata) if it is not already stored, and returns its hash """
+      my_object={k: v for k, v in my_object.items() if k not in _ALARM_STATE_KEYS and k != 'ResponseMetadata'}
+      my_object_str=json.dumps(my_object, sort_keys=True, default=str)
+      my_hash=hashlib.sha256(my_object_str.encode("utf-8")).hexdigest()
+      object_path=self._object_path(my_hash)
+      if not os.path.exists(object_path):
+          os.makedirs(os.path.dirname(object_path), exist_ok=True)
+          _write_file_atomically(object_path, my_object_str)
+      return my_hash
+  
+  def get_object(self, my_hash):
+      """ Returns a stored object by its hash """
+      f=open(self._object_path(my_hash),"r")
+      try:
+          return json.load(f)
+      finally:
+          f.close()
+  
+  def _check_resources(self, resources):
+      resources=resources or self.valid_resources
+      for r in resources:
+          if r not in self.valid_resources:
+              raise Exception("Error resource '%s' invalid. Valid options: '%s'" % (r,str(self.valid_resources)))
+      return resources
+  
+  def _new_manifest(self, snapshot_id, region, account):
+      my_timestamp=datetime.now(timezone.utc)
+      if snapshot_id is None:
+          snapshot_id=my_timestamp.strftime("%Y%m%dT%H%M%S.%fZ")
+      if os.path.exists(self._manifest_path(snapshot_id)):
+          raise Exception("Snapshot '%s' already exists in '%s'." % (snapshot_id, self._root))
+      return {'snapshot_id': snapshot_id, 'timestamp': my_timestamp.isoformat(), 'region': region, 'account': account}
+  
+  def _write_manifest(self, manifest):
+      my_catalog=self._load_catalog()
+      _write_file_atomically(self._manifest_path(manifest['snapshot_id']), json.dumps(manifest))
+      my_catalog[manifest['snapshot_id']]=self._catalog_entry(manifest)
+      self._write_catalog(my_catalog)
+      return manifest['snapshot_id']
+  
+  def _latest_manifest(self):
+      my_snapshots=self.list_snapshots()
+      if not my_snapshots:
+          return None
+      return self.load_manifest(my_snapshots[-1]['SnapshotId'])
+  
+  def _catalog_entry(self, manifest):
+      return {'SnapshotId': manifest['snapshot_id'], 'Timestamp': manifest['timestamp'], 'Region': manifest['region'], 'Account': manifest['account'],
+              'Counts': {r: len(manifest[r]) for r in self.valid_resources if r in manifest}}
+  
+  def _load_catalog(self):
+      """ 
+      Returns the catalog, {snapshot_id: summary}. Only the snapshots directory is listed, to check it against the manifests present:
+      manifests missing from the catalog (e.g. a store written before the catalog existed) are read once and added, and removed ones dropped.
+      """
+      my_catalog={}
+      catalog_path=os.path.join(self._root, "catalog.json")
+      if os.path.exists(catalog_path):
+          f=open(catalog_path,"r")
+          try:
+              my_catalog=json.load(f)
+          finally:
+              f.close()
+      snapshot_ids=set(n[:-len(".json")] for n in os.listdir(os.path.join(self._root, "snapshots")) if n.endswith(".json"))
+      changed=False
+      for snapshot_id in list(my_catalog):
+          if snapshot_id not in snapshot_ids:
+              del my_catalog[snapshot_id]
+              changed=True
+      for snapshot_id in snapshot_ids:
+          if snapshot_id not in my_catalog:
+              my_catalog[snapshot_id]=self._catalog_entry(self.load_manifest(snapshot_id))
+              changed=True
+      if changed:
+          self._write_catalog(my_catalog)
+      return my_catalog
+  
+  def _write_catalog(self, my_catalog):
+      _write_file_atomically(os.path.join(self._root, "catalog.json"), json.dumps(my_catalog))
+  
+  def _manifest_path(self, snapshot_id):
+      return os.path.join(self._root, "snapshots", snapshot_id + ".json")
+  
+  def _object_path(self, my_hash):
+      return os.path.join(self._root, "objects", my_hash[:2], my_hash + ".json")
+
+def _write_file_atomically(filepath, contents):
+    """ Writes contents to filepath via a temporary file, so readers never see a partly written file """
+    tmp_path=filepath + ".tmp"
+    f=open(tmp_path,"w")
+    f.write(contents)
+    f.close()
+    os.replace(tmp_path, filepath)
+
+#---
+#--- Sync plans, returned by Session.plan() and made by Session.apply()
+#---
+class SyncPlan:
+  """ 
+  The changes needed to make live alarms, dashboards and metric filters match desired ones.
+    changes: list of {'Action': create/update/delete, 'Type', 'Name', 'Desired', 'Live'}
+    unchanged: the number of desired objects that already match
+  Metric filters are named by (logGroupName, filterName).
+  """
+  def __init__(self):
+    self.changes=[]
+    self.unchanged=0
+  
+  def __repr__(self):
+      return "SyncPlan(%s)" % ", ".join(["%s=%d" % (k, v) for k, v in self.summary().items()])
+  
+  def summary(self):
+      """ Returns the number of changes of each action, and the number of unchanged objects """
+      my_summary={'create': 0, 'update': 0, 'delete': 0, 'unchanged': self.unchanged}
+      for c in self.changes:
+          my_summary[c['Action']]+=1
+      return my_summary
+  
+  def print_plan(self):
+      """ Prints the planned changes as a table """
+      print(tabulate([[c['Action'], c['Type'], c['Name']] for c in self.changes], headers=['Action','Type','Name']))
+      print(self)
+  
+  def _compare(self, desired, live, type_of, normalize, delete):
+      """ Adds the changes needed to turn live into desired, both keyed by name """
+      for name, d in desired.items():
+          if name not in live:
+              self.changes.append({'Action': 'create', 'Type': type_of(d), 'Name': name, 'Desired': d, 'Live': None})
+          elif definition_hash(normalize(d)) != definition_hash(normalize(live[name])):
+              self.changes.append({'Action': 'update', 'Type': type_of(d), 'Name': name, 'Desired': d, 'Live': live[name]})
+          else:
+              self.unchanged+=1
+      if delete:
+          for name, l in live.items():
+              if name not in desired:
+                  self.changes.append({'Action': 'delete', 'Type': type_of(l), 'Name': name, 'Desired': None, 'Live': l})
+
+def _sync_result(change, status, error=None):
+    return {'Action': change['Action'], 'Type': change['Type'], 'Name': change['Name'], 'Status': status, 'Error': None if error is None else str(error)}
+
+def normalize_alarm(my_alarm):
+    """ 
+    Returns the configuration-only form of an alarm, for comparing definitions:
+    only the fields put_metric_alarm/put_composite_alarm write are kept (so e.g. Unit is not compared, since writing the alarm would not change it),
+    defaults that put_metric_alarm fills in are applied, and actions and dimensions are sorted.
+    """
+    my_alarm={k: my_alarm[k] for k in _alarm_written_keys(my_alarm) if k in my_alarm}
+    if "AlarmRule" not in my_alarm:
+        my_alarm.setdefault('TreatMissingData', "missing")
+        if "EvaluationPeriods" in my_alarm:
+            my_alarm.setdefault('DatapointsToAlarm', my_alarm['EvaluationPeriods'])
+    my_alarm.setdefault('AlarmDescription', "No description")
+    for action_type in ['AlarmActions','OKActions','InsufficientDataActions']:
+        my_alarm[action_type]=sorted(my_alarm.get(action_type, []))
+    if "Dimensions" in my_alarm:
+        my_alarm['Dimensions']=sorted(my_alarm['Dimensions'], key=lambda d: (d['Name'], d['Value']))
+    if "Threshold" in my_alarm:
+        my_alarm['Threshold']=float(my_alarm['Threshold'])
+    return my_alarm
+
+def _alarm_written_keys(my_alarm):
+    """ Returns the keys of an alarm that put_metric_alarm or put_composite_alarm send, following the same choice of payload as _send_metric_alarm """
+    my_keys=['AlarmName','ActionsEnabled','AlarmActions','OKActions','InsufficientDataActions','AlarmDescription']
+    if "AlarmRule" in my_alarm:
+        return my_keys + ['AlarmRule']
+    my_keys=my_keys + ['EvaluationPeriods','DatapointsToAlarm','ComparisonOperator','TreatMissingData']
+    if my_alarm.get('MetricName'):
+        return my_keys + ['MetricName','Namespace','Dimensions','Period','Threshold', 'Statistic' if my_alarm.get('Statistic') else 'ExtendedStatistic']
+    if "ThresholdMetricId" in my_alarm:
+        return my_keys + ['Metrics','ThresholdMetricId']
+    return my_keys + ['Metrics','Threshold']
+
+def normalize_dashboard(my_dashboard):
+    """ Returns the name and body of a dashboard, with the body's JSON re-serialized in a stable key order """
+    my_body=my_dashboard.get('DashboardBody')
+    try:
+        my_body=json.dumps(json.loads(my_body), sort_keys=True)
+    except (TypeError, ValueError):
+        pass
+    return {'DashboardName': my_dashboard['DashboardName'], 'DashboardBody': my_body}
+
+def normalize_metric_filter(my_filter):
+    """ Returns the configuration-only form of a metric filter, without creationTime """
+    return {k: v for k, v in my_filter.items() if k not in ['creationTime','Region']}
+
+def definition_hash(my_object):
+    """ Returns a stable SHA-256 hash of an object (e.g. a normalized alarm), independent of key order """
+    return hashlib.sha256(json.dumps(my_object, sort_keys=True, default=_json_default).encode("utf-8")).hexdigest()
+
+#--- statistic names as put_metric_alarm and MetricStat accept them, by lower case name or abbreviation
+_STATISTIC_NAMES={'average': "Average", 'avg': "Average", 'sum': "Sum", 'minimum': "Minimum", 'min': "Minimum",
+                  'maximum': "Maximum", 'max': "Maximum", 'samplecount': "SampleCount"}
+
+def alarm_evaluation_definition(my_alarm, include_threshold=True):
+    """ 
+    Returns the canonical form of what an alarm evaluates, for finding alarms that behave the same under different names:
+    dimensions sorted, statistics normalized (e.g. "avg" and "Average", "P99.0" and "p99"), defaults applied, and for Metrics-based alarms,
+    query Ids replaced by hashes of what they query and whitespace removed from expressions, so Id names and query order don't matter.
+    Names, descriptions, actions and state are left out. Specify include_threshold=False to also leave out the threshold.
+    """
+    if "AlarmRule" in my_alarm:
+        return {'AlarmRule': " ".join(my_alarm['AlarmRule'].split())}
+    my_definition={'ComparisonOperator': my_alarm.get('ComparisonOperator'), 'EvaluationPeriods': my_alarm.get('EvaluationPeriods'),
+                   'DatapointsToAlarm': my_alarm.get('DatapointsToAlarm') or my_alarm.get('EvaluationPeriods'),
+                   'TreatMissingData': my_alarm.get('TreatMissingData') or "missing",
+                   'EvaluateLowSampleCountPercentile': my_alarm.get('EvaluateLowSampleCountPercentile') or ""}
+    if my_alarm.get('MetricName'):
+        my_definition['Metric']=_canonical_metric_stat({'Namespace': my_alarm['Namespace'], 'MetricName': my_alarm['MetricName'], 'Dimensions': my_alarm.get('Dimensions', [])},
+                                                        my_alarm.get('Statistic') or my_alarm.get('ExtendedStatistic'), my_alarm.get('Period'), my_alarm.get('Unit'))
+    else:
+        my_ids, my_forms=_canonical_metric_queries(my_alarm.get('Metrics', []) or [])
+        my_definition['Metrics']=sorted([dict(my_forms[m['Id']], Id=my_ids[m['Id']], ReturnData=m.get('ReturnData', True)) for m in my_alarm.get('Metrics', []) or []], key=lambda q: q['Id'])
+        if my_alarm.get('ThresholdMetricId'):
+            my_definition['ThresholdMetricId']=my_ids.get(my_alarm['ThresholdMetricId'], my_alarm['ThresholdMetricId'])
+    if include_threshold and "Threshold" in my_alarm:
+        my_definition['Threshold']=float(my_alarm['Threshold'])
+    return my_definition
+
+def _canonical_statistic(stat):
+    """ Returns a statistic's canonical name: "Average" for "avg", "p99" for "P99.0" """
+    if stat is None:
+        return None
+    my_stat=str(stat).strip()
+    if my_stat.lower() in _STATISTIC_NAMES:
+        return _STATISTIC_NAMES[my_stat.lower()]
+    my_match=re.fullmatch(r"([a-zA-Z]+)([0-9]+(?:\.[0-9]*)?)", my_stat)
+    if my_match:
+        return my_match.group(1).lower() + "%g" % float(my_match.group(2))
+    return my_stat.lower()
+
+def _canonical_metric_stat(my_metric, stat, period, unit):
+    return {'Namespace': my_metric['Namespace'], 'MetricName': my_metric['MetricName'], 
+            'Dimensions': sorted([d['Name'], d['Value']] for d in my_metric.get('Dimensions', []) or []),
+            'Stat': _canonical_statistic(stat), 'Period': int(period) if period is not None else None, 'Unit': unit or None}
+
+def _canonical_metric_queries(my_metrics):
+    """ Returns ({Id: canonical Id}, {Id: canonical form}) of an alarm's Metrics, where a query's canonical Id is the hash of its canonical form """
+    my_ids={}
+    my_forms={}
+    known_ids=set(m['Id'] for m in my_metrics)
+    pending=list(my_metrics)
+    # expressions are resolved after the queries they reference; anything left (a reference cycle) keeps its own Ids
+    while pending:
+        remaining=[]
+        for m in pending:
+            if "MetricStat" in m:
+                my_form=_canonical_metric_stat(m['MetricStat']['Metric'], m['MetricStat'].get('Stat'), m['MetricStat'].get('Period'), m['MetricStat'].get('Unit'))
+            else:
+                references=set(re.findall(r"(?<![\w.])[A-Za-z_]\w*", _strip_expression_strings(m.get('Expression', "")))) & known_ids
+                if references - set(my_ids) - set([m['Id']]):
+                    remaining.append(m)
+                    continue
+                my_form={'Expression': _canonical_expression(m.get('Expression', ""), my_ids), 'Period': m.get('Period')}
+            if m.get('AccountId'):
+                my_form['AccountId']=m['AccountId']
+            my_forms[m['Id']]=my_form
+            my_ids[m['Id']]="q" + definition_hash(my_form)[:16]
+        if len(remaining) == len(pending):
+            for m in remaining:
+                my_forms[m['Id']]={'Expression': _canonical_expression(m.get('Expression', ""), {}), 'Period': m.get('Period')}
+                my_ids[m['Id']]=m['Id']
+            break
+        pending=remaining
+    return (my_ids, my_forms)
+
+def _strip_expression_strings(expression):
+    return re.sub(r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'", "", expression)
+
+def _canonical_expression(expression, my_ids):
+    """ Returns a metric math expression with whitespace (outside strings) removed, and query Ids replaced from my_ids """
+    def canonical_token(x):
+        if x.group(1):
+            return x.group(1)
+        if x.group(2):
+            return ""
+        return my_ids.get(x.group(3), x.group(3))
+    return re.sub(r"(\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*')|(\s+)|((?<![\w.])[A-Za-z_]\w*)", canonical_token, expression)
+
+#---
+#--- Compact models, an opt-in (compact=True) memory efficient form of alarms, metric filters and dashboards
+#---
+class _Model(Mapping):
+  """ 
+  Base of the compact model classes. Each key of the API's dict is held in a __slots__ attribute of the same name (e.g. alarm.AlarmName),
+  with lists held as tuples and nested dicts as _FrozenDict. Values of the fields that repeat across an inventory (_shared_fields: actions,
+  dimensions, namespaces, metric names, log groups) are shared between the models made with the same shared table, e.g. those of one get_all_alarms().
+  Keys the class doesn't know are kept too, so to_dict() returns exactly the dict the model was made from.
+  Models are read-only mappings, so code written for the API's dicts (alarm['AlarmName'], alarm.get(...), 'x' in alarm) works unchanged;
+  values read from a model are fresh lists and dicts, so changing them never changes the model.
+  """
+  __slots__=('_extra',)
+  _fields=()
+  _field_set=frozenset()
+  _shared_fields=frozenset()
+  
+  def __init__(self, my_object, shared=None):
+    my_extra={}
+    for k, v in my_object.items():
+        v=_freeze(v)
+        if shared is not None and k in self._shared_fields and _is_text(v):
+            v=shared.setdefault(v, v)
+        if k in self._field_set:
+            setattr(self, k, v)
+        else:
+            my_extra[sys.intern(k)]=v
+    self._extra=my_extra or None
+  
+  @classmethod
+  def from_dict(cls, my_object, shared=None):
+      """ Returns the model of an API dict. shared: a dict, used as the table of values shared with other models made with it """
+      return cls(my_object, shared=shared)
+  
+  def to_dict(self):
+      """ Returns the API dict of the model, as consumed by put_metric_alarm, put_composite_alarm, put_metric_filter and put_dashboard """
+      return {k: self[k] for k in self}
+  
+  def __getitem__(self, key):
+      if key in self._field_set:
+          try:
+              return _thaw(getattr(self, key))
+          except AttributeError:
+              raise KeyError(key)
+      if self._extra is not None and key in self._extra:
+          return _thaw(self._extra[key])
+      raise KeyError(key)
+  
+  def __iter__(self):
+      for k in self._fields:
+          if hasattr(self, k):
+              yield k
+      if self._extra is not None:
+          yield from self._extra
+  
+  def __len__(self):
+      return len(list(iter(self)))
+  
+  def __str__(self):
+      # the same text as the dict, so text searches (e.g. filter_metric_alarms search_by="all") match either form alike
+      return str(self.to_dict())
+  
+  def __repr__(self):
+      return "%s(%r)" % (type(self).__name__, self.to_dict())
+  
+  def __getstate__(self):
+      return self.to_dict()
+  
+  def __setstate__(self, state):
+      self.__init__(state)
+
+class _FrozenDict:
+  """ A nested dict held by a model, as a tuple of (key, value) pairs """
+  __slots__=('pairs',)
+  
+  def __init__(self, pairs):
+    self.pairs=pairs
+  
+  def __eq__(self, other):
+      return isinstance(other, _FrozenDict) and self.pairs == other.pairs
+  
+  def __hash__(self):
+      return hash((_FrozenDict, self.pairs))
+
+def _freeze(value):
+    """ Returns the compact form of an API value: tuples for lists and _FrozenDict (with interned keys) for dicts """
+    if isinstance(value, list):
+        return tuple(_freeze(x) for x in value)
+    if isinstance(value, dict):
+        return _FrozenDict(tuple((sys.intern(k) if isinstance(k, str) else k, _freeze(v)) for k, v in value.items()))
+    return value
+
+def _is_text(value):
+    if isinstance(value, str):
+        return True
+    if isinstance(value, tuple):
+        return all(_is_text(x) for x in value)
+    if isinstance(value, _FrozenDict):
+        return all(isinstance(k, str) and _is_text(v) for k, v in value.pairs)
+    return False
+
+def _thaw(value):
+    """ Returns the API form of a compact value """
+    if isinstance(value, tuple):
+        return [_thaw(x) for x in value]
+    if isinstance(value, _FrozenDict):
+        return {k: _thaw(v) for k, v in value.pairs}
+    return value
+
+def _model_class(name, fields, shared_fields=()):
+    # only values made of strings are shared (see _is_text), since e.g. 1 == 1.0 == True would share values that differ
+    return type(name, (_Model,), {'__slots__': tuple(fields), '_fields': tuple(fields), '_field_set': frozenset(fields), 
+                                  '_shared_fields': frozenset(shared_fields), '__module__': __name__})
+
+MetricAlarm=_model_class('MetricAlarm', ['AlarmName','AlarmArn','AlarmDescription','AlarmConfigurationUpdatedTimestamp','ActionsEnabled',
+    'OKActions','AlarmActions','InsufficientDataActions','StateValue','StateReason','StateReasonData','StateUpdatedTimestamp',
+    'MetricName','Namespace','Statistic','ExtendedStatistic','Dimensions','Period','Unit','EvaluationPeriods','DatapointsToAlarm',
+    'Threshold','ComparisonOperator','TreatMissingData','EvaluateLowSampleCountPercentile','Metrics','ThresholdMetricId',
+    'EvaluationState','StateTransitionedTimestamp'],
+    shared_fields=['OKActions','AlarmActions','InsufficientDataActions','Namespace','MetricName','Dimensions'])
+MetricAlarm.__doc__=""" Compact model of a metric alarm (see _Model). MetricAlarm(alarm_dict).to_dict() == alarm_dict """
+
+CompositeAlarm=_model_class('CompositeAlarm', ['AlarmName','AlarmArn','AlarmDescription','AlarmConfigurationUpdatedTimestamp','ActionsEnabled',
+    'OKActions','AlarmActions','InsufficientDataActions','AlarmRule','StateValue','StateReason','StateReasonData','StateUpdatedTimestamp',
+    'StateTransitionedTimestamp','ActionsSuppressedBy','ActionsSuppressedReason','ActionsSuppressor','ActionsSuppressorWaitPeriod',
+    'ActionsSuppressorExtensionPeriod'],
+    shared_fields=['OKActions','AlarmActions','InsufficientDataActions'])
+CompositeAlarm.__doc__=""" Compact model of a composite alarm (see _Model). CompositeAlarm(alarm_dict).to_dict() == alarm_dict """
+
+MetricFilter=_model_class('MetricFilter', ['filterName','filterPattern','metricTransformations','creationTime','logGroupName','applyOnTransformedLogs'],
+    shared_fields=['logGroupName'])
+MetricFilter.__doc__=""" Compact model of a metric filter (see _Model). MetricFilter(filter_dict).to_dict() == filter_dict """
+
+Dashboard=_model_class('Dashboard', ['DashboardName','DashboardArn','DashboardBody','LastModified','Size'])
+Dashboard.__doc__=""" Compact model of a dashboard (see _Model). Dashboard(dashboard_dict).to_dict() == dashboard_dict """
+
+def to_model(my_object):
+    """ Returns the compact model (MetricAlarm, CompositeAlarm, MetricFilter or Dashboard) of an API dict. Models are returned as they are. """
+    if isinstance(my_object, _Model):
+        return my_object
+    if "AlarmRule" in my_object:
+        return CompositeAlarm(my_object)
+    if "AlarmName" in my_object:
+        return MetricAlarm(my_object)
+    if "filterName" in my_object:
+        return MetricFilter(my_object)
+    if "DashboardName" in my_object:
+        return Dashboard(my_object)
+    raise Exception("Unable to determine model for '%s' - bad object." % my_object)
+
+def to_dict(my_object):
+    """ Returns the API dict of a compact model. Dicts are returned as they are. """
+    if isinstance(my_object, _Model):
+        return my_object.to_dict()
+    return my_object
+
+def _json_default(my_object):
+    """ json.dumps default, writing models as their dicts and anything else (e.g. datetimes) as a string """
+    if isinstance(my_object, _Model):
+        return my_object.to_dict()
+    return str(my_object)
+
+#---
+#--- Alarm index, used for fast filtering of large alarm inventories
+#---
+class _SubstringIndex:
+  """ 
+  Substring search over a fixed list of strings.
+  The strings are joined once into a single corpus, so each search is a scan of one string rather than a str() of every object.
+  """
+  def __init__(self, texts):
+    self._starts=[]
+    position=0
+    for t in texts:
+        self._starts.append(position)
+        position+=len(t) + 1
+    # \x00 separates the texts, so a match can never span two of them
+    self._corpus="\x00".join(texts)
+  
+  def search(self, search_string):
+      """ Returns the set of positions (in the original list) of texts containing search_string """
+      found=set()
+      if search_string == "":
+          return set(range(len(self._starts)))
+      position=self._corpus.find(search_string)
+      while position != -1:
+          i=bisect.bisect_right(self._starts, position) - 1
+          found.add(i)
+          # skip to the next text, since this one is already a match
+          if i + 1 >= len(self._starts):
+              break
+          position=self._corpus.find(search_string, self._starts[i + 1])
+      return found
+
+class AlarmQuery:
+  """ 
+  A query against an AlarmIndex. Queries combine with & (AND), | (OR) and ~ (NOT), e.g.
+    AlarmQuery('namespace','AWS/EC2') & AlarmQuery('state','ALARM') & ~AlarmQuery('name_prefix','test-')
+  Fields: see AlarmQuery.valid_fields. Dimensions are matched by 'dimension_name', 'dimension_value', or 'dimension' as a (name,value) tuple.
+  """
+  valid_fields=['name','name_prefix','name_contains','text_contains','metrics_contains','type','namespace','metric_name','dimension_name','dimension_value','dimension','state','action']
+  
+  def __init__(self, field, value=None):
+    if field not in self.valid_fields + ['and','or','not']:
+        raise Exception("Error field '%s' invalid. Valid options: '%s'" % (field,str(self.valid_fields)))
+    self.field=field
+    self.value=value
+  
+  def __and__(self, other):
+      return AlarmQuery('and', [self, other])
+  
+  def __or__(self, other):
+      return AlarmQuery('or', [self, other])
+  
+  def __invert__(self):
+      return AlarmQuery('not', self)
+  
+  def __repr__(self):
+      if self.field in ['and','or']:
+          return "(" + (" %s " % self.field.upper()).join([repr(q) for q in self.value]) + ")"
+      if self.field == 'not':
+          return "NOT " + repr(self.value)
+      return "%s=%r" % (self.field, self.value)
+
+class AlarmIndex:
+  """ 
+  In-memory index of alarms, built once from get_all_alarms() output (or a list of alarms), for repeated fast filtering.
+  Hash indexes are kept on name, type, namespace, metric name, dimension name/value, state and action ARN.
+  Names are also indexed for prefix and substring searches.
+    my_index=AlarmIndex(session.get_all_alarms())
+    my_index.query(AlarmQuery('namespace','AWS/RDS') & AlarmQuery('state','ALARM'), return_type="name")
+  """
+  _hash_fields=['name','type','namespace','metric_name','dimension_name','dimension_value','dimension','state','action']
+  
+  def __init__(self, alarms):
+    if isinstance(alarms, dict):
+        my_alarms=list(alarms.get('MetricAlarms',[])) + list(alarms.get('CompositeAlarms',[]))
+    else:
+        my_alarms=list(alarms)
+    self._alarms=my_alarms
+    self._all_ids=set(range(len(my_alarms)))
+    self._hashes={f: {} for f in self._hash_fields}
+    for i, a in enumerate(my_alarms):
+        for field, value in _alarm_index_terms(a):
+            self._hashes[field].setdefault(value, set()).add(i)
+    self._sorted_names=sorted((a['AlarmName'], i) for i, a in enumerate(my_alarms))
+    self._name_search=_SubstringIndex([a['AlarmName'] for a in my_alarms])
+    # full text searches are only built if they are used
+    self._text_search=None
+    self._metrics_search=None
+  
+  def __len__(self):
+      return len(self._alarms)
+  
+  def __iter__(self):
+      return iter(self._alarms)
+  
+  def get(self, alarm_name):
+      """ Returns the alarm of the given name, or None """
+      ids=self._hashes['name'].get(alarm_name)
+      if not ids:
+          return None
+      return self._alarms[min(ids)]
+  
+  def query(self, query, return_type="full_alarm"):
+      """ 
+      Returns alarms matching an AlarmQuery, in the order they were indexed.
+      return_type=['name','full_alarm']
+      """
+      valid_return_types=['name','full_alarm']
+      if return_type not in valid_return_types:
+          raise Exception("Error return_type '%s' invalid. Valid options: '%s'" % (return_type,str(valid_return_types)))
+      results=[self._alarms[i] for i in sorted(self._evaluate(query))]
+      if return_type == "name":
+          return [a['AlarmName'] for a in results]
+      return results
+  
+  def values(self, field):
+      """ Returns the distinct values indexed for a hash field, e.g. values('namespace') """
+      if field not in self._hash_fields:
+          raise Exception("Error field '%s' invalid. Valid options: '%s'" % (field,str(self._hash_fields)))
+      return list(self._hashes[field].keys())
+  
+  def _evaluate(self, query):
+      """ Returns the set of alarm ids matching query """
+      if query.field == 'and':
+          # stop early once nothing is left to intersect
+          results=None
+          for q in query.value:
+              matched=self._evaluate(q)
+              results=matched if results is None else results & matched
+              if not results:
+                  break
+          return results or set()
+      if query.field == 'or':
+          results=set()
+          for q in query.value:
+              results|=self._evaluate(q)
+          return results
+      if query.field == 'not':
+          return self._all_ids - self._evaluate(query.value)
+      if query.field in self._hashes:
+          return set(self._hashes[query.field].get(query.value, set()))
+      if query.field == 'name_prefix':
+          start=bisect.bisect_left(self._sorted_names, (query.value,))
+          results=set()
+          for name, i in self._sorted_names[start:]:
+              if not name.startswith(query.value):
+                  break
+              results.add(i)
+          return results
+      if query.field == 'name_contains':
+          return self._name_search.search(query.value)
+      if query.field == 'metrics_contains':
+          if self._metrics_search is None:
+              self._metrics_search=_SubstringIndex([_alarm_metrics_text(a) for a in self._alarms])
+          return self._metrics_search.search(query.value)
+      if query.field == 'text_contains':
+          if self._text_search is None:
+              self._text_search=_SubstringIndex([str(a) for a in self._alarms])
+          return self._text_search.search(query.value)
+
+def _alarm_query_pushdown(query):
+    """ 
+    Returns the describe_alarms parameters that narrow the alarms listed to a superset of those matching query, 
+    or None if the query can match no alarm (e.g. two different 'state' terms ANDed).
+    Only terms every match must satisfy are used: the query itself, or terms ANDed at its top level.
+    """
+    my_terms=[]
+    pending=[query]
+    while pending:
+        q=pending.pop(0)
+        if q.field == 'and':
+            pending.extend(q.value)
+        else:
+            my_terms.append(q)
+    my_params={'AlarmTypes': ['MetricAlarm','CompositeAlarm']}
+    my_names=None
+    for q in my_terms:
+        # an OR of names, e.g. AlarmQuery('name','a') | AlarmQuery('name','b'), is sent as AlarmNames too
+        if q.field == 'or' and all(x.field == 'name' for x in _alarm_query_or_terms(q)):
+            q_names=set(x.value for x in _alarm_query_or_terms(q))
+        elif q.field == 'name':
+            q_names=set([q.value])
+        else:
+            q_names=None
+        if q_names is not None:
+            my_names=q_names if my_names is None else my_names & q_names
+        elif q.field == 'name_prefix':
+            # the longest of several prefixes is the narrowest, if they agree at all
+            current=my_params.get('AlarmNamePrefix', "")
+            if q.value.startswith(current):
+                my_params['AlarmNamePrefix']=q.value
+            elif not current.startswith(q.value):
+                return None
+        elif q.field == 'action':
+            if my_params.get('ActionPrefix', q.value) != q.value:
+                return None
+            my_params['ActionPrefix']=q.value
+        elif q.field == 'state':
+            if my_params.get('StateValue', q.value) != q.value:
+                return None
+            my_params['StateValue']=q.value
+        elif q.field == 'type':
+            my_params['AlarmTypes']=[t for t in my_params['AlarmTypes'] if t == q.value]
+            if not my_params['AlarmTypes']:
+                return None
+    if my_names is not None:
+        # AlarmNames can't be combined with AlarmNamePrefix, so the prefix is left to the local check
+        if not my_names:
+            return None
+        my_params.pop('AlarmNamePrefix', None)
+        my_params['AlarmNames']=sorted(my_names)
+    return my_params
+
+def _alarm_query_or_terms(query):
+    """ Returns the terms of a (possibly nested) OR query """
+    if query.field != 'or':
+        return [query]
+    my_terms=[]
+    for q in query.value:
+        my_terms.extend(_alarm_query_or_terms(q))
+    return my_terms
+
+def _alarm_index_terms(my_alarm):
+    """ Yields (field, value) pairs to hash-index an alarm by """
+    yield ('name', my_alarm['AlarmName'])
+    yield ('type', "CompositeAlarm" if "AlarmRule" in my_alarm else "MetricAlarm")
+    if "StateValue" in my_alarm:
+        yield ('state', my_alarm['StateValue'])
+    for action_type in ['AlarmActions','OKActions','InsufficientDataActions']:
+        for action in my_alarm.get(action_type, []):
+            yield ('action', action)
+    my_metrics=[]
+    if "MetricName" in my_alarm:
+        my_metrics.append(my_alarm)
+    for m in my_alarm.get('Metrics', []):
+        if "MetricStat" in m:
+            my_metrics.append(m['MetricStat']['Metric'])
+    for m in my_metrics:
+        if "Namespace" in m:
+            yield ('namespace', m['Namespace'])
+        if "MetricName" in m:
+            yield ('metric_name', m['MetricName'])
+        for d in m.get('Dimensions', []):
+            yield ('dimension_name', d['Name'])
+            yield ('dimension_value', d['Value'])
+            yield ('dimension', (d['Name'], d['Value']))
+
+def _alarm_metrics_text(my_alarm):
+    """ Text of the parts of an alarm that describe what it watches, for search_by="metrics". For composite alarms this is the AlarmRule. """
+    if "AlarmRule" in my_alarm:
+        return str(my_alarm['AlarmRule'])
+    my_parts=[]
+    for key in ['Namespace','MetricName','Dimensions','Metrics']:
+        if key in my_alarm:
+            my_parts.append(str(my_alarm[key]))
+    return " ".join(my_parts)
+
+#---
+#--- Metric filter patterns, compiled to match log events locally rather than with TestMetricFilter (50 events per call)
+#---
+#--- tokens of JSON and space-delimited filter conditions: punctuation/operators, "strings", %regexes%, and bare words/selectors
+_FILTER_TOKENS=re.compile(r'\s*(?:(\(|\)|&&|\|\||!=|<=|>=|=|<|>)|("(?:[^"\\]|\\.)*")|(%(?:[^%\\]|\\.)*%)|([^\s()=!<>&|"%]+))')
+#--- fields of space-delimited log events: "quoted" and [bracketed] text is one field
+_LOG_EVENT_FIELDS=re.compile(r'"([^"]*)"|\[([^\]]*)\]|(\S+)')
+#--- term filter patterns: optional ? or - prefix, then a "quoted" term, %regex% or bare word
+_FILTER_TERMS=re.compile(r'\s*([?-]?)(?:"((?:[^"\\]|\\.)*)"|%((?:[^%\\]|\\.)*)%|(\S+))')
+_JSON_PATH_PARTS=re.compile(r'\.([^.\[\s]+)|\[(\d+)\]')
+
+class LogEvent:
+  """
+  A log event's message, with its JSON and space-delimited fields parsed once, on first use, and shared by every FilterPattern matched against it.
+  """
+  __slots__=['message','_json','_fields','_json_fields']
+
+  def __init__(self, message):
+    self.message=message
+    self._json=None
+    self._fields=None
+    self._json_fields=None
+
+  @property
+  def json(self):
+      """ The message parsed as a JSON object, or False if it isn't one """
+      if self._json is None:
+          self._json=False
+          if self.message.lstrip().startswith("{"):
+              try:
+                  self._json=json.loads(self.message)
+              except ValueError:
+                  pass
+      return self._json
+
+  @property
+  def json_fields(self):
+      """ The message's JSON fields, by selector (see _JsonFields), or None if it isn't a JSON object """
+      if self._json_fields is None and self.json is not False:
+          self._json_fields=_JsonFields(self.json)
+      return self._json_fields
+
+  @property
+  def fields(self):
+      """ The message's space-delimited fields """
+      if self._fields is None:
+          self._fields=[x.group(1) if x.group(1) is not None else x.group(2) if x.group(2) is not None else x.group(3) for x in _LOG_EVENT_FIELDS.finditer(self.message)]
+      return self._fields
+
+class FilterPattern:
+  """
+  A CloudWatch Logs filter pattern compiled into a matcher, for testing metric filters locally against any number of log events. Supports:
+    ""                                           every event
+    ERROR "Out of memory" -Retrying              terms (all required, - excluded), ?terms (any of), "quoted" terms and %regex% terms
+    { $.level = "ERROR" && $.latency > 100 }     JSON conditions: = != < > <= >=, * wildcards, %regex%, IS TRUE/FALSE/NULL, NOT EXISTS, && || ( )
+    [ip, user, ..., status = 5*, bytes > 1000]   space-delimited fields, named, with conditions on them, and ... for any number of fields
+  match() returns None if the event doesn't match, or the fields it matched with, which metric_transformation_values() turns into metric values.
+  Fields are only read with .get(selector), e.g. get('$.latency') or get('$bytes'): the type returned differs by pattern type.
+    my_pattern=FilterPattern('[ip, user, username, timestamp, request, status_code = 5*, bytes]')
+    my_fields=my_pattern.match('127.0.0.1 - frank [10/Oct/2000:13:25:15 -0700] "GET /index.html HTTP/1.0" 503 1534')
+    my_fields.get('$bytes')   # '1534'
+  """
+  def __init__(self, pattern):
+    self.pattern=pattern
+    my_pattern=(pattern or "").strip()
+    if my_pattern.startswith("{"):
+        if not my_pattern.endswith("}"):
+            raise Exception("Error filter pattern '%s' invalid: JSON pattern not closed with '}'." % pattern)
+        self.pattern_type="json"
+        self._condition=_FilterConditionParser(my_pattern[1:-1], pattern, json_selectors=True).parse()
+    elif my_pattern.startswith("["):
+        if not my_pattern.endswith("]"):
+            raise Exception("Error filter pattern '%s' invalid: space-delimited pattern not closed with ']'." % pattern)
+        self.pattern_type="space"
+        self._compile_space_delimited(my_pattern[1:-1])
+    elif my_pattern:
+        self.pattern_type="terms"
+        self._compile_terms(my_pattern)
+    else:
+        self.pattern_type="all"
+
+  def __repr__(self):
+      return "FilterPattern(%r)" % self.pattern
+
+  def match(self, event):
+      """ Returns the fields a log event (a message, or LogEvent) matched with, read with .get(selector), or None if it doesn't match """
+      if not isinstance(event, LogEvent):
+          event=LogEvent(event)
+      if self.pattern_type == "all":
+          return {}
+      if self.pattern_type == "terms":
+          return {} if self._match_terms(event.message) else None
+      if self.pattern_type == "json":
+          my_fields=event.json_fields
+          if my_fields is None:
+              return None
+          return my_fields if self._condition(my_fields) else None
+      return self._match_space_delimited(event.fields)
+
+  def _compile_terms(self, my_pattern):
+      self._required=[]
+      self._optional=[]
+      self._excluded=[]
+      position=0
+      while position < len(my_pattern):
+          x=_FILTER_TERMS.match(my_pattern, position)
+          if x is None or x.end() == position:
+              break
+          position=x.end()
+          if x.group(2) is not None:
+              term=x.group(2).replace('\\"', '"')
+          elif x.group(3) is not None:
+              term=re.compile(x.group(3))
+          else:
+              term=x.group(4)
+          {'': self._required, '?': self._optional, '-': self._excluded}[x.group(1)].append(term)
+
+  def _match_terms(self, message):
+      def found(term):
+          return term in message if isinstance(term, str) else term.search(message) is not None
+      if not all(found(t) for t in self._required) or any(found(t) for t in self._excluded):
+          return False
+      return not self._optional or any(found(t) for t in self._optional)
+
+  def _compile_space_delimited(self, my_pattern):
+      # split on the commas between fields, not those in "strings" or %regexes%
+      entries=[]
+      my_entry=""
+      for x in re.finditer(r'"(?:[^"\\]|\\.)*"|%(?:[^%\\]|\\.)*%|,|[^,"%]+|.', my_pattern):
+          if x.group(0) == ",":
+              entries.append(my_entry.strip())
+              my_entry=""
+          else:
+              my_entry+=x.group(0)
+      entries.append(my_entry.strip())
+      self._field_names=[]
+      conditions=[]
+      for e in entries:
+          if e == "...":
+              self._field_names.append(None)
+              continue
+          name=re.match(r"[^\s()=!<>&|\"%]+", e.lstrip("( "))
+          if name is None:
+              raise Exception("Error filter pattern '%s' invalid: field '%s' has no name." % (self.pattern, e))
+          self._field_names.append(name.group(0))
+          if e != name.group(0):
+              conditions.append(_FilterConditionParser(e, self.pattern, json_selectors=False).parse())
+      self._condition=_all_conditions(conditions) if conditions else None
+
+  def _match_space_delimited(self, fields):
+      for assignment in _assign_fields(self._field_names, fields):
+          if self._condition is None or self._condition(_SpaceDelimitedFields(assignment)):
+              return {'$' + k: v for k, v in assignment.items()}
+      return None
+
+def _assign_fields(field_names, fields, i=0, j=0, assignment=None):
+    """ Yields each way of assigning a log event's fields to a pattern's field names, where None (...) takes any number of fields """
+    if assignment is None:
+        assignment={}
+    if i == len(field_names):
+        if j == len(fields):
+            yield dict(assignment)
+        return
+    if field_names[i] is None:
+        if None not in field_names[i + 1:]:
+            # only one way to place the last ..., by the number of fields after it
+            rest=len(field_names) - i - 1
+            if len(fields) - j >= rest:
+                yield from _assign_fields(field_names, fields, i + 1, len(fields) - rest, assignment)
+            return
+        for k in range(j, len(fields) + 1):
+            yield from _assign_fields(field_names, fields, i + 1, k, assignment)
+        return
+    if j < len(fields):
+        assignment[field_names[i]]=fields[j]
+        yield from _assign_fields(field_names, fields, i + 1, j + 1, assignment)
+        del assignment[field_names[i]]
+
+class _JsonFields:
+  """ 
+  The fields a JSON pattern matched with, looked up by selector, e.g. get('$.requestParameters.bucketName').
+  Lookups and condition results are kept, so filters sharing selectors or conditions evaluate them once per event.
+  """
+  __slots__=['_json','_items','results']
+
+  def __init__(self, my_json):
+    self._json=my_json
+    self._items={}
+    self.results={}
+
+  def get(self, selector, default=None):
+      found, value=self.get_item(selector)
+      return value if found else default
+
+  def get_item(self, selector):
+      """ Returns (found, value) of a $.selector """
+      my_item=self._items.get(selector)
+      if my_item is not None:
+          return my_item
+      my_item=(True, self._json)
+      for name, index in _json_path(selector):
+          value=my_item[1]
+          if name is not None and isinstance(value, dict) and name in value:
+              my_item=(True, value[name])
+          elif index is not None and isinstance(value, list) and index < len(value):
+              my_item=(True, value[index])
+          else:
+              my_item=(False, None)
+              break
+      self._items[selector]=my_item
+      return my_item
+
+class _SpaceDelimitedFields:
+  """ The fields of a space-delimited event, by the field names of the pattern it is matched against """
+  __slots__=['_assignment','results']
+
+  def __init__(self, assignment):
+    self._assignment=assignment
+    self.results={}
+
+  def get_item(self, name):
+      return (name in self._assignment, self._assignment.get(name))
+
+def _all_conditions(conditions):
+    def all_true(fields):
+        for c in conditions:
+            if not c(fields):
+                return False
+        return True
+    return all_true
+
+def _any_conditions(conditions):
+    def any_true(fields):
+        for c in conditions:
+            if c(fields):
+                return True
+        return False
+    return any_true
+
+_JSON_PATHS={}
+
+def _json_path(selector):
+    """ 
+    Returns the (name, index) parts of a $.a.b[0] selector. 
+    Raises ValueError for selectors with parts that aren't supported (e.g. [*]), rather than matching a different path.
+    """
+    my_path=_JSON_PATHS.get(selector)
+    if my_path is None:
+        my_path=[]
+        position=1
+        while position < len(selector):
+            x=_JSON_PATH_PARTS.match(selector, position)
+            if x is None or not selector.startswith("$"):
+                raise ValueError("selector '%s' unsupported at '%s'" % (selector, selector[position:]))
+            my_path.append((x.group(1), None) if x.group(1) is not None else (None, int(x.group(2))))
+            position=x.end()
+        _JSON_PATHS[selector]=my_path
+    return my_path
+
+class _FilterConditionParser:
+  """ 
+  Parses JSON ($.selector) or space-delimited (field name) filter conditions into a function of the event's fields (_JsonFields or _SpaceDelimitedFields).
+  Each comparison's result is kept in fields.results under the comparison's text, so it is evaluated once per event however many patterns have it.
+  """
+  def __init__(self, text, pattern, json_selectors):
+    self._pattern=pattern
+    self._json_selectors=json_selectors
+    self._tokens=[]
+    position=0
+    text=text.strip()
+    while position < len(text):
+        x=_FILTER_TOKENS.match(text, position)
+        if x is None or x.end() == position:
+            raise Exception("Error filter pattern '%s' invalid at '%s'." % (pattern, text[position:]))
+        position=x.end()
+        self._tokens.append(x.group(0).strip())
+    self._position=0
+
+  def parse(self):
+      my_condition=self._or()
+      if self._position < len(self._tokens):
+          self._error()
+      return my_condition
+
+  def _error(self):
+      near=" ".join(self._tokens[self._position:self._position + 3]) or "end of pattern"
+      raise Exception("Error filter pattern '%s' invalid near '%s'." % (self._pattern, near))
+
+  def _peek(self):
+      return self._tokens[self._position] if self._position < len(self._tokens) else None
+
+  def _next(self):
+      if self._position >= len(self._tokens):
+          self._error()
+      self._position+=1
+      return self._tokens[self._position - 1]
+
+  def _or(self):
+      conditions=[self._and()]
+      while self._peek() == "||":
+          self._next()
+          conditions.append(self._and())
+      return conditions[0] if len(conditions) == 1 else _any_conditions(conditions)
+
+  def _and(self):
+      conditions=[self._primary()]
+      while self._peek() == "&&":
+          self._next()
+          conditions.append(self._primary())
+      return conditions[0] if len(conditions) == 1 else _all_conditions(conditions)
+
+  def _primary(self):
+      if self._peek() == "(":
+          self._next()
+          my_condition=self._or()
+          if self._next() != ")":
+              self._error()
+          return my_condition
+      selector=self._next()
+      if self._json_selectors:
+          if not selector.startswith("$"):
+              self._error()
+          try:
+              _json_path(selector)
+          except ValueError as e:
+              raise Exception("Error filter pattern '%s' invalid: %s." % (self._pattern, e))
+      operator=self._next()
+      if operator.upper() == "IS":
+          keyword=self._next().upper()
+          expected={'TRUE': True, 'FALSE': False, 'NULL': None}
+          if keyword not in expected:
+              self._error()
+          def is_keyword(fields):
+              found, value=fields.get_item(selector)
+              return found and value is expected[keyword]
+          return is_keyword
+      if operator.upper() == "NOT":
+          if self._next().upper() != "EXISTS":
+              self._error()
+          return lambda fields: not fields.get_item(selector)[0]
+      if operator.upper() == "EXISTS":
+          return lambda fields: fields.get_item(selector)[0]
+      if operator not in ['=','!=','<','>','<=','>=']:
+          self._error()
+      operand=self._next()
+      my_test=_filter_comparison(operator, operand, self._pattern)
+      key=(selector, operator, operand)
+      def compare(fields):
+          result=fields.results.get(key)
+          if result is None:
+              found, value=fields.get_item(selector)
+              result=fields.results[key]=found and my_test(value)
+          return result
+      return compare
+
+def _filter_value_number(value):
+    """ Returns a field's value as a number, or None """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _filter_comparison(operator, operand, pattern):
+    """ Returns a test of a field's value against a filter condition's operand """
+    if operand.startswith("%") and len(operand) > 1 and operand.endswith("%"):
+        my_regex=re.compile(operand[1:-1])
+        my_test=lambda value: isinstance(value, str) and my_regex.search(value) is not None
+    else:
+        quoted=operand.startswith('"')
+        if quoted:
+            operand=operand[1:-1].replace('\\"', '"')
+        number=None if quoted else _filter_value_number(operand)
+        if operator in ['<','>','<=','>=']:
+            if number is None:
+                raise Exception("Error filter pattern '%s' invalid: '%s' compared with '%s', which is not a number." % (pattern, operator, operand))
+            my_operator=_FILTER_OPERATORS[operator]
+            def compare(value):
+                n=_filter_value_number(value)
+                return n is not None and my_operator(n, number)
+            return compare
+        if number is not None:
+            my_test=lambda value: _filter_value_number(value) == number
+        elif "*" in operand:
+            my_wildcard=re.compile("^" + ".*".join(re.escape(p) for p in operand.split("*")) + "$", re.DOTALL)
+            my_test=lambda value: isinstance(value, str) and my_wildcard.match(value) is not None
+        else:
+            my_test=lambda value: isinstance(value, str) and value == operand
+    if operator == "!=":
+        return lambda value: not my_test(value)
+    return my_test
+
+#--- numeric comparisons of a field's value (left) to a filter condition's operand (right)
+_FILTER_OPERATORS={'<': lambda a, b: a < b, '>': lambda a, b: a > b, '<=': lambda a, b: a <= b, '>=': lambda a, b: a >= b}
+
+def metric_transformation_values(metric_transformations, fields):
+    """
+    Returns the metric values a metric filter's metricTransformations publish for an event that matched with fields (FilterPattern.match):
+      [{'metricNamespace','metricName','value','dimensions': {name: value},'unit'}]
+    metricValue and dimension values may be a literal ("1") or a field ($.latency, $bytes).
+    Transformations whose value isn't a number, or with a dimension field missing, publish nothing for the event, as in CloudWatch.
+    """
+    my_values=[]
+    for t in metric_transformations:
+        value=t.get('metricValue', "1")
+        value=_filter_value_number(fields.get(value) if value.startswith("$") else value)
+        if value is None:
+            continue
+        dimensions={}
+        for name, d in (t.get('dimensions', {}) or {}).items():
+            dimensions[name]=fields.get(d) if d.startswith("$") else d
+        if any(d is None for d in dimensions.values()):
+            continue
+        my_values.append({'metricNamespace': t['metricNamespace'], 'metricName': t['metricName'], 'value': float(value),
+                          'dimensions': {k: str(v) for k, v in dimensions.items()}, 'unit': t.get('unit')})
+    return my_values
+
+class MetricFilterMatcher:
+  """
+  Runs many metric filters (e.g. get_all_metric_filters() output) over log events in one pass, each pattern compiled once (see FilterPattern),
+  and each event's JSON or space-delimited fields parsed once however many filters look at them.
+    my_matcher=MetricFilterMatcher(session.get_all_metric_filters(), log_group_name='/aws/lambda/my-function')
+    my_report=my_matcher.scan_files(['sample-1.log', 'sample-2.log.gz'])
+  Filters are identified by "<logGroupName>:<filterName>". A pattern that doesn't compile raises an exception naming the filter.
+  """
+  def __init__(self, metric_filters, log_group_name=None):
+    self._filters=[]
+    patterns={}
+    for mf in metric_filters:
+        if log_group_name is not None and mf.get('logGroupName') != log_group_name:
+            continue
+        key="%s:%s" % (mf.get('logGroupName'), mf['filterName'])
+        if mf['filterPattern'] not in patterns:
+            try:
+                patterns[mf['filterPattern']]=FilterPattern(mf['filterPattern'])
+            except Exception as e:
+                raise Exception("Metric filter '%s': %s" % (key, e))
+        my_transformations=list(mf.get('metricTransformations', []))
+        for t in my_transformations:
+            for selector in [t.get('metricValue', "")] + list((t.get('dimensions', {}) or {}).values()):
+                if selector.startswith("$."):
+                    try:
+                        _json_path(selector)
+                    except ValueError as e:
+                        raise Exception("Metric filter '%s': metricTransformations %s." % (key, e))
+        self._filters.append((key, patterns[mf['filterPattern']], my_transformations))
+    self._patterns=list(patterns.values())
+
+  def __len__(self):
+      return len(self._filters)
+
+  def evaluate(self, event):
+      """ Returns [(filter key, [metric values])] for the filters a log event (a message, or {'message'} event) matches """
+      if isinstance(event, Mapping):
+          event=event['message']
+      my_event=LogEvent(event)
+      # each distinct pattern is matched once, however many filters share it
+      matches={}
+      for p in self._patterns:
+          matches[id(p)]=p.match(my_event)
+      return [(key, metric_transformation_values(transformations, matches[id(p)])) for key, p, transformations in self._filters if matches[id(p)] is not None]
+
+  def scan(self, events):
+      """
+      Runs every filter over an iterable of log events (messages, or {'message'} events), returning:
+        {'Events': n, 'Filters': {filter key: {'Matches': n, 'Metrics': [{'metricNamespace','metricName','dimensions','unit','SampleCount','Sum','Minimum','Maximum'}]}}}
+      """
+      my_report={'Events': 0, 'Filters': {key: {'Matches': 0, 'Metrics': {}} for key, p, t in self._filters}}
+      for event in events:
+          my_report['Events']+=1
+          for key, values in self.evaluate(event):
+              my_filter=my_report['Filters'][key]
+              my_filter['Matches']+=1
+              for v in values:
+                  metric_key=(v['metricNamespace'], v['metricName'], tuple(sorted(v['dimensions'].items())))
+                  my_stats=my_filter['Metrics'].get(metric_key)
+                  if my_stats is None:
+                      my_stats=my_filter['Metrics'][metric_key]={'metricNamespace': v['metricNamespace'], 'metricName': v['metricName'], 'dimensions': v['dimensions'],
+                                                                 'unit': v['unit'], 'SampleCount': 0, 'Sum': 0.0, 'Minimum': v['value'], 'Maximum': v['value']}
+                  my_stats['SampleCount']+=1
+                  my_stats['Sum']+=v['value']
+                  my_stats['Minimum']=min(my_stats['Minimum'], v['value'])
+                  my_stats['Maximum']=max(my_stats['Maximum'], v['value'])
+      for my_filter in my_report['Filters'].values():
+          my_filter['Metrics']=list(my_filter['Metrics'].values())
+      return my_report
+
+  def scan_files(self, filepaths):
+      """ Streams log files (one event per line, .gz files decompressed) through every filter, in one pass. See scan() """
+      def lines():
+          for filepath in filepaths:
+              opener=gzip.open if filepath.endswith(".gz") else open
+              with opener(filepath, "rt", encoding="utf-8", errors="replace") as f:
+                  for line in f:
+                      yield line.rstrip("\r\n")
+      return self.scan(lines())
+
+#---
+#--- Helper Functions (Printers, Backupers, Loaders, Filterers)
+#---
+def _chunk_list(my_list, size):
+    """ Splits a list into a list of lists, each no longer than size """
+    return [my_list[i:i+size] for i in range(0, len(my_list), size)]
+
+#--- matches ALARM(name), OK("name") and INSUFFICIENT_DATA(arn) references in a composite AlarmRule
+_ALARM_RULE_REFERENCE=re.compile(r'\b(ALARM|OK|INSUFFICIENT_DATA)(\s*\(\s*)("(?:[^"\\]|\\.)*"|[^\s()"]+)(\s*\))')
+
+def _alarm_rule_reference_name(reference):
+    """ Returns the alarm name from an AlarmRule reference, which may be quoted, and may be an alarm ARN """
+    if reference.startswith('"'):
+        reference=re.sub(r'\\(.)', r'\1', reference[1:-1])
+    if reference.startswith("arn:") and ":alarm:" in reference:
+        reference=reference.split(":alarm:", 1)[1]
+    return reference
+
+def alarm_rule_references(alarm_rule):
+    """ Returns the names of the alarms referenced by a composite alarm's AlarmRule, in order of appearance """
+    return list(dict.fromkeys([_alarm_rule_reference_name(m.group(3)) for m in _ALARM_RULE_REFERENCE.finditer(alarm_rule)]))
+
+def rename_alarm_rule_references(alarm_rule, alarm_renames):
+    """ Returns the AlarmRule with references to renamed alarms ({old_alarm_name: new_alarm_name}) updated to the new names """
+    def rename_reference(match):
+        reference=match.group(3)
+        old_name=_alarm_rule_reference_name(reference)
+        if old_name not in alarm_renames:
+            return match.group(0)
+        unquoted=reference[1:-1] if reference.startswith('"') else reference
+        if unquoted.startswith("arn:") and ":alarm:" in unquoted:
+            new_reference=unquoted.split(":alarm:", 1)[0] + ":alarm:" + alarm_renames[old_name]
+        else:
+            new_reference=alarm_renames[old_name]
+        # always quote the new reference, since new names may contain characters that need it
+        new_reference='"' + new_reference.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        return match.group(1) + match.group(2) + new_reference + match.group(4)
+    return _ALARM_RULE_REFERENCE.sub(rename_reference, alarm_rule)
+
+def _alarm_dependency_waves(my_alarms):
+    """ 
+    Groups alarms into waves that can each be created concurrently: metric alarms first, then composite alarms
+    once every alarm (in my_alarms) that they reference is in an earlier wave. Raises an exception on a reference cycle.
+    """
+    return AlarmGraph(my_alarms).waves()
+
+class AlarmGraph:
+  """ 
+  Dependency graph of alarms, built once in O(alarms + references) by parsing each composite alarm's AlarmRule.
+  An edge runs from each composite alarm to each alarm its AlarmRule references; references to alarms not in the graph are dangling.
+    my_graph=AlarmGraph(session.get_all_alarms())     # or session.get_alarm_graph()
+    my_graph.dependents('cpu-high', recursive=True)   # composite alarms affected if cpu-high changes or is deleted
+    my_graph.topological_order()                      # referenced alarms before the composite alarms that reference them
+    my_graph.cycles(), my_graph.dangling_references()
+  """
+  def __init__(self, alarms):
+    if isinstance(alarms, dict):
+        alarms=list(alarms.get('MetricAlarms',[])) + list(alarms.get('CompositeAlarms',[]))
+    self._alarms={a['AlarmName']: a for a in alarms}
+    self._dependencies={}
+    self._dependents={}
+    for name, a in self._alarms.items():
+        my_references=alarm_rule_references(a['AlarmRule']) if "AlarmRule" in a else []
+        self._dependencies[name]=my_references
+        for r in my_references:
+            self._dependents.setdefault(r, []).append(name)
+  
+  def __len__(self):
+      return len(self._alarms)
+  
+  def __contains__(self, alarm_name):
+      return alarm_name in self._alarms
+  
+  def get(self, alarm_name):
+      """ Returns the alarm of the given name, or None """
+      return self._alarms.get(alarm_name)
+  
+  def dependencies(self, alarm_name, recursive=False):
+      """ Returns the names of the alarms alarm_name's AlarmRule references (and, if recursive, the alarms those reference, and so on) """
+      return self._walk(alarm_name, self._dependencies, recursive)
+  
+  def dependents(self, alarm_name, recursive=False):
+      """ Returns the names of the composite alarms that reference alarm_name (and, if recursive, the composite alarms that reference those, and so on) """
+      return self._walk(alarm_name, self._dependents, recursive)
+  
+  def dangling_references(self):
+      """ Returns {composite alarm name: [referenced alarm names that are not in the graph]} """
+      dangling={}
+      for name, my_references in self._dependencies.items():
+          missing=[r for r in my_references if r not in self._alarms]
+          if missing:
+              dangling[name]=missing
+      return dangling
+  
+  def cycles(self):
+      """ Returns the groups of alarms that reference each other in a cycle (strongly connected components, by Tarjan's algorithm) """
+      index={}
+      low={}
+      stack=[]
+      on_stack=set()
+      cycles=[]
+      counter=0
+      for root in self._alarms:
+          if root in index:
+              continue
+          # iterative depth first search, so deep chains of composite alarms can't exceed the recursion limit
+          work=[(root, 0)]
+          while work:
+              name, i=work.pop()
+              if i == 0:
+                  index[name]=low[name]=counter
+                  counter+=1
+                  stack.append(name)
+                  on_stack.add(name)
+              my_references=self._dependencies[name]
+              if i < len(my_references):
+                  work.append((name, i + 1))
+                  r=my_references[i]
+                  # dangling references are never indexed, and are skipped
+                  if r not in index:
+                      if r in self._alarms:
+                          work.append((r, 0))
+                  elif r in on_stack:
+                      low[name]=min(low[name], index[r])
+                  continue
+              if work:
+                  parent=work[-1][0]
+                  low[parent]=min(low[parent], low[name])
+              if low[name] == index[name]:
+                  component=[]
+                  while True:
+                      member=stack.pop()
+                      on_stack.discard(member)
+                      component.append(member)
+                      if member == name:
+                          break
+                  if len(component) > 1 or name in self._dependencies[name]:
+                      cycles.append(component[::-1])
+      return cycles
+  
+  def topological_order(self, reverse=False):
+      """ 
+      Returns every alarm name, with referenced alarms before the composite alarms that reference them (Kahn's algorithm) - the order to create them in.
+      reverse=True gives the order to delete them in. Raises an exception if there is a reference cycle.
+      """
+      return [a['AlarmName'] for wave in (reversed(self.waves()) if reverse else self.waves()) for a in wave]
+  
+  def waves(self):
+      """ 
+      Groups the alarms into waves that can each be written concurrently: each alarm is in the wave after the last of the alarms it references.
+      Raises an exception if there is a reference cycle.
+      """
+      remaining={name: len([r for r in self._dependencies[name] if r in self._alarms]) for name in self._alarms}
+      wave=[name for name, count in remaining.items() if count == 0]
+      waves=[]
+      placed=0
+      while wave:
+          waves.append([self._alarms[name] for name in wave])
+          placed+=len(wave)
+          next_wave=[]
+          for name in wave:
+              for d in self._dependents.get(name, []):
+                  if d in remaining:
+                      remaining[d]-=1
+                      if remaining[d] == 0:
+                          next_wave.append(d)
+          wave=list(dict.fromkeys(next_wave))
+      if placed < len(self._alarms):
+          raise Exception("Composite alarm reference cycle found: '%s'." % "', '".join(self.cycles()[0]))
+      return waves
+  
+  def check(self):
+      """ Returns the problems that would make writing these alarms fail: {'Cycles': [[alarm names]], 'DanglingReferences': {alarm name: [alarm names]}} """
+      return {'Cycles': self.cycles(), 'DanglingReferences': self.dangling_references()}
+  
+  def _walk(self, alarm_name, edges, recursive):
+      found=list(edges.get(alarm_name, []))
+      if not recursive:
+          return list(dict.fromkeys(found))
+      seen=set(found)
+      i=0
+      while i < len(found):
+          for n in edges.get(found[i], []):
+              if n not in seen:
+                  seen.add(n)
+                  found.append(n)
+          i+=1
+      return found
+
+def find_duplicate_alarms(alarms):
+    """ 
+    Finds alarms that evaluate the same thing under different names, in one pass over the alarms, by hashing alarm_evaluation_definition():
+      alarms: output of get_all_alarms(), or a list of alarms
+    Returns:
+      {'Duplicates': [{'DefinitionHash','Keep','Delete','ActionsDiffer','MergedActions'}],   # same definition and threshold
+       'ThresholdVariants': [{'DefinitionHash','Alarms': [{'AlarmName','Threshold'}]}],       # same definition, different thresholds
+       'Delete': [alarm names]}                                                               # Delete of the groups whose actions don't differ
+    The alarm kept of each duplicate group is the one most referenced by composite alarms (when alarms includes them), 
+    then with actions enabled, then with the most actions. Where actions differ (ActionsDiffer), MergedActions is the union of the group's actions,
+    which must be put on the kept alarm before deleting the rest, so those groups are left out of the top level Delete:
+      my_report=find_duplicate_alarms(session.get_all_alarms())
+      session.delete_alarms(my_report['Delete'], confirm=True)
+      for group in my_report['Duplicates']:
+          if group['ActionsDiffer']:
+              session.put_metric_alarm(dict(session.get_alarm(group['Keep']), **group['MergedActions']), overwrite=True)   # put_composite_alarm for composites
+              session.delete_alarms(group['Delete'], confirm=True)
+    Threshold variants are reported only, never deleted.
+    """
+    if isinstance(alarms, Mapping):
+        alarms=list(alarms.get('MetricAlarms',[])) + list(alarms.get('CompositeAlarms',[]))
+    my_graph=AlarmGraph(alarms)
+    exact_groups={}
+    variant_groups={}
+    for a in alarms:
+        my_definition=alarm_evaluation_definition(a, include_threshold=False)
+        variant_hash=definition_hash(my_definition)
+        exact_groups.setdefault((variant_hash, float(a['Threshold']) if "Threshold" in a else None), []).append(a)
+        variant_groups.setdefault(variant_hash, {}).setdefault(float(a['Threshold']) if "Threshold" in a else None, []).append(a['AlarmName'])
+    action_types=['AlarmActions','OKActions','InsufficientDataActions']
+    my_report={'Duplicates': [], 'ThresholdVariants': [], 'Delete': []}
+    for (variant_hash, threshold), group in exact_groups.items():
+        if len(group) < 2:
+            continue
+        group=sorted(group, key=lambda a: (-len(my_graph.dependents(a['AlarmName'])), not a.get('ActionsEnabled', True), 
+                                           -sum(len(a.get(t, [])) for t in action_types), a['AlarmName']))
+        merged_actions={t: sorted(set(x for a in group for x in a.get(t, []))) for t in action_types}
+        my_duplicates={'DefinitionHash': variant_hash if threshold is None else definition_hash([variant_hash, threshold]), 'Keep': group[0]['AlarmName'], 
+                       'Delete': [a['AlarmName'] for a in group[1:]], 'MergedActions': merged_actions,
+                       'ActionsDiffer': any(sorted(a.get(t, [])) != merged_actions[t] for a in group for t in action_types)}
+        my_report['Duplicates'].append(my_duplicates)
+        if not my_duplicates['ActionsDiffer']:
+            my_report['Delete']+=my_duplicates['Delete']
+    for variant_hash, thresholds in variant_groups.items():
+        if len(thresholds) > 1:
+            my_report['ThresholdVariants'].append({'DefinitionHash': variant_hash, 
+                                                   'Alarms': [{'AlarmName': n, 'Threshold': t} for t in sorted(thresholds) for n in sorted(thresholds[t])]})
+    return my_report
+
+def _write_rename_journal(my_journal, journal_path):
+    """ Writes a rename_alarms journal, replacing the previous copy atomically. Does nothing if journal_path is None. """
+    if journal_path is None:
+        return
+    _write_file_atomically(journal_path, json.dumps(my_journal, default=str))
+
+def _load_rename_journal(journal_path):
+    """ Loads a rename_alarms journal """
+    if not os.path.exists(journal_path):
+        raise FileNotFoundError("Journal file '%s' does not exist." % journal_path)
+    f=open(journal_path,"r")
+    try:
+        my_journal=json.load(f)
+    finally:
+        f.close()
+    return my_journal
+
+def _iter_pages(pages, result_keys, fields=None, prefetch=False):
+    """ 
+    Yields (result_key, object) for the objects under each of result_keys in each page, 
+    keeping only the keys in fields (if specified), and prefetching pages on a background thread if prefetch=True.
+    """
+    if prefetch:
+        pages=_prefetch(pages)
+    for page in pages:
+        for result_key in result_keys:
+            for my_object in page.get(result_key, []):
+                if fields is not None:
+                    my_object={k: my_object[k] for k in fields if k in my_object}
+                yield (result_key, my_object)
+
+def _prefetch(iterable):
+    """ 
+    Yields the items of iterable, fetching the next item on a background thread while the caller works on the current one.
+    Errors are raised to the caller. If the caller stops early, the background thread stops too.
+    """
+    my_queue=queue.Queue(maxsize=1)
+    stopped=threading.Event()
+    def put(item):
+        while not stopped.is_set():
+            try:
+                my_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    def fetch():
+        try:
+            for item in iterable:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except Exception as error:
+            put(("error", error))
+    thread=threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item=my_queue.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+def replace_object_string(my_object, search_string, replace_string, make_alarm_update=False):
+    """
+    This method will accept any object, perform a replace of "search_string" with "replace_string", and return object
+    """
+    replaced_alarm=json.loads(json.dumps(my_object,default=_json_default).replace(search_string,replace_string))
+    return replaced_alarm
+ 
+def filter_metric_alarms(alarms, search_string, match_invert="match", search_by="all", return_type="full_alarm"):
+    """ 
+    This method is used to perform filters on a list of alarms and return the result(s) of the filterering.
+    Filtering options: search_by=['all','name','metrics'], match_invert=['match','invert'], return_type=['name','full_alarm']
+    alarms may also be an AlarmIndex, which avoids re-indexing when filtering the same alarms repeatedly.
+    """
+    return _filter_alarms(alarms, 'MetricAlarm', search_string, match_invert, search_by, return_type)
 
 def filter_composite_alarms(alarms, search_string, match_invert="match", search_by="all", return_type="full_alarm"):
     """ 
     This method is used to perform filters on a list of alarms and return the result(s) of the filterering.
     Filtering options: search_by=['all','name','metrics'], match_invert=['match','invert'], return_type=['name','full_alarm']
+    For composite alarms, search_by="metrics" searches the AlarmRule.
+    alarms may also be an AlarmIndex, which avoids re-indexing when filtering the same alarms repeatedly.
+    """
+    return _filter_alarms(alarms, 'CompositeAlarm', search_string, match_invert, search_by, return_type)
+
+def _filter_alarms(alarms, alarm_type, search_string, match_invert, search_by, return_type):
+    """ 
+    Shared implementation of filter_metric_alarms/filter_composite_alarms.
+    An AlarmIndex is queried, reusing its search indexes; alarms passed as a list or dict are scanned once, since an index built per call would not be reused.
     """
-    try:
-        if "CompositeAlarms" in alarms.keys():
-            my_alarms=alarms['CompositeAlarms']
-    except AttributeError:
-        my_alarms=alarms
-        pass
     valid_return_types=['name','full_alarm']
     if return_type not in valid_return_types:
         raise Exception("Error return_type '%s' invalid. Valid options: '%s'" % (return_type,str(valid_return_types)))  
@@ -851,14 +4760,21 @@ def filter_composite_alarms(alarms, search_string, match_invert="match", search_
     valid_match_invert=['match','invert']
     if match_invert not in valid_match_invert:
         raise Exception("Error match_invert '%s' invalid. Valid options: '%s'" % (match_invert,str(valid_match_invert)))  
-    if match_invert == "match":
-        search_results=([x for x in my_alarms if search_string in str(x)])
-    elif match_invert == "invert":
-        search_results=([x for x in my_alarms if search_string not in str(x)])
-    if return_type == "full_alarm":
-       return search_results
+    if isinstance(alarms, AlarmIndex):
+        search_fields={'all': 'text_contains', 'name': 'name_contains', 'metrics': 'metrics_contains'}
+        search_query=AlarmQuery(search_fields[search_by], search_string)
+        if match_invert == "invert":
+            search_query=~search_query
+        return alarms.query(AlarmQuery('type', alarm_type) & search_query, return_type=return_type)
+    # a plain list is filtered as given, whatever the alarm type
+    if isinstance(alarms, dict):
+        alarms=alarms.get(alarm_type + 's', [])
+    search_texts={'all': str, 'name': lambda a: a['AlarmName'], 'metrics': _alarm_metrics_text}
+    my_text=search_texts[search_by]
+    search_results=[a for a in alarms if (search_string in my_text(a)) == (match_invert == "match")]
     if return_type == "name":
-       return [x['AlarmName'] for x in search_results]
+        return [a['AlarmName'] for a in search_results]
+    return search_results
 
 def sort_alarms(my_alarms):
     """ Takes a Dict of MetricAlarms and returns them sorted by AlarmName """
@@ -906,17 +4822,15 @@ def print_metric_alarms(alarms, field="all"):
       print("  - StateValue    : " + str(a['StateValue']))
       print("  - ActionsEnabled: " + str(a['ActionsEnabled']))
       print("  Conditions:")
-      if "DatapointsToAlarm" not in a:
-          a['DatapointsToAlarm'] = a['EvaluationPeriods']
-      if "TreatMissingData" not in a:
-          a['TreatMissingData'] = "missing"
+      # defaults are shown for missing values, without changing the alarm passed in
+      datapoints_to_alarm=a.get('DatapointsToAlarm', a['EvaluationPeriods'])
       if "ThresholdMetricId" in a: #anomaly detection
           print("  - Threshold:  " + a['ComparisonOperator'])
-          print("  - Datapoints: " + str(a['DatapointsToAlarm']) + "/" + str(a['EvaluationPeriods']) + " datapoints")
+          print("  - Datapoints: " + str(datapoints_to_alarm) + "/" + str(a['EvaluationPeriods']) + " datapoints")
       else:
           print("  - Threshold:        " + a['ComparisonOperator'] + " " + str(a['Threshold']))
-          print("  - Datapoints:       " + str(a['DatapointsToAlarm']) + "/" + str(a['EvaluationPeriods']) + " datapoints")
-      print("  - TreatMissingData: " + a['TreatMissingData'])
+          print("  - Datapoints:       " + str(datapoints_to_alarm) + "/" + str(a['EvaluationPeriods']) + " datapoints")
+      print("  - TreatMissingData: " + a.get('TreatMissingData', "missing"))
       print("  Metrics:")
       if "MetricName" in a: #single metric alarms
         print("  - Namespace : " + a['Namespace'])
@@ -929,45 +4843,52 @@ def print_metric_alarms(alarms, field="all"):
             print(str(m['Expression']))
           else:
             print(str(m['MetricStat']))
-      a['AlarmActions'].sort()
-      a['OKActions'].sort()
-      a['InsufficientDataActions'].sort()
       print("  Actions:")
-      print("  - AlarmActions  : " + str(a['AlarmActions']))
-      print("  - OKActions     : " + str(a['OKActions']))
-      print("  - NoDataActions : " + str(a['InsufficientDataActions']))
+      print("  - AlarmActions  : " + str(sorted(a['AlarmActions'])))
+      print("  - OKActions     : " + str(sorted(a['OKActions'])))
+      print("  - NoDataActions : " + str(sorted(a['InsufficientDataActions'])))
       print()
 
 def print_alarms_for_csv(my_alarms):
     """ Method to print alarms for loading into Excel via csv, with summary of name and AlarmActions."""
     for a in my_alarms:
         print(a['AlarmName'],end=";")
-        a['AlarmActions'].sort()
         actions=[];
-        for act in a['AlarmActions']:
+        for act in sorted(a['AlarmActions']):
             actions.append(act.split(":")[-1])
         print(str(actions))
 		
-def backup_alarms(my_alarms, filepath, overwrite=False):
+def backup_alarms(my_alarms, filepath, overwrite=False, stream=False, compression=None):
     """ 
     Backs up all avaialble alarms configurations to a file.
+    Specify stream=True to write a streaming backup (see BackupWriter), one alarm per line, rather than one large JSON string.
+    compression='gzip' or 'zstd' compresses it, and implies stream=True.
     """
     if os.path.exists(filepath) and overwrite == False:
         raise Exception("The filepath specified '%s' already exists, and overwrite=False. Specify overwrite=True, or a different path, to create the backup." % filepath)
-    my_alarms_str=json.dumps(my_alarms,default=str)
+    if stream or compression:
+        if isinstance(my_alarms, dict):
+            my_alarms=list(my_alarms.get('MetricAlarms',[])) + list(my_alarms.get('CompositeAlarms',[]))
+        with BackupWriter(filepath, "alarms", compression=compression) as writer:
+            for a in my_alarms:
+                writer.write(a, "CompositeAlarm" if "AlarmRule" in a else "MetricAlarm")
+        return
+    my_alarms_str=json.dumps(my_alarms,default=_json_default)
     f=open(filepath,"w")
     f.write(my_alarms_str)
     f.close()
 	
-def load_alarms(filepath):
-    """ This command will load alarms from a file, into a variable """
-    if not os.path.exists(filepath):
-        raise FileNotFoundError("File specified does not exist.")
-    f=open(filepath,"r")
-    try:
-        my_alarms=json.load(f)
-    except Exception:
-        raise Exception("There was an error loading JSON valus from file. Verify validity of alarms file.")
+def load_alarms(filepath, names=None):
+    """ 
+    This command will load alarms from a file, into a variable. Streaming backups are detected, and loaded in the same {'MetricAlarms','CompositeAlarms'} form 
+    Specify names to load only those alarms; for indexed backups (see BackupWriter) they are read without parsing the rest of the file.
+    With names, a single alarm backup (backup_alarm) is also returned as {'MetricAlarms','CompositeAlarms'}, empty if the alarm was not named.
+    """
+    streamed=os.path.exists(filepath) and is_streamed_backup(filepath)
+    my_alarms=_load_backup(filepath, "alarms", names)
+    # single document backups are returned in the form they were saved in
+    if streamed:
+        my_alarms={'MetricAlarms': [a for a in my_alarms if "AlarmRule" not in a], 'CompositeAlarms': [a for a in my_alarms if "AlarmRule" in a]}
     return my_alarms
 	
 def filter_sns(sns_list, search_string, match_invert="match"):
@@ -975,34 +4896,35 @@ def filter_sns(sns_list, search_string, match_invert="match"):
     valid_match_invert=['match','invert']
     if match_invert not in valid_match_invert:
         raise Exception("Error match_invert '%s' invalid. Valid options: '%s'" % (match_invert,str(valid_match_invert))) 
+    matched=_SubstringIndex([str(x) for x in sns_list]).search(search_string)
     if match_invert == "match":
-        search_results=([x for x in sns_list if search_string in str(x)])
+        search_results=[x for i, x in enumerate(sns_list) if i in matched]
     elif match_invert == "invert":
-        search_results=([x for x in sns_list if search_string not in str(x)])
+        search_results=[x for i, x in enumerate(sns_list) if i not in matched]
     return search_results
 	
 def print_sns(my_sns):
     """
     Prints pretty output of an sns topic and it's subscriptions. 
+    my_sns: output of Session.get_all_sns_with_subscriptions(), or a list of its topics
     """
+    if isinstance(my_sns, dict):
+        my_sns=list(my_sns['Topics'].values())
     for s in my_sns:
-        my_subs=self.get_sns_subscriptions(s['TopicArn'].split(":")[-1])
+        if "Subscriptions" not in s:
+            raise Exception("Topic '%s' has no subscriptions listed. Use the topics returned by Session.get_all_sns_with_subscriptions()." % s['TopicArn'])
         endpoints=[]
-        for sub in my_subs['Subscriptions']:
+        for sub in s['Subscriptions']:
             endpoints.append(sub['Endpoint'])
         endpoints.sort()
         print(s['TopicArn'].split(":")[-1] +","+ str(endpoints))
 		
-def load_dashboards(filepath):
-    """ This command will load dashboards from a file, into a variable """
-    if not os.path.exists(filepath):
-        raise FileNotFoundError("File specified does not exist.")
-    f=open(filepath,"r")
-    try:
-        my_dashboards=json.load(f)
-    except Exception:
-        raise Exception("There was an error loading JSON valus from file. Verify validity of alarms file.")
-    return my_dashboards
+def load_dashboards(filepath, names=None):
+    """ 
+    This command will load dashboards from a file, into a variable. Streaming backups are detected and loaded too 
+    Specify names to load only those dashboards; for indexed backups (see BackupWriter) they are read without parsing the rest of the file.
+    """
+    return _load_backup(filepath, "dashboards", names)
 	  
 def print_log_groups(log_groups):
     """ Prints specific log group names"""
@@ -1020,10 +4942,18 @@ def filter_metric_filters(metric_filters, search_string, match_invert="match", s
     valid_match_invert=['match','invert']
     if match_invert not in valid_match_invert:
         raise Exception("Error match_invert '%s' invalid. Valid options: '%s'" % (match_invert,str(valid_match_invert))) 
+    # search_by selects which part of each metric filter is searched
+    if search_by == "name":
+        my_texts=[x['filterName'] for x in metric_filters]
+    elif search_by == "logGroup":
+        my_texts=[x['logGroupName'] for x in metric_filters]
+    else:
+        my_texts=[str(x) for x in metric_filters]
+    matched=_SubstringIndex(my_texts).search(search_string)
     if match_invert == "match":
-        search_results=([x for x in metric_filters if search_string in str(x)])
+        search_results=[x for i, x in enumerate(metric_filters) if i in matched]
     elif match_invert == "invert":
-        search_results=([x for x in metric_filters if search_string not in str(x)])
+        search_results=[x for i, x in enumerate(metric_filters) if i not in matched]
     if return_type == "full_filter":
        return search_results
     if return_type == "name":
@@ -1054,13 +4984,10 @@ def print_metric_filters(metric_filters):
         print("  - Dimensions    : " + str(mf['metricTransformations'][0]['dimensions']))
       print()
 	  
-def load_metric_filters(filepath):
-    """ This command will load metric filters from a file, into a variable """
-    if not os.path.exists(filepath):
-        raise FileNotFoundError("File specified does not exist.")
-    f=open(filepath,"r")
-    try:
-        my_metric_filters=json.load(f)
-    except Exception:
-        raise Exception("There was an error loading JSON valus from file. Verify validity of metric filters file.")
-    return my_metric_filters
+def load_metric_filters(filepath, names=None):
+    """ 
+    This command will load metric filters from a file, into a variable. Streaming backups are detected and loaded too 
+    Specify names ("<filterName>" or "<logGroupName>:<filterName>") to load only those metric filters; 
+    for indexed backups (see BackupWriter) they are read without parsing the rest of the file.
+    """
+    return _load_backup(filepath, "metric filters", names)